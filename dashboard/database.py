@@ -0,0 +1,213 @@
+"""
+Database access shared by every dashboard page.
+Each query borrows a connection from a thread safe pool for as long as its cursor is open,
+so sessions don't queue behind one shared connection and a broken connection is replaced.
+"""
+import logging
+from os import environ as ENV
+from threading import BoundedSemaphore
+from time import perf_counter
+import streamlit as st
+from psycopg2 import Error, OperationalError, InterfaceError
+from psycopg2.extensions import connection, TRANSACTION_STATUS_UNKNOWN
+from psycopg2.pool import ThreadedConnectionPool
+
+from query_cache import QueryCache, make_key, is_cacheable
+
+
+# Errors that mean the connection itself is broken, rather than the query
+CONNECTION_ERRORS = (OperationalError, InterfaceError)
+
+
+class ConnectionPool:
+    """A ThreadedConnectionPool that waits for a free connection instead of raising when they're all in use."""
+
+    def __init__(self, pool: ThreadedConnectionPool, size: int):
+        self.pool = pool
+        self.available = BoundedSemaphore(size)
+
+    def getconn(self) -> connection:
+        """Waits for a free connection, replacing any that have been closed or broken."""
+        self.available.acquire()
+        try:
+            conn = self.pool.getconn()
+            if not is_healthy(conn):
+                logging.warning("Replacing a broken database connection...")
+                self.pool.putconn(conn, close=True)
+                conn = self.pool.getconn()
+            return conn
+        except Exception:
+            self.available.release()
+            raise
+
+    def putconn(self, conn: connection, close: bool = False) -> None:
+        """Returns a connection to the pool, closing it if it's broken."""
+        try:
+            self.pool.putconn(conn, close=close or not is_healthy(conn))
+        finally:
+            self.available.release()
+
+
+def is_healthy(conn: connection) -> bool:
+    """Returns true if the connection is open and not in a broken state, without a round trip to the database."""
+    return conn.closed == 0 and conn.get_transaction_status() != TRANSACTION_STATUS_UNKNOWN
+
+
+@st.cache_resource
+def get_pool() -> ConnectionPool:
+    """Creates the connection pool, once per dashboard process."""
+    logging.info("Creating database connection pool...")
+    size = int(ENV.get("DB_POOL_SIZE", 10))
+    pool = ThreadedConnectionPool(1, size,
+                                  dbname=ENV['DB_NAME'],
+                                  user=ENV['DB_USERNAME'],
+                                  password=ENV['DB_PASSWORD'],
+                                  host=ENV['DB_HOST'],
+                                  port=ENV['DB_PORT'],
+                                  connect_timeout=10,
+                                  keepalives=1,
+                                  keepalives_idle=30)
+    return ConnectionPool(pool, size)
+
+
+@st.cache_resource
+def get_cache() -> QueryCache:
+    """Creates the query result cache, once per dashboard process."""
+    return QueryCache(max_entries=int(ENV.get("QUERY_CACHE_SIZE", 512)),
+                      ttl=float(ENV.get("QUERY_CACHE_TTL", 900)),
+                      version_interval=float(ENV.get("DATA_VERSION_INTERVAL", 30)))
+
+
+def read_data_version(pool: ConnectionPool, conn: connection = None) -> int:
+    """Reads the data version the pipelines bump after each load, returns None if it can't be read.
+    Uses the given connection if there is one, otherwise borrows one from the pool."""
+    borrowed = conn is None
+    if borrowed:
+        conn = pool.getconn()
+    broken = False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT version FROM data_version")
+            row = cursor.fetchone()
+        conn.rollback()
+        return row[0] if row else None
+    except Error as e:
+        logging.warning("Couldn't read the data version: %s", e)
+        broken = isinstance(e, CONNECTION_ERRORS)
+        if not broken:
+            conn.rollback()
+        return None
+    finally:
+        if borrowed:
+            pool.putconn(conn, close=broken)
+
+
+def describe_query(query: str) -> str:
+    """Returns a one line summary of a query for the logs."""
+    return " ".join(query.split())[:80]
+
+
+class PooledCursor:
+    """A cursor on a connection borrowed from the pool, the connection is returned when the cursor is closed."""
+
+    def __init__(self, pool: ConnectionPool, cursor_factory=None, cache: QueryCache = None):
+        self.pool = pool
+        self.cursor_factory = cursor_factory
+        self.cache = cache
+        self.conn = None
+        self.cursor = None
+        self.rows = None
+
+    def open(self) -> None:
+        """Borrows a connection and opens a cursor on it."""
+        self.conn = self.pool.getconn()
+        self.cursor = self.conn.cursor(cursor_factory=self.cursor_factory)
+
+    def close(self, broken: bool = False) -> None:
+        """Closes the cursor and returns the connection, ending its read only transaction."""
+        if self.conn is None:
+            return
+        try:
+            if not broken:
+                self.cursor.close()
+                self.conn.rollback()
+        except CONNECTION_ERRORS:
+            broken = True
+        self.pool.putconn(self.conn, close=broken)
+        self.conn = None
+        self.cursor = None
+
+    def execute(self, query: str, params: tuple = None) -> None:
+        """Runs a query, logging how long it took.
+        Reads are answered from the cache if they can be, without borrowing a connection.
+        If the connection has dropped it is replaced and the query is run again once."""
+        self.rows = None
+        key = make_key(query, params, self.cursor_factory)
+        cacheable = self.cache is not None and is_cacheable(query)
+        if cacheable:
+            # A cursor that already has a connection reads the version on it,
+            # so it never waits on the pool for a second one
+            self.cache.check_version(lambda: read_data_version(self.pool, self.conn))
+            rows = self.cache.get(key)
+            if rows is not None:
+                self.rows = iter(rows)
+                return
+
+        if self.conn is None:
+            self.open()
+        start = perf_counter()
+        try:
+            self.cursor.execute(query, params)
+        except CONNECTION_ERRORS as e:
+            logging.warning("Database connection lost, reconnecting: %s", e)
+            self.close(broken=True)
+            self.open()
+            self.cursor.execute(query, params)
+        logging.info("Query took %.1fms: %s", (perf_counter() - start) * 1000, describe_query(query))
+
+        if cacheable:
+            rows = self.cursor.fetchall()
+            self.cache.put(key, rows)
+            self.rows = iter(rows)
+
+    @property
+    def connection(self) -> connection:
+        """The borrowed connection, so a write can be committed before the cursor is closed."""
+        return self.conn
+
+    def fetchone(self):
+        """Fetches the next row of the result."""
+        if self.rows is not None:
+            return next(self.rows, None)
+        return self.cursor.fetchone()
+
+    def fetchall(self) -> list:
+        """Fetches the remaining rows of the result."""
+        if self.rows is not None:
+            return list(self.rows)
+        return self.cursor.fetchall()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(broken=isinstance(exc_value, CONNECTION_ERRORS))
+
+
+class Database:
+    """Used in place of a connection by the dashboard's query functions, each cursor borrows its own connection."""
+
+    def __init__(self, pool: ConnectionPool, cursor_factory=None, cache: QueryCache = None):
+        self.pool = pool
+        self.cursor_factory = cursor_factory
+        self.cache = cache
+
+    def cursor(self, cached: bool = True) -> PooledCursor:
+        """Returns a cursor on a pooled connection, use it as a context manager so the connection is returned.
+        Reads that are kept elsewhere, or too large to be worth caching, can skip the query cache."""
+        return PooledCursor(self.pool, self.cursor_factory, self.cache if cached else None)
+
+
+def get_database(cursor_factory=None) -> Database:
+    """Returns the dashboard's database, backed by the shared connection pool and query cache."""
+    return Database(get_pool(), cursor_factory, get_cache())
@@ -0,0 +1,175 @@
+"""
+The sidebar filters shared by the marketplace and analytics pages, with the number of games each
+option would show. The counts come from an in memory index of the game_facet table, which the
+pipelines update for each listing they change. The index only reads the rows updated since it last
+looked, and counts without running a query.
+Rows are stamped when their transaction started, so a row committed after the last look can have
+an older stamp. Each sync reads back SYNC_OVERLAP before the newest stamp seen as well, and the
+rows it already has are skipped.
+"""
+from threading import Lock
+from time import monotonic
+from os import environ as ENV
+import numpy as np
+import streamlit as st
+
+from queries import PRICE_RANGES
+
+FACETS = ["genre", "tag", "platform", "price_range"]
+
+# The option of each facet that means no filter
+NO_FILTER = {"genre": "All", "tag": "All", "platform": "All", "price_range": "Any"}
+
+# Longer than any transaction that updates game_facet,
+# so no row committed since the last sync is stamped earlier than this
+SYNC_OVERLAP = "5 minutes"
+
+FACET_QUERY = """
+    SELECT platform_assignment_id, platform_name, platform_price, is_nsfw, genres, tags, updated_at
+    FROM game_facet
+    """
+
+
+def get_price_range(price: int) -> str:
+    """Returns the price range a price is in, or None if it isn't in any."""
+    for price_range, (low, high) in PRICE_RANGES.items():
+        if price >= low and (high is None or price <= high):
+            return price_range
+    return None
+
+
+class FacetIndex:
+    """The facets of every game on every platform,
+    with the games having each option held as arrays of row numbers."""
+
+    def __init__(self, sync_interval: float = 30, clock=monotonic):
+        self.sync_interval = sync_interval
+        self.clock = clock
+        self.lock = Lock()
+        self.listings = {}
+        self.synced_at = None
+        self.updated_at = None
+        self.is_nsfw = np.zeros(0, dtype=bool)
+        self.postings = {facet: {} for facet in FACETS}
+
+    def apply(self, rows: list[dict]) -> None:
+        """Adds or replaces the listings in the rows, then rebuilds the postings if any changed."""
+        if not rows:
+            return
+        with self.lock:
+            changed = False
+            for row in rows:
+                listing = {
+                    "genre": row["genres"],
+                    "tag": row["tags"],
+                    "platform": [row["platform_name"]],
+                    "price_range": [get_price_range(row["platform_price"])],
+                    "is_nsfw": row["is_nsfw"]
+                }
+                if self.listings.get(row["platform_assignment_id"]) != listing:
+                    self.listings[row["platform_assignment_id"]] = listing
+                    changed = True
+                updated_at = row.get("updated_at")
+                if updated_at and (self.updated_at is None or updated_at > self.updated_at):
+                    self.updated_at = updated_at
+            if changed:
+                self.build()
+
+    def build(self) -> None:
+        """Rebuilds the arrays of row numbers having each option of each facet."""
+        postings = {facet: {} for facet in FACETS}
+        for row_number, listing in enumerate(self.listings.values()):
+            for facet in FACETS:
+                for value in listing[facet]:
+                    if value is not None:
+                        postings[facet].setdefault(value, []).append(row_number)
+        self.postings = {facet: {value: np.array(rows, dtype=np.int32)
+                                 for value, rows in values.items()}
+                         for facet, values in postings.items()}
+        self.is_nsfw = np.array([listing["is_nsfw"] for listing in self.listings.values()],
+                                dtype=bool)
+
+    def sync(self, conn) -> None:
+        """Reads the facets updated since the last sync, at most once every sync_interval seconds.
+        The rows read again by the overlap replace themselves, so nothing is counted twice."""
+        now = self.clock()
+        with self.lock:
+            if self.synced_at is not None and now - self.synced_at < self.sync_interval:
+                return
+            self.synced_at = now
+            updated_at = self.updated_at
+
+        query = FACET_QUERY
+        params = ()
+        if updated_at is not None:
+            query += " WHERE updated_at > %s - %s::INTERVAL"
+            params = (updated_at, SYNC_OVERLAP)
+        # The index keeps the rows itself, so they aren't put in the query cache as well
+        with conn.cursor(cached=False) as cursor:
+            cursor.execute(query, params)
+            columns = ["platform_assignment_id", "platform_name", "platform_price", "is_nsfw",
+                       "genres", "tags", "updated_at"]
+            self.apply([dict(zip(columns, row)) for row in cursor.fetchall()])
+
+    def matching(self, facet: str, value: str) -> np.ndarray:
+        """Returns a mask of the listings having the option."""
+        mask = np.zeros(len(self.is_nsfw), dtype=bool)
+        mask[self.postings[facet].get(value, [])] = True
+        return mask
+
+    def count(self, selected: dict, include_nsfw: bool) -> dict:
+        """Returns {facet: {option: count}}, where each count is the number of games with that
+        option and the options selected in every other facet, so it's how many games choosing it
+        would show."""
+        base = np.ones(len(self.is_nsfw), dtype=bool) if include_nsfw else ~self.is_nsfw
+        selected = {facet: value for facet, value in selected.items() if value != NO_FILTER[facet]}
+        masks = {facet: self.matching(facet, value) for facet, value in selected.items()}
+
+        counts = {}
+        for facet in FACETS:
+            mask = base.copy()
+            for other, other_mask in masks.items():
+                if other != facet:
+                    mask &= other_mask
+            counts[facet] = {value: int(mask[rows].sum())
+                             for value, rows in self.postings[facet].items()}
+            counts[facet][NO_FILTER[facet]] = int(mask.sum())
+        return counts
+
+
+@st.cache_resource
+def get_facet_index() -> FacetIndex:
+    """Creates the facet index, once per dashboard process."""
+    return FacetIndex(sync_interval=float(ENV.get("DATA_VERSION_INTERVAL", 30)))
+
+
+@st.cache_resource(ttl=int(ENV.get("SNAPSHOT_TTL", 300)))
+def get_snapshot_facet_index(_games) -> FacetIndex:
+    """Builds the facet index from the snapshot instead of the database."""
+    index = FacetIndex()
+    index.apply(_games.select(["platform_assignment_id", "platform_name", "platform_price",
+                               "is_nsfw", "genres", "tags"]).to_pylist())
+    return index
+
+
+def show_filters(index: FacetIndex) -> tuple[str, str, str, str, bool]:
+    """Shows the genre, tag, platform, price range and nsfw filters in the sidebar, each option
+    with the number of games it would show.
+    Returns the selected (genre, tag, platform, price_range, include_nsfw)."""
+    # The counts of each filter depend on the others,
+    # so they're worked out from the selections before they're shown
+    selected = {facet: st.session_state.get(f"{facet}_filter", NO_FILTER[facet])
+                for facet in FACETS}
+    counts = index.count(selected, st.session_state.get("include_nsfw_filter", False))
+
+    def show_filter(facet: str, label: str, options: list[str]) -> str:
+        return st.sidebar.selectbox(label, options=options, key=f"{facet}_filter",
+                                    format_func=lambda option:
+                                        f"{option} ({counts[facet].get(option, 0)})")
+
+    genre = show_filter("genre", "Genre", ["All"] + sorted(index.postings["genre"]))
+    tag = show_filter("tag", "Tag", ["All"] + sorted(index.postings["tag"]))
+    platform = show_filter("platform", "Platform", ["All"] + sorted(index.postings["platform"]))
+    price_range = show_filter("price_range", "Price Range", ["Any"] + list(PRICE_RANGES))
+    include_nsfw = st.sidebar.checkbox("Include NSFW games", value=False, key="include_nsfw_filter")
+    return genre, tag, platform, price_range, include_nsfw
@@ -2,137 +2,97 @@
 """
 Global Dashboard which allows users to filter games to their needs.
 """
-import logging
-from os import environ as ENV
 from datetime import datetime
 import pandas as pd
-from psycopg2 import connect
 from psycopg2.extensions import connection
 from dotenv import load_dotenv
 import streamlit as st
-from requests import get
 
-@st.cache_resource
-def get_connection() -> object:
-    """Returns a new connection to the database."""
-    logging.info("Getting connection to database...")
+from database import get_database
+import snapshot
+from snapshot import use_snapshot, get_snapshot
+from facets import get_facet_index, get_snapshot_facet_index, show_filters
+from queries import build_game_filters, build_game_query
 
-    dbname = ENV['DB_NAME']
-    user = ENV['DB_USERNAME']
-    host = ENV['DB_HOST']
-    port = ENV['DB_PORT']
-    password = ENV['DB_PASSWORD']
 
-    return connect(dbname=dbname, user=user, password=password, host=host, port=port)
+GAMES_PER_PAGE = 25
 
 
-def get_genre_tag_platform_options(conn: connection) -> tuple[list[str], list[str], list[str]]:
-    """Fetches all available genres, tags, and platforms for filtering."""
-    genre_query = "SELECT genre_name FROM genre"
-    tag_query = "SELECT tag_name FROM tag"
-    platform_query = "SELECT platform_name FROM platform"
+def count_filtered_games(conn: connection, genre: str = None, tag: str = None, price_range: str = None,
+    platform: str = None, include_nsfw: bool = False) -> int:
+    """Counts the games matching the filters without fetching them."""
+    filters, params = build_game_filters(genre, tag, price_range, platform, include_nsfw)
+    query = build_game_query("SELECT COUNT(*)", filters)
 
     with conn.cursor() as cursor:
-        cursor.execute(genre_query)
-        available_genres = [row[0] for row in cursor.fetchall()]
-
-        cursor.execute(tag_query)
-        available_tags = [row[0] for row in cursor.fetchall()]
-
-        cursor.execute(platform_query)
-        available_platforms = [row[0] for row in cursor.fetchall()]
-
-    return available_genres, available_tags, available_platforms
+        cursor.execute(query, tuple(params))
+        return cursor.fetchone()[0]
 
 
 def get_filtered_games(conn: connection, genre: str = None, tag: str = None, price_range: str = None,
-    platform: str = None, limit: int = 25, offset: int = 0, include_nsfw: bool = False) -> pd.DataFrame:
+    platform: str = None, limit: int = GAMES_PER_PAGE, after: tuple = None, include_nsfw: bool = False) -> pd.DataFrame:
     """
-    Fetches games from the database based on the provided filters (genre, tag, price_range, platform, nsfw exclusion).
+    Fetches a page of games from the database based on the provided filters (genre, tag, price_range, platform, nsfw exclusion).
+    Games are ordered by score, release date and then id, newest first. after is the
+    (platform_score, platform_release_date, platform_assignment_id) of the last game on the previous page,
+    so the next page is found with an index seek instead of scanning past an OFFSET.
     """
-    query = """
-    SELECT DISTINCT g.game_name, g.game_image, gp.platform_score, gp.platform_price, 
-                    gp.platform_release_date, p.platform_name, gp.platform_url
-    FROM game g
-    JOIN game_platform_assignment gp ON g.game_id = gp.game_id
-    JOIN platform p ON gp.platform_id = p.platform_id
-    LEFT JOIN genre_game_platform_assignment gpa ON gp.platform_assignment_id = gpa.platform_assignment_id
-    LEFT JOIN genre ge ON gpa.genre_id = ge.genre_id
-    LEFT JOIN tag_game_platform_assignment tgpa ON gp.platform_assignment_id = tgpa.platform_assignment_id
-    LEFT JOIN tag t ON tgpa.tag_id = t.tag_id
-    """
-    filters = []
-
-    if genre and genre != "All":
-        filters.append("ge.genre_name = %s")
-
-    if tag and tag != "All":
-        filters.append("t.tag_name = %s")
-
-    if price_range and price_range != "Any":
-        if price_range == "Free":
-            filters.append("gp.platform_price = 0")
-        if price_range == "£0.01 - £10":
-            filters.append("gp.platform_price BETWEEN 1 AND 1000")
-        if price_range == "£10.01 - £50":
-            filters.append("gp.platform_price BETWEEN 1001 AND 5000")
-        if price_range == "£50.01 - £100":
-            filters.append("gp.platform_price BETWEEN 5001 AND 10000")
-        if price_range == "Above £100":
-            filters.append("gp.platform_price > 10001")
-
-    if platform and platform != "All":
-        filters.append("p.platform_name = %s")
-
-    if include_nsfw:
-        query += " AND g.is_nsfw = TRUE"
-    else:
-        query += " AND g.is_nsfw = FALSE"
-
-    if filters:
-        query += " WHERE " + " AND ".join(filters)
-
-    query += " ORDER BY gp.platform_score DESC ,gp.platform_release_date DESC LIMIT %s OFFSET %s"
-
-    params = []
-    if genre and genre != "All":
-        params.append(genre)
-    if tag and tag != "All":
-        params.append(tag)
-    if platform and platform != "All":
-        params.append(platform)
+    filters, params = build_game_filters(genre, tag, price_range, platform, include_nsfw)
+    if after:
+        filters.append("(gp.platform_score, gp.platform_release_date, gp.platform_assignment_id) < (%s, %s, %s)")
+        params.extend(after)
+
+    query = build_game_query("""
+    SELECT g.game_name, g.game_image, gp.platform_score, gp.platform_price,
+           gp.platform_release_date, p.platform_name, gp.platform_url, gp.platform_assignment_id,
+           g.is_image_valid""", filters)
+    query += """ ORDER BY gp.platform_score DESC, gp.platform_release_date DESC, gp.platform_assignment_id DESC
+    LIMIT %s"""
     params.append(limit)
-    params.append(offset)
 
     with conn.cursor() as cursor:
         cursor.execute(query, tuple(params))
         result = cursor.fetchall()
 
-    df = pd.DataFrame(result, columns=["game_name", "game_image", "platform_score",
-                "platform_price", "platform_release_date", "platform_name", "platform_url"])
+    return pd.DataFrame(result, columns=["game_name", "game_image", "platform_score", "platform_price",
+                "platform_release_date", "platform_name", "platform_url", "platform_assignment_id",
+                "is_image_valid"])
 
-    df['platform_price'] = df['platform_price']
-    df['platform_score'] = df['platform_score'].apply(
-        lambda x: "No rating at release"
-        if x == -1 else f"{x}%"
-        if x != "No rating at release" else x)
-    return df
 
+def get_page_key(games: pd.DataFrame) -> tuple:
+    """Returns the keyset of the last game on a page, which is where the next page starts."""
+    last = games.iloc[-1]
+    return (int(last["platform_score"]), last["platform_release_date"], int(last["platform_assignment_id"]))
 
 
 def format_price(price: int) -> str:
     """Returns the price in £ format."""
     return f"£{price / 100:.2f}" if price > 0 else "Free to play"
 
-def format_score(score: str) -> str:
+def format_score(score: int) -> str:
     """Returns the score formatted as 'No rating at release' or a percentage."""
-    return score if score == "No rating at release" else score
+    return "No rating at release" if score == -1 else f"{score}%"
 
 def format_date(date: datetime) -> str:
     """Returns the date formatted as DD/MM/YYYY."""
     return datetime.strftime(date, "%d/%m/%Y")
 
 
+def show_page_buttons(page: int, total_pages: int, total_games: int, games: pd.DataFrame) -> None:
+    """Shows the previous and next page buttons, moving the page keys when they're pressed."""
+    previous_col, page_col, next_col = st.columns([1, 2, 1])
+    with previous_col:
+        if st.button("Previous", disabled=page == 1):
+            st.session_state.page_keys.pop()
+            st.rerun()
+    with page_col:
+        st.write(f"Page {page} of {total_pages} ({total_games} games)")
+    with next_col:
+        if st.button("Next", disabled=page >= total_pages or games.empty):
+            st.session_state.page_keys.append(get_page_key(games))
+            st.rerun()
+
+
 def main():
     """Main function to execute the Streamlit app."""
     load_dotenv()
@@ -230,43 +190,43 @@ def main():
     </style>
     """, unsafe_allow_html=True)
 
-    connection_to_db = get_connection()
-    genres, tags, platforms = get_genre_tag_platform_options(connection_to_db)
+    # In snapshot mode the same filters run in process on the pipeline's snapshot, without the database
+    if use_snapshot():
+        connection_to_db = get_snapshot()
+        facet_index = get_snapshot_facet_index(connection_to_db)
+        count_games, get_games = snapshot.count_filtered_games, snapshot.get_filtered_games
+    else:
+        connection_to_db = get_database()
+        facet_index = get_facet_index()
+        facet_index.sync(connection_to_db)
+        count_games, get_games = count_filtered_games, get_filtered_games
 
-    genre_filter = st.sidebar.selectbox("Genre", options=["All"] + sorted(genres))
-    tag_filter = st.sidebar.selectbox("Tag", options=["All"] + sorted(tags))
-    platform_filter = st.sidebar.selectbox("Platform", options=["All"] + sorted(platforms))
-    price_range = st.sidebar.selectbox("Price Range", ["Any",
-                                                       "Free",
-                                                       "£0.01 - £10",
-                                                       "£10.01 - £50",
-                                                       "£50.01 - £100",
-                                                       "Above £100"])
+    genre_filter, tag_filter, platform_filter, price_range, include_nsfw = show_filters(facet_index)
 
-    include_nsfw = st.sidebar.checkbox("Include NSFW games", value=False)
+    # Each page starts after the last game of the page before it, so the start of every page
+    # visited is kept to be able to go back. Changing a filter starts again from the first page.
+    filters = (genre_filter, tag_filter, price_range, platform_filter, include_nsfw)
+    if st.session_state.get('filters') != filters:
+        st.session_state.filters = filters
+        st.session_state.page_keys = [None]
 
-    if 'page' not in st.session_state:
-        st.session_state.page = 1
-    total_games = get_filtered_games(connection_to_db, genre_filter, tag_filter, price_range, platform_filter, 100000, 0, include_nsfw).shape[0]
-    total_pages = (total_games // 25) + 1
+    total_games = count_games(connection_to_db, genre_filter, tag_filter, price_range, platform_filter, include_nsfw)
+    total_pages = max(-(-total_games // GAMES_PER_PAGE), 1)
 
     st.markdown('<h3 style="font-family: \'Press Start 2P\', cursive; color: yellow; text-align: center;">Games Library</h3>', unsafe_allow_html=True)
 
-    selected_page = st.selectbox("Page", range(1, total_pages + 1))
-    st.session_state.page = selected_page
-
-    offset = (st.session_state.page - 1) * 25
-    limit = 25
-
-    value_data = get_filtered_games(connection_to_db,
+    page = len(st.session_state.page_keys)
+    value_data = get_games(connection_to_db,
                                     genre_filter,
                                     tag_filter,
                                     price_range,
                                     platform_filter,
-                                    limit,
-                                    offset,
+                                    GAMES_PER_PAGE,
+                                    st.session_state.page_keys[-1],
                                     include_nsfw)
 
+    show_page_buttons(page, total_pages, total_games, value_data)
+
     col_headers = ['Title', 'Image', 'Release Date', 'Score', 'Price', 'Platform']
     st.markdown(f'<div style="font-family: \'Press Start 2P\', cursive; color: yellow; font-size: 12px;">{"  |  ".join(col_headers)}</div>', unsafe_allow_html=True)
 
@@ -277,13 +237,10 @@ def main():
         with cols[0]:
             st.write(f"{row['game_name']}")
         with cols[1]:
-            try:
-                response = get(row['game_image'], timeout=5)
-                if response.status_code == 200:
-                    st.image(row["game_image"], caption=row["game_name"])
-                else:
-                    st.write("No valid image")
-            except Exception:
+            # Images are checked when the pipeline loads them, the browser fetches them from the URL
+            if row["is_image_valid"]:
+                st.image(row["game_image"], caption=row["game_name"])
+            else:
                 st.write("No valid image")
         with cols[2]:
             st.write(f"{format_date(row['platform_release_date'])}")
@@ -1,26 +1,15 @@
 # pylint: disable=line-too-long, ungrouped-imports
 """Dashboard that will get information about a selected developer."""
-import logging
-from os import environ as ENV
 import pandas as pd
 import streamlit as st
-from psycopg2 import connect
 from dotenv import load_dotenv
-from psycopg2.extensions import connection as psycopg_connection
-
-@st.cache_resource
-def get_connection() -> psycopg_connection:
-    """Returns a connection to the database."""
-    logging.info("Getting connection to database...")
-    dbname = ENV['DB_NAME']
-    user = ENV['DB_USERNAME']
-    host = ENV['DB_HOST']
-    port = ENV['DB_PORT']
-    password = ENV['DB_PASSWORD']
-    return connect(dbname=dbname, user=user, password=password, host=host, port=port)
+
+from database import get_database
+from search import search_developers
+
 
 def get_developer_info(conn, developer_name):
-    """Fetches information about the developer based on partial search."""
+    """Fetches the games made by the developer."""
 
     query = """
     SELECT 
@@ -34,18 +23,18 @@ def get_developer_info(conn, developer_name):
     JOIN 
         game ON game.game_id = dga.game_id
     WHERE 
-        developer.developer_name ILIKE %s;
+        developer.developer_name = %s;
     """
 
-    cursor = conn.cursor()
-    cursor.execute(query, (f"%{developer_name}%",))
-    developer_data = cursor.fetchall()
+    with conn.cursor() as cursor:
+        cursor.execute(query, (developer_name,))
+        developer_data = cursor.fetchall()
 
     return developer_data
 
 def main():
     """Main function which displays everything on the page."""
-    conn = get_connection()
+    conn = get_database()
 
     st.sidebar.image("logo.png", width=100)
 
@@ -143,10 +132,12 @@ def main():
     st.markdown('<h3 style="font-family: \'Press Start 2P\', cursive; color: yellow;">Developer Information</h3>',
                 unsafe_allow_html=True)
 
-    developer_name = st.text_input("Enter Developer Name:", "")
+    developer_search = st.text_input("Enter Developer Name:", "")
 
-    if developer_name:
-        developer_data = get_developer_info(conn, developer_name)
+    if developer_search:
+        developer_suggestions = search_developers(conn, developer_search)
+        developer_name = st.selectbox("Select a developer:", developer_suggestions) if developer_suggestions else None
+        developer_data = get_developer_info(conn, developer_name) if developer_name else []
         if developer_data:
             st.markdown(f'<div style="text-align: center; margin-bottom: 20px;">'
                         f"<h1>Developer: {developer_data[0][0]}</h1>"
@@ -1,26 +1,15 @@
 # pylint: disable=line-too-long, ungrouped-imports
 """Dashboard that will get information about a selected publisher."""
-import logging
-from os import environ as ENV
 import pandas as pd
 import streamlit as st
-from psycopg2 import connect
 from dotenv import load_dotenv
-from psycopg2.extensions import connection as psycopg_connection
-
-@st.cache_resource
-def get_connection() -> psycopg_connection:
-    """Returns a connection to the database."""
-    logging.info("Getting connection to database...")
-    dbname = ENV['DB_NAME']
-    user = ENV['DB_USERNAME']
-    host = ENV['DB_HOST']
-    port = ENV['DB_PORT']
-    password = ENV['DB_PASSWORD']
-    return connect(dbname=dbname, user=user, password=password, host=host, port=port)
+
+from database import get_database
+from search import search_publishers
+
 
 def get_publisher_info(conn, publisher_name):
-    """Fetches information about the publisher based on partial search."""
+    """Fetches the games made by the publisher."""
 
     query = """
     SELECT 
@@ -34,18 +23,18 @@ def get_publisher_info(conn, publisher_name):
     JOIN 
         game ON game.game_id = dga.game_id
     WHERE 
-        publisher.publisher_name ILIKE %s;
+        publisher.publisher_name = %s;
     """
 
-    cursor = conn.cursor()
-    cursor.execute(query, (f"%{publisher_name}%",))
-    publisher_data = cursor.fetchall()
+    with conn.cursor() as cursor:
+        cursor.execute(query, (publisher_name,))
+        publisher_data = cursor.fetchall()
 
     return publisher_data
 
 def main():
     """Main function which displays everything on the page."""
-    conn = get_connection()
+    conn = get_database()
 
     st.sidebar.image("logo.png", width=100)
 
@@ -143,10 +132,12 @@ def main():
     st.markdown('<h3 style="font-family: \'Press Start 2P\', cursive; color: yellow;">Publisher Information</h3>',
                 unsafe_allow_html=True)
 
-    publisher_name = st.text_input("Enter Publisher Name:", "")
+    publisher_search = st.text_input("Enter Publisher Name:", "")
 
-    if publisher_name:
-        publisher_data = get_publisher_info(conn, publisher_name)
+    if publisher_search:
+        publisher_suggestions = search_publishers(conn, publisher_search)
+        publisher_name = st.selectbox("Select a publisher:", publisher_suggestions) if publisher_suggestions else None
+        publisher_data = get_publisher_info(conn, publisher_name) if publisher_name else []
         if publisher_data:
             st.markdown(f'<div style="text-align: center; margin-bottom: 20px;">'
                         f"<h1>Publisher: {publisher_data[0][0]}</h1>"
@@ -1,103 +1,81 @@
 # pylint: disable=line-too-long, ungrouped-imports
 """Dashboard that will get information about a selected game."""
-import logging
-from os import environ as ENV
-import pandas as pd
 import streamlit as st
-from psycopg2 import connect
 from dotenv import load_dotenv
 from psycopg2.extensions import connection as psycopg_connection
 
+from database import get_database
+from search import search_games
 
-@st.cache_resource
-def get_connection() -> psycopg_connection:
-    """Returns a connection to the database."""
-    logging.info("Getting connection to database...")
-    dbname = ENV['DB_NAME']
-    user = ENV['DB_USERNAME']
-    host = ENV['DB_HOST']
-    port = ENV['DB_PORT']
-    password = ENV['DB_PASSWORD']
-    return connect(dbname=dbname, user=user, password=password, host=host, port=port)
 
 def get_game_suggestions(partial_name: str, conn: psycopg_connection, include_nsfw: bool) -> list:
-    """Fetches a list of game names that match the partial input, with an option to include NSFW games."""
-    query = """
-    SELECT game_name 
-    FROM game 
-    WHERE game_name ILIKE %s
-    """
-    
-    if include_nsfw:
-        query += " AND is_nsfw = TRUE"
-    else:
-        query += " AND is_nsfw = FALSE"
-        
-    query += " LIMIT 10;"
-    
-    cur = conn.cursor()
-    cur.execute(query, ('%' + partial_name + '%',))
-    game_names = [row[0] for row in cur.fetchall()]
-    cur.close()
-    return game_names
-
-def get_game_info(game_name: str, conn: psycopg_connection, include_nsfw: bool) -> pd.DataFrame:
-    """Fetches detailed game information from the database, including all genres, with an option to include NSFW games."""
+    """Fetches the game names that best match the partial input, with an option to include NSFW games."""
+    return search_games(conn, partial_name, include_nsfw)
+
+def get_game_info(game_name: str, conn: psycopg_connection, include_nsfw: bool) -> dict:
+    """Fetches a game with its publishers, developers and platforms, with an option to include NSFW games.
+    Each platform has its own release details, genres and tags. Every list is aggregated in its own subquery,
+    so the game is one row in one round trip however many of each it has. Returns None if there's no such game."""
     query = """
-    SELECT 
-        g.game_name,
-        g.game_image,
-        ar.age_rating_name,
-        g.is_nsfw,
-        p.platform_name,
-        pga.platform_release_date,
-        pga.platform_score,
-        pga.platform_price,
-        pga.platform_discount,
-        pga.platform_url,
-        pub.publisher_name,
-        dev.developer_name,
-        string_agg(gen.genre_name, ', ') AS genres  -- Aggregate genres into a single string
+    SELECT json_build_object(
+        'game_name', g.game_name,
+        'game_image', g.game_image,
+        'age_rating_name', ar.age_rating_name,
+        'is_nsfw', g.is_nsfw,
+        'publishers', COALESCE((
+            SELECT json_agg(pub.publisher_name ORDER BY pub.publisher_name)
+            FROM publisher_game_assignment pga_pub
+            JOIN publisher pub ON pga_pub.publisher_id = pub.publisher_id
+            WHERE pga_pub.game_id = g.game_id), '[]'),
+        'developers', COALESCE((
+            SELECT json_agg(dev.developer_name ORDER BY dev.developer_name)
+            FROM developer_game_assignment dga
+            JOIN developer dev ON dga.developer_id = dev.developer_id
+            WHERE dga.game_id = g.game_id), '[]'),
+        'platforms', COALESCE((
+            SELECT json_agg(json_build_object(
+                'platform_name', p.platform_name,
+                'platform_release_date', pga.platform_release_date,
+                'platform_score', pga.platform_score,
+                'platform_price', pga.platform_price,
+                'platform_discount', pga.platform_discount,
+                'platform_url', pga.platform_url,
+                'genres', COALESCE((
+                    SELECT json_agg(gen.genre_name ORDER BY gen.genre_name)
+                    FROM genre_game_platform_assignment gpga
+                    JOIN genre gen ON gpga.genre_id = gen.genre_id
+                    WHERE gpga.platform_assignment_id = pga.platform_assignment_id), '[]'),
+                'tags', COALESCE((
+                    SELECT json_agg(t.tag_name ORDER BY t.tag_name)
+                    FROM tag_game_platform_assignment tgpa
+                    JOIN tag t ON tgpa.tag_id = t.tag_id
+                    WHERE tgpa.platform_assignment_id = pga.platform_assignment_id), '[]')
+            ) ORDER BY p.platform_name)
+            FROM game_platform_assignment pga
+            JOIN platform p ON pga.platform_id = p.platform_id
+            WHERE pga.game_id = g.game_id), '[]')
+    )
     FROM game g
     LEFT JOIN age_rating ar ON g.age_rating_id = ar.age_rating_id
-    LEFT JOIN game_platform_assignment pga ON g.game_id = pga.game_id
-    LEFT JOIN platform p ON pga.platform_id = p.platform_id
-    LEFT JOIN publisher_game_assignment pga_pub ON g.game_id = pga_pub.game_id
-    LEFT JOIN publisher pub ON pga_pub.publisher_id = pub.publisher_id
-    LEFT JOIN developer_game_assignment dga ON g.game_id = dga.game_id
-    LEFT JOIN developer dev ON dga.developer_id = dev.developer_id
-    LEFT JOIN genre_game_platform_assignment gpga ON pga.platform_assignment_id = gpga.platform_assignment_id
-    LEFT JOIN genre gen ON gpga.genre_id = gen.genre_id
     WHERE g.game_name = %s
     """
-    
+
     if include_nsfw:
         query += " AND g.is_nsfw = TRUE"
     else:
         query += " AND g.is_nsfw = FALSE"
-        
-    query += " GROUP BY g.game_name, g.game_image, ar.age_rating_name, g.is_nsfw, p.platform_name, pga.platform_release_date, \
-              pga.platform_score, pga.platform_price, pga.platform_discount, pga.platform_url, pub.publisher_name, \
-              dev.developer_name;"
-    
-    cur = conn.cursor()
-    cur.execute(query, (game_name,))
-    game_info = cur.fetchall()
-    cur.close()
-
-    if not game_info:
-        return pd.DataFrame()
-
-    columns = [
-        'game_name', 'game_image', 'age_rating_name', 'is_nsfw', 'platform_name', 'platform_release_date', 
-        'platform_score', 'platform_price', 'platform_discount', 'platform_url', 'publisher_name', 'developer_name', 
-        'genres'
-    ]
-    return pd.DataFrame(game_info, columns=columns)
+
+    query += " LIMIT 1;"
+
+    with conn.cursor() as cur:
+        cur.execute(query, (game_name,))
+        game_info = cur.fetchone()
+
+    return game_info[0] if game_info else None
 
 def main():
     """Main function which displays everything on the page."""
-    conn = get_connection()
+    conn = get_database()
 
     st.sidebar.image("logo.png", width=100)
 
@@ -224,37 +202,40 @@ def main():
             game_name = st.selectbox("Select a game:", game_suggestions)
 
             if game_name:
-                game_info_df = get_game_info(game_name, conn, include_nsfw)
+                game_info = get_game_info(game_name, conn, include_nsfw)
 
-                if not game_info_df.empty:
+                if game_info:
                     st.markdown(f'<div style="display: flex; flex-direction: column; align-items: center; justify-content: center; text-align: center; margin-top: 20px;">'
-                                f"<h3 style='font-size: 30px;'>{game_info_df['game_name'][0]} Details</h3>"
+                                f"<h3 style='font-size: 30px;'>{game_info['game_name']} Details</h3>"
                                 f"</div>", unsafe_allow_html=True)
 
                     st.markdown(f'<div style="display: flex; flex-direction: column; align-items: center; justify-content: center; text-align: center; margin-top: 20px;">'
-                    f'<img src="{game_info_df["game_image"][0]}" alt="{game_info_df["game_name"][0]}" style="width: 500px; border-radius: 10px; border: 3px solid #00e5c2;"/>'
+                    f'<img src="{game_info["game_image"]}" alt="{game_info["game_name"]}" style="width: 500px; border-radius: 10px; border: 3px solid #00e5c2;"/>'
                     f"</div>", unsafe_allow_html=True)
 
-
-                    platform_options = game_info_df['platform_name'].unique()
-                    platform_selector = st.sidebar.selectbox("Select Platform", platform_options)
-
-                    platform_info = game_info_df[game_info_df['platform_name'] == platform_selector].iloc[0]
+                    platforms = {platform['platform_name']: platform for platform in game_info['platforms']}
+                    platform_selector = st.sidebar.selectbox("Select Platform", list(platforms))
 
                     st.markdown(f'<div style="display: flex; flex-direction: column; align-items: center; justify-content: center; text-align: center; margin-top: 20px;">'
-                                f"<p style='font-size: 22px;'><strong>Age Rating:</strong> {platform_info['age_rating_name']}</p>"
-                                f"<p style='font-size: 22px;'><strong>Developer:</strong> {platform_info['developer_name']}</p>"
-                                f"<p style='font-size: 22px;'><strong>Publisher:</strong> {platform_info['publisher_name']}</p>"
-                                f"<p style='font-size: 22px;'><strong>Genres:</strong> {platform_info['genres']}</p>"
-                                f"<p style='font-size: 22px;'><strong>Platform:</strong> {platform_info['platform_name']}</p>"
-                                f"<p style='font-size: 22px;'><strong>Release Date:</strong> {platform_info['platform_release_date']}</p>"
-                                f"<p style='font-size: 22px;'><strong>Platform Score:</strong> {platform_info['platform_score']}</p>"
-                                f"<p style='font-size: 22px;'><strong>Price:</strong> £{platform_info['platform_price'] / 100:.2f}</p>"
-                                f"<p style='font-size: 22px;'><strong>Discount:</strong> {platform_info['platform_discount']}%</p>"
-                                f"<p style='font-size: 22px;'><strong>Game Link:</strong> <a href='{platform_info['platform_url']}' target='_blank'>Click Here</a></p>"
-                                f"<p style='font-size: 22px;'><strong>NSFW Content:</strong> {'Yes' if platform_info['is_nsfw'] else 'No'}</p>"
+                                f"<p style='font-size: 22px;'><strong>Age Rating:</strong> {game_info['age_rating_name']}</p>"
+                                f"<p style='font-size: 22px;'><strong>Developer:</strong> {', '.join(game_info['developers'])}</p>"
+                                f"<p style='font-size: 22px;'><strong>Publisher:</strong> {', '.join(game_info['publishers'])}</p>"
+                                f"<p style='font-size: 22px;'><strong>NSFW Content:</strong> {'Yes' if game_info['is_nsfw'] else 'No'}</p>"
                                 f"</div>", unsafe_allow_html=True)
 
+                    if platform_selector:
+                        platform_info = platforms[platform_selector]
+                        st.markdown(f'<div style="display: flex; flex-direction: column; align-items: center; justify-content: center; text-align: center; margin-top: 20px;">'
+                                    f"<p style='font-size: 22px;'><strong>Genres:</strong> {', '.join(platform_info['genres'])}</p>"
+                                    f"<p style='font-size: 22px;'><strong>Tags:</strong> {', '.join(platform_info['tags'])}</p>"
+                                    f"<p style='font-size: 22px;'><strong>Platform:</strong> {platform_info['platform_name']}</p>"
+                                    f"<p style='font-size: 22px;'><strong>Release Date:</strong> {platform_info['platform_release_date']}</p>"
+                                    f"<p style='font-size: 22px;'><strong>Platform Score:</strong> {platform_info['platform_score']}</p>"
+                                    f"<p style='font-size: 22px;'><strong>Price:</strong> £{platform_info['platform_price'] / 100:.2f}</p>"
+                                    f"<p style='font-size: 22px;'><strong>Discount:</strong> {platform_info['platform_discount']}%</p>"
+                                    f"<p style='font-size: 22px;'><strong>Game Link:</strong> <a href='{platform_info['platform_url']}' target='_blank'>Click Here</a></p>"
+                                    f"</div>", unsafe_allow_html=True)
+
         else:
             st.write("No game found with that name!")
     else:
@@ -1,68 +1,36 @@
-"""Information about each platform."""
+"""Information about each platform.
+The breakdowns come from materialised views the pipelines refresh after each load."""
 # pylint: disable=unused-import, line-too-long, unused-variable
-import logging
-from os import environ as ENV
 import pandas as pd
 import streamlit as st
 import plotly.express as px
-from psycopg2 import connect
 from dotenv import load_dotenv
-from psycopg2.extensions import connection as psycop_connection
-
-@st.cache_resource
-def get_connection() -> psycop_connection:
-    """Returns a connection to the database."""
-    logging.info("Getting connection to database...")
-    dbname = ENV['DB_NAME']
-    user = ENV['DB_USERNAME']
-    host = ENV['DB_HOST']
-    port = ENV['DB_PORT']
-    password = ENV['DB_PASSWORD']
-    return connect(dbname=dbname, user=user, password=password, host=host, port=port)
+
+from database import get_database
+
 
 def get_platform_data(conn, platform_name):
-    """Fetch platform-related data from the database."""
+    """Fetch the number of games on the platform."""
     query = """
-    SELECT
-        p.platform_name,
-        COUNT(g.game_id) AS num_games,
-        COUNT(DISTINCT ggpa.genre_id) AS num_genres
-    FROM
-        platform p
-        JOIN game_platform_assignment gpa ON p.platform_id = gpa.platform_id
-        JOIN game g ON gpa.game_id = g.game_id
-        LEFT JOIN genre_game_platform_assignment ggpa ON gpa.platform_assignment_id = ggpa.platform_assignment_id
-    WHERE
-        p.platform_name = %s
-    GROUP BY
-        p.platform_name
+    SELECT num_games
+    FROM platform_summary
+    WHERE platform_name = %s
     """
     with conn.cursor() as cursor:
         cursor.execute(query, (platform_name,))
         result = cursor.fetchone()
         if result:
-            platform_name, num_games, num_genres = result
-            return num_games
+            return result[0]
         else:
             return 0
 
 def get_genre_breakdown(conn, platform_name):
     """Fetch genre breakdown for the selected platform."""
     query = """
-    SELECT
-        g.genre_name,
-        COUNT(gpa.game_id) AS num_games
-    FROM
-        genre g
-        JOIN genre_game_platform_assignment ggpa ON g.genre_id = ggpa.genre_id
-        JOIN game_platform_assignment gpa ON ggpa.platform_assignment_id = gpa.platform_assignment_id
-        JOIN platform p ON gpa.platform_id = p.platform_id
-    WHERE
-        p.platform_name = %s
-    GROUP BY
-        g.genre_name
-    ORDER BY
-        num_games DESC
+    SELECT genre_name, num_games
+    FROM platform_genre_count
+    WHERE platform_name = %s
+    ORDER BY num_games DESC
     """
     with conn.cursor() as cursor:
         cursor.execute(query, (platform_name,))
@@ -78,21 +46,10 @@ def get_genre_breakdown(conn, platform_name):
 def get_top_developers(conn, platform_name):
     """Fetch top 10 developers for the selected platform."""
     query = """
-    SELECT
-        d.developer_name,
-        COUNT(g.game_id) AS num_games
-    FROM
-        developer d
-        JOIN developer_game_assignment dga ON d.developer_id = dga.developer_id
-        JOIN game g ON dga.game_id = g.game_id
-        JOIN game_platform_assignment gpa ON g.game_id = gpa.game_id
-        JOIN platform pl ON gpa.platform_id = pl.platform_id
-    WHERE
-        pl.platform_name = %s
-    GROUP BY
-        d.developer_name
-    ORDER BY
-        num_games DESC
+    SELECT developer_name, num_games
+    FROM platform_developer_count
+    WHERE platform_name = %s
+    ORDER BY num_games DESC
     LIMIT 10
     """
     with conn.cursor() as cursor:
@@ -109,21 +66,10 @@ def get_top_developers(conn, platform_name):
 def get_top_publishers(conn, platform_name):
     """Fetch top 10 publishers for the selected platform."""
     query = """
-    SELECT
-        p.publisher_name,
-        COUNT(g.game_id) AS num_games
-    FROM
-        publisher p
-        JOIN publisher_game_assignment pga ON p.publisher_id = pga.publisher_id
-        JOIN game g ON pga.game_id = g.game_id
-        JOIN game_platform_assignment gpa ON g.game_id = gpa.game_id
-        JOIN platform pl ON gpa.platform_id = pl.platform_id
-    WHERE
-        pl.platform_name = %s
-    GROUP BY
-        p.publisher_name
-    ORDER BY
-        num_games DESC
+    SELECT publisher_name, num_games
+    FROM platform_publisher_count
+    WHERE platform_name = %s
+    ORDER BY num_games DESC
     LIMIT 10
     """
     with conn.cursor() as cursor:
@@ -140,20 +86,10 @@ def get_top_publishers(conn, platform_name):
 def get_age_rating_breakdown(conn, platform_name):
     """Fetch age rating breakdown for the selected platform."""
     query = """
-    SELECT
-        ar.age_rating_name,
-        COUNT(g.game_id) AS num_games
-    FROM
-        age_rating ar
-        JOIN game g ON ar.age_rating_id = g.age_rating_id
-        JOIN game_platform_assignment gpa ON g.game_id = gpa.game_id
-        JOIN platform p ON gpa.platform_id = p.platform_id
-    WHERE
-        p.platform_name = %s
-    GROUP BY
-        ar.age_rating_name
-    ORDER BY
-        num_games DESC
+    SELECT age_rating_name, num_games
+    FROM platform_age_rating_count
+    WHERE platform_name = %s
+    ORDER BY num_games DESC
     """
     with conn.cursor() as cursor:
         cursor.execute(query, (platform_name,))
@@ -168,7 +104,7 @@ def get_age_rating_breakdown(conn, platform_name):
 
 def main():
     """Main function which displays everything on the page."""
-    conn = get_connection()
+    conn = get_database()
 
     st.sidebar.image("logo.png", width=100)
 
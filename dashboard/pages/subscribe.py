@@ -6,22 +6,11 @@ import streamlit as st
 import boto3
 from dotenv import load_dotenv
 import pandas as pd
-import psycopg2
 from psycopg2.extras import RealDictCursor
 
-
-@st.cache_resource
-def get_connection():
-    """connects to the games database"""
-    connection = psycopg2.connect(
-        dbname=ENV['DB_NAME'],
-        user=ENV['DB_USERNAME'],
-        password=ENV['DB_PASSWORD'],
-        host=ENV['DB_HOST'],
-        port=ENV['DB_PORT'],
-        cursor_factory=RealDictCursor)
-
-    return connection
+from database import get_database
+from queries import PRICE_RANGES
+from subscriptions import WEEKLY_DIGEST, get_topic_name, get_topic_cache, subscribe
 
 
 @st.cache_data
@@ -34,8 +23,9 @@ def get_all_genres(_conn):
     return pd.DataFrame(res)
 
 
+@st.cache_resource
 def sns_connect():
-    """connect to sns client"""
+    """connect to sns client, once per dashboard process"""
     client = boto3.client(
         'sns',
         aws_access_key_id=ENV['AWS_ACCESS_KEY'],
@@ -44,88 +34,44 @@ def sns_connect():
     return client
 
 
-def get_or_create_topic(client, genre):
-    """fetches an existing topic. if not present, create the topic"""
-    topics = client.list_topics().get('Topics', [])
-
-    genre = genre.replace(' ', '_')
-
-    print('SELECTED GENRE: ', genre)
-
-    for topic in topics:
-        if f'play_stream_{genre}' in topic["TopicArn"]:
-            print(f"Topic '{genre}' already exists.")
-            return topic["TopicArn"]
-
-    res = client.create_topic(Name=f'play_stream_{genre.lower()}')
-    print('Created new topic ', genre)
-
-    return res['TopicArn']
-
-
-def is_already_subscribed(client, email, topic_arn):
-    """checks if a user's email is already subscribed to the given genre/weekly digest"""
-    existing_subs = client.list_subscriptions_by_topic(
-        TopicArn=topic_arn).get('Subscriptions', [])
-    print('existing subs: ', existing_subs)
-
-    for sub in existing_subs:
-        if sub['Protocol'] == 'email' and sub['Endpoint'] == email and sub['SubscriptionArn'] != 'PendingConfirmation':
-            print(f'{sub['Endpoint']} is an existing sub. Return True')
-            return True
-    return False
-
-
-def subscribe_user(email, genres, weekly_digest):
-    """subscribes the user to sns emailing list for genres and weekly digest"""
+def subscribe_user(conn, email, genres, weekly_digest, first_name=None, last_name=None, price_range=None):
+    """subscribes the user to sns emailing list for genres and weekly digest, all in one go"""
 
     if not email:
         st.error("Email is required!")
+        return
 
     if not genres and not weekly_digest:
         st.error("A genre or weekly digest needs to be included")
-
-    client = sns_connect()
-
-    if email and genres:  # if inputted a genre and email do this
-        for genre in genres:
-            topic_arn = get_or_create_topic(client, genre)
-            if is_already_subscribed(client, email, topic_arn):
-                st.info('This email is already subscribed to the following genres')
-            else:
-                try:
-                    client.subscribe(
-                        TopicArn=topic_arn,
-                        Protocol="email",
-                        Endpoint=email
-                    )
-                    st.success(
-                        f'Subscription request has been sent to {email}')
-                    print(f'Subscribed {email} to {genre}')
-                except Exception as e:
-                    st.error(f'Subscription to genre {genre} failed: {str(e)}')
-
-    if email and weekly_digest:
-        digest_topic_arn = get_or_create_topic(client, 'weekly_digest')
-        if is_already_subscribed(client, email, digest_topic_arn):
-            st.info('This email is already subscribed to the weekly digest')
+        return
+
+    topics = {get_topic_name(genre): genre for genre in genres}
+    if weekly_digest:
+        topics[get_topic_name(WEEKLY_DIGEST)] = WEEKLY_DIGEST
+
+    try:
+        results = subscribe(sns_connect(), conn, email, list(topics), get_topic_cache(),
+                            first_name, last_name, price_range)
+    except Exception as e:
+        st.error(f'Subscription failed: {e}')
+        return
+
+    for topic_name, result in results.items():
+        name = 'the weekly digest' if topics[topic_name] == WEEKLY_DIGEST else topics[topic_name]
+        if result == 'subscribed':
+            print(f'Subscribed {email} to {name}')
+        elif result == 'already subscribed':
+            st.info(f'This email is already subscribed to {name}')
         else:
-            try:
-                client.subscribe(
-                    TopicArn=digest_topic_arn,
-                    Protocol="email",
-                    Endpoint=email
-                )
-                st.success(
-                    'Your email has been subscribed to the weekly digest')
-                print(f'Subscribed {email} to newsletter')
-            except Exception as e:
-                st.error(f'Subscription to newsletter failed: {e}')
+            st.error(f'Subscription to {name} failed: {result}')
+
+    if 'subscribed' in results.values():
+        st.success(f'Subscription request has been sent to {email}')
 
 
 if __name__ == "__main__":
     load_dotenv()
-    conn = get_connection()
+    conn = get_database(cursor_factory=RealDictCursor)
 
     st.sidebar.image("logo.png", width=100)
 
@@ -229,5 +175,7 @@ if __name__ == "__main__":
         "Select Genres to Subscribe To", get_all_genres(conn))
     accepted_weekly_digest = st.checkbox(
         "Subscribe to Weekly Digest", value=True)
+    digest_price_range = st.selectbox(
+        "Weekly Digest Price Range", ["Any"] + list(PRICE_RANGES), disabled=not accepted_weekly_digest)
     st.button("Submit", on_click=lambda: subscribe_user(
-        user_email, selected_genres, accepted_weekly_digest))
+        conn, user_email, selected_genres, accepted_weekly_digest, f_name, l_name, digest_price_range))
@@ -0,0 +1,74 @@
+"""
+Builds the SQL shared by the dashboard pages that filter games.
+"""
+
+# Every row is one game on one platform, genre and tag filters are EXISTS checks
+# so a game isn't repeated once for each of its genres and tags
+GAME_FROM = """
+    FROM game g
+    JOIN game_platform_assignment gp ON g.game_id = gp.game_id
+    JOIN platform p ON gp.platform_id = p.platform_id
+    """
+
+GENRE_FILTER = """EXISTS (
+        SELECT 1 FROM genre_game_platform_assignment gga
+        JOIN genre ge ON gga.genre_id = ge.genre_id
+        WHERE gga.platform_assignment_id = gp.platform_assignment_id AND ge.genre_name = %s)"""
+
+TAG_FILTER = """EXISTS (
+        SELECT 1 FROM tag_game_platform_assignment tga
+        JOIN tag t ON tga.tag_id = t.tag_id
+        WHERE tga.platform_assignment_id = gp.platform_assignment_id AND t.tag_name = %s)"""
+
+# Prices are stored in pence, the upper bound is None if there isn't one
+PRICE_RANGES = {
+    "Free": (0, 0),
+    "£0.01 - £10": (1, 1000),
+    "£10.01 - £50": (1001, 5000),
+    "£50.01 - £100": (5001, 10000),
+    "Above £100": (10002, None)
+}
+
+
+def build_game_filters(genre: str = None, tag: str = None, price_range: str = None,
+    platform: str = None, include_nsfw: bool = False) -> tuple[list[str], list]:
+    """
+    Returns the WHERE conditions and their parameters for the filters (genre, tag, price_range, platform, nsfw exclusion).
+    Only the filters that are set are added, "All" and "Any" mean no filter.
+    """
+    filters = []
+    params = []
+
+    if genre and genre != "All":
+        filters.append(GENRE_FILTER)
+        params.append(genre)
+
+    if tag and tag != "All":
+        filters.append(TAG_FILTER)
+        params.append(tag)
+
+    if price_range in PRICE_RANGES:
+        low, high = PRICE_RANGES[price_range]
+        if high is None:
+            filters.append("gp.platform_price >= %s")
+            params.append(low)
+        else:
+            filters.append("gp.platform_price BETWEEN %s AND %s")
+            params.extend([low, high])
+
+    if platform and platform != "All":
+        filters.append("p.platform_name = %s")
+        params.append(platform)
+
+    if not include_nsfw:
+        filters.append("g.is_nsfw = FALSE")
+
+    return filters, params
+
+
+def build_game_query(select: str, filters: list[str]) -> str:
+    """Returns a query selecting from the games on each platform, with the given WHERE conditions."""
+    query = select + GAME_FROM
+    if filters:
+        query += " WHERE " + " AND ".join(filters)
+    return query
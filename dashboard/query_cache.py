@@ -0,0 +1,80 @@
+"""
+A cache of query results for the dashboard.
+The data only changes when a pipeline loads, so results are kept until the data version
+the pipelines bump after each load changes, or until they reach their TTL.
+"""
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+
+class QueryCache:
+    """A thread safe, size bounded cache of query results, evicting the least recently used first."""
+
+    def __init__(self, max_entries: int = 512, ttl: float = 900, version_interval: float = 30,
+                 clock=monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version_interval = version_interval
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.version = None
+        self.version_checked_at = None
+        self.hits = 0
+        self.misses = 0
+
+    def check_version(self, read_version) -> None:
+        """Reads the data version at most once every version_interval seconds,
+        clearing the cache if it has changed since it was last read."""
+        now = self.clock()
+        with self.lock:
+            if (self.version_checked_at is not None
+                    and now - self.version_checked_at < self.version_interval):
+                return
+            # Set before reading, so only one session reads the version when it's due
+            self.version_checked_at = now
+
+        version = read_version()
+        if version is None:
+            return
+
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+
+    def get(self, key: tuple) -> list:
+        """Returns the cached rows for a query, or None if they aren't cached or have expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or self.clock() - entry[0] > self.ttl:
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, rows: list) -> None:
+        """Caches the rows of a query, evicting the least recently used results if the cache is full."""
+        with self.lock:
+            self.entries[key] = (self.clock(), rows)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Removes every cached result."""
+        with self.lock:
+            self.entries.clear()
+
+
+def make_key(query: str, params, cursor_factory=None) -> tuple:
+    """Makes the cache key for a query, the cursor factory is part of it as it changes the type of the rows."""
+    return (query, repr(params), getattr(cursor_factory, "__name__", None))
+
+
+def is_cacheable(query: str) -> bool:
+    """Only reads are cached."""
+    return query.lstrip().upper().startswith(("SELECT", "WITH"))
@@ -0,0 +1,85 @@
+"""
+Name search for games, developers and publishers, used by the pages' search boxes.
+Matches are found with the pg_trgm indexes in database/schema.sql, names starting with
+the search term come first and the rest are ranked by how similar they are to it.
+"""
+from psycopg2.extensions import connection
+
+SEARCH_LIMIT = 10
+
+# Terms shorter than a trigram only match the start of a name, using the prefix index,
+# as a contains or similarity match would be almost every name
+MIN_FUZZY_LENGTH = 3
+
+# The tables that can be searched and the column holding their names
+SEARCH_COLUMNS = {
+    "game": "game_name",
+    "developer": "developer_name",
+    "publisher": "publisher_name"
+}
+
+
+def normalise_term(term: str) -> str:
+    """Trims the term and collapses its whitespace, so "  half   life " is searched as "half life"."""
+    return " ".join(term.split()) if term else ""
+
+
+def escape_like(term: str) -> str:
+    """Escapes the LIKE wildcards in a term, so they are matched literally."""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def build_search_query(table: str, term: str, filters: list[str] = None) -> tuple[str, dict]:
+    """Returns the query and its parameters to find the names in a table that match a term,
+    with any extra WHERE conditions on the table."""
+    column = SEARCH_COLUMNS[table]
+    prefix = f"lower({column}) LIKE %(prefix)s"
+    params = {"prefix": escape_like(term.lower()) + "%", "term": term}
+
+    if len(term) < MIN_FUZZY_LENGTH:
+        matches = prefix
+    else:
+        # ILIKE finds the term anywhere in the name, % finds names that are similar to it
+        matches = f"({prefix} OR {column} ILIKE %(contains)s OR {column} %% %(term)s)"
+        params["contains"] = "%" + escape_like(term) + "%"
+
+    conditions = " AND ".join([matches] + (filters or []))
+    query = f"""
+    SELECT {column}
+    FROM {table}
+    WHERE {conditions}
+    ORDER BY {prefix} DESC, similarity({column}, %(term)s) DESC, {column}
+    LIMIT %(limit)s
+    """
+    return query, params
+
+
+def search_names(conn: connection, table: str, term: str, limit: int = SEARCH_LIMIT,
+                 filters: list[str] = None) -> list[str]:
+    """Returns the top names in a table matching the term, best match first.
+    An empty term returns nothing, so the search box can be queried on every change."""
+    term = normalise_term(term)
+    if not term:
+        return []
+
+    query, params = build_search_query(table, term, filters)
+    params["limit"] = limit
+    with conn.cursor() as cursor:
+        cursor.execute(query, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_games(conn: connection, term: str, include_nsfw: bool, limit: int = SEARCH_LIMIT) -> list[str]:
+    """Returns the names of the games best matching the term, only nsfw games if include_nsfw is set."""
+    nsfw_filter = "is_nsfw = TRUE" if include_nsfw else "is_nsfw = FALSE"
+    return search_names(conn, "game", term, limit, [nsfw_filter])
+
+
+def search_developers(conn: connection, term: str, limit: int = SEARCH_LIMIT) -> list[str]:
+    """Returns the names of the developers best matching the term."""
+    return search_names(conn, "developer", term, limit)
+
+
+def search_publishers(conn: connection, term: str, limit: int = SEARCH_LIMIT) -> list[str]:
+    """Returns the names of the publishers best matching the term."""
+    return search_names(conn, "publisher", term, limit)
@@ -0,0 +1,107 @@
+"""Benchmarks the name search against a temporary table of generated game names,
+comparing it to the ILIKE scan it replaced and failing if it's over its budget.
+Needs the database in the .env and the pg_trgm extension, nothing is left behind."""
+from argparse import ArgumentParser
+from io import StringIO
+from os import environ as ENV
+from random import Random
+from statistics import median, quantiles
+from time import perf_counter
+import sys
+
+import psycopg2
+from dotenv import load_dotenv
+
+from search import search_names
+
+WORDS = ["dark", "souls", "legend", "star", "space", "dragon", "knight", "city", "racing", "simulator",
+         "tycoon", "quest", "shadow", "hollow", "iron", "lost", "ancient", "cyber", "pixel", "dungeon",
+         "farm", "zombie", "galaxy", "empire", "tales", "world", "night", "storm", "fire", "kingdom"]
+
+# Typed search terms, from a first letter to full and misspelt names
+TERMS = ["d", "dr", "dra", "drag", "dragon", "dragon quest", "dragn quset", "shadow kingdom",
+         "zombie farm simulator", "cyber", "pixl dungeon", "galaxy empire 2", "the", "iron storm"]
+
+# The slowest search allowed, in milliseconds
+BUDGET = 20
+
+
+def make_names(count: int) -> list[str]:
+    """Makes the same game names every run, with some repeated words so searches have many matches."""
+    random = Random(0)
+    names = []
+    for i in range(count):
+        words = random.sample(WORDS, random.randint(1, 4))
+        name = " ".join(words).title()
+        names.append(f"{name} {i % 7}" if i % 3 == 0 else name)
+    return names
+
+
+def create_table(conn, names: list[str]) -> None:
+    """Creates a temporary game table, which hides the real one for this connection, with the search indexes."""
+    rows = StringIO("".join(f"{name}\t{i % 10 == 0}\n" for i, name in enumerate(names)))
+    with conn.cursor() as cursor:
+        cursor.execute("CREATE TEMPORARY TABLE game (game_name VARCHAR(100), is_nsfw BOOLEAN)")
+        cursor.copy_expert("COPY game (game_name, is_nsfw) FROM STDIN", rows)
+        cursor.execute("CREATE INDEX ON game USING GIN (game_name gin_trgm_ops)")
+        cursor.execute("CREATE INDEX ON game (lower(game_name) text_pattern_ops)")
+        cursor.execute("ANALYZE game")
+    conn.commit()
+
+
+def time_search(search, runs: int) -> list[float]:
+    """Times each run of the search in milliseconds."""
+    times = []
+    for _ in range(runs):
+        start = perf_counter()
+        search()
+        times.append((perf_counter() - start) * 1000)
+    return times
+
+
+def legacy_search(conn, term: str) -> list[str]:
+    """The search the games page used to run."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT game_name FROM game WHERE game_name ILIKE %s AND is_nsfw = FALSE LIMIT 10",
+                       (f"%{term}%",))
+        return cursor.fetchall()
+
+
+def init_args():
+    """Gets the number of names and runs from the command line"""
+    parser = ArgumentParser(description="Benchmarks the dashboard's name search")
+    parser.add_argument("-n", "--names", type=int, default=500000, help="The number of game names")
+    parser.add_argument("-r", "--runs", type=int, default=20, help="The number of runs of each term")
+    return parser.parse_args()
+
+
+def main():
+    """Runs each search term against the generated names and prints its times."""
+    args = init_args()
+    conn = psycopg2.connect(dbname=ENV['DB_NAME'], user=ENV['DB_USERNAME'], password=ENV['DB_PASSWORD'],
+                            host=ENV['DB_HOST'], port=ENV['DB_PORT'])
+    try:
+        create_table(conn, make_names(args.names))
+
+        print(f"{'term':<24}{'matches':>8}{'median ms':>12}{'p95 ms':>10}{'ILIKE ms':>10}")
+        slowest = 0
+        for term in TERMS:
+            matches = search_names(conn, "game", term, filters=["is_nsfw = FALSE"])
+            times = time_search(lambda t=term: search_names(conn, "game", t, filters=["is_nsfw = FALSE"]),
+                                args.runs)
+            legacy = time_search(lambda t=term: legacy_search(conn, t), args.runs)
+            p95 = quantiles(times, n=20)[-1]
+            slowest = max(slowest, p95)
+            print(f"{term:<24}{len(matches):>8}{median(times):>12.1f}{p95:>10.1f}{median(legacy):>10.1f}")
+    finally:
+        conn.close()
+
+    if slowest > BUDGET:
+        print(f"The slowest search took {slowest:.1f}ms, over the {BUDGET}ms budget")
+        sys.exit(1)
+    print(f"Every search was under the {BUDGET}ms budget")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    main()
@@ -0,0 +1,165 @@
+"""
+A read only mode for the dashboard, which answers the marketplace and analytics queries from the
+Parquet snapshot the pipelines export after each load instead of from the database.
+Set SNAPSHOT_PATH to the snapshot's file or S3 location to use it, the file is memory mapped
+and filtered in process with pyarrow.
+"""
+# pyarrow.compute's functions are generated when it's imported, so pylint can't see them.
+# The filters take the same arguments as the database queries they stand in for
+# pylint: disable=no-member, too-many-arguments, too-many-positional-arguments
+import logging
+from os import environ as ENV, path, replace
+from tempfile import gettempdir
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import streamlit as st
+
+from queries import PRICE_RANGES
+
+MARKETPLACE_COLUMNS = ["game_name", "game_image", "platform_score", "platform_price",
+                       "platform_release_date", "platform_name", "platform_url",
+                       "platform_assignment_id", "is_image_valid"]
+
+# Same order as the marketplace query, so pages and page keys work the same in both modes
+GAME_ORDER = [("platform_score", "descending"), ("platform_release_date", "descending"),
+              ("platform_assignment_id", "descending")]
+
+
+def use_snapshot() -> bool:
+    """Returns true if the dashboard should read the snapshot instead of the database."""
+    return bool(ENV.get("SNAPSHOT_PATH"))
+
+
+def download_snapshot(location: str) -> str:
+    """Downloads a snapshot from s3://bucket/key to the temporary directory, returning its path.
+    The download replaces the old copy in one step,
+    so a memory mapped snapshot is never changed under it."""
+    import boto3 # pylint: disable=import-outside-toplevel
+    bucket, _, key = location.removeprefix("s3://").partition("/")
+    file_path = path.join(gettempdir(), path.basename(key))
+    boto3.client("s3").download_file(bucket, key, file_path + ".tmp")
+    replace(file_path + ".tmp", file_path)
+    return file_path
+
+
+def read_snapshot(location: str) -> pa.Table:
+    """Memory maps a snapshot, downloading it first if it's in S3."""
+    if location.startswith("s3://"):
+        location = download_snapshot(location)
+    table = pq.read_table(location, memory_map=True)
+    logging.info("Read a snapshot of %s games from %s", table.num_rows, location)
+    return table
+
+
+@st.cache_resource(ttl=int(ENV.get("SNAPSHOT_TTL", 300)))
+def get_snapshot() -> pa.Table:
+    """Reads the snapshot, once per dashboard process
+    until SNAPSHOT_TTL seconds pass and the latest is read."""
+    return read_snapshot(ENV["SNAPSHOT_PATH"])
+
+
+def list_contains(column: pa.ChunkedArray, value: str) -> pa.Array:
+    """Returns a mask of the rows whose list column contains the value."""
+    flat = pc.list_flatten(column)
+    rows = pc.filter(pc.list_parent_indices(column), pc.equal(flat, value))
+    return pc.is_in(pa.array(range(len(column))), value_set=pc.unique(rows))
+
+
+def filter_games(games: pa.Table, genre: str = None, tag: str = None, price_range: str = None,
+    platform: str = None, include_nsfw: bool = False) -> pa.Table:
+    """Filters the snapshot the same way build_game_filters filters the database,
+    "All" and "Any" mean no filter."""
+    mask = pa.array([True] * games.num_rows)
+
+    if genre and genre != "All":
+        mask = pc.and_(mask, list_contains(games["genres"], genre))
+
+    if tag and tag != "All":
+        mask = pc.and_(mask, list_contains(games["tags"], tag))
+
+    if price_range in PRICE_RANGES:
+        low, high = PRICE_RANGES[price_range]
+        mask = pc.and_(mask, pc.greater_equal(games["platform_price"], low))
+        if high is not None:
+            mask = pc.and_(mask, pc.less_equal(games["platform_price"], high))
+
+    if platform and platform != "All":
+        mask = pc.and_(mask, pc.equal(games["platform_name"], platform))
+
+    if not include_nsfw:
+        mask = pc.and_(mask, pc.invert(games["is_nsfw"]))
+
+    return games.filter(mask)
+
+
+def count_filtered_games(games: pa.Table, genre: str = None, tag: str = None,
+    price_range: str = None, platform: str = None, include_nsfw: bool = False) -> int:
+    """Counts the games matching the filters."""
+    return filter_games(games, genre, tag, price_range, platform, include_nsfw).num_rows
+
+
+def get_filtered_games(games: pa.Table, genre: str = None, tag: str = None, price_range: str = None,
+    platform: str = None, limit: int = 25, after: tuple = None,
+    include_nsfw: bool = False) -> pd.DataFrame:
+    """Returns a page of the games matching the filters, in the marketplace's order.
+    after is the (platform_score, platform_release_date, platform_assignment_id)
+    of the last game on the previous page."""
+    games = filter_games(games, genre, tag, price_range, platform, include_nsfw)
+    if after:
+        score, release_date, assignment_id = after
+        before = pc.or_(
+            pc.less(games["platform_score"], score),
+            pc.and_(pc.equal(games["platform_score"], score),
+                    pc.or_(pc.less(games["platform_release_date"], release_date),
+                           pc.and_(pc.equal(games["platform_release_date"], release_date),
+                                   pc.less(games["platform_assignment_id"], assignment_id)))))
+        games = games.filter(before)
+
+    page = games.take(pc.sort_indices(games, sort_keys=GAME_ORDER)[:limit])
+    return page.select(MARKETPLACE_COLUMNS).to_pandas()
+
+
+def get_number_of_games_by_platform(games: pa.Table) -> pd.DataFrame:
+    """Returns the number of games on each platform, excluding NSFW games."""
+    counts = games.filter(pc.invert(games["is_nsfw"])).group_by("platform_name").aggregate(
+        [("game_id", "count")])
+    return (counts.to_pandas().rename(columns={"game_id_count": "game_count"})
+            .sort_values("game_count", ascending=False, ignore_index=True))
+
+
+def get_number_of_games_by_list(games: pa.Table, column: str) -> pd.DataFrame:
+    """Returns the number of distinct games with each genre or tag, the column is genres or tags."""
+    name = column.removesuffix("s") + "_name"
+    rows = pa.table({
+        name: pc.list_flatten(games[column]),
+        "game_id": pc.take(games["game_id"], pc.list_parent_indices(games[column]))
+    })
+    counts = rows.group_by(name).aggregate([("game_id", "count_distinct")])
+    return (counts.to_pandas().rename(columns={"game_id_count_distinct": "game_count"})
+            .sort_values("game_count", ascending=False, ignore_index=True))
+
+
+def get_number_of_games_by_genre(games: pa.Table) -> pd.DataFrame:
+    """Returns the number of distinct games with each genre."""
+    return get_number_of_games_by_list(games, "genres")
+
+
+def get_number_of_games_by_tag(games: pa.Table) -> pd.DataFrame:
+    """Returns the number of distinct games with each tag."""
+    return get_number_of_games_by_list(games, "tags")
+
+
+def get_analytics_games(games: pa.Table, genre: str = None, tag: str = None,
+    price_range: str = None, platform: str = None, top_n: int = None,
+    include_nsfw: bool = True) -> pd.DataFrame:
+    """Returns the distinct games matching the filters with the columns the analytics page shows,
+    the top_n by score then price if it's set."""
+    games = filter_games(games, genre, tag, price_range, platform, include_nsfw)
+    df = games.select(["game_name", "game_image", "platform_score", "platform_price",
+                       "platform_name", "is_nsfw"]).to_pandas().drop_duplicates(ignore_index=True)
+    if top_n:
+        df = df.sort_values(["platform_score", "platform_price"], ascending=False,
+                            ignore_index=True).head(top_n)
+    return df
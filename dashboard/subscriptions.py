@@ -0,0 +1,145 @@
+"""
+The subscribe page's record of who is subscribed to each SNS topic, in the subscriber and subscription tables.
+The page adds a pending subscription when someone subscribes, the genre email lambda's reconciler marks it
+confirmed once they confirm it in SNS, and the daily email reads the confirmed subscribers from the tables.
+Submitting the page goes through subscribe, which checks every chosen topic in one query, looks the topic ARNs
+up in a cache shared by the whole dashboard process, subscribes to the topics in parallel and saves them together.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from psycopg2.extensions import connection
+import streamlit as st
+
+# Every topic the dashboard subscribes people to starts with this
+TOPIC_PREFIX = "play_stream_"
+
+WEEKLY_DIGEST = "weekly digest"
+
+# The most SNS subscribe calls made at once
+MAX_WORKERS = 10
+
+
+def get_topic_name(genre: str) -> str:
+    """Returns the name of the SNS topic for a genre, "Free to Play" is play_stream_free_to_play."""
+    return TOPIC_PREFIX + genre.replace(" ", "_").lower()
+
+
+def get_subscribed_topics(conn: connection, email: str, topic_names: list[str]) -> set[str]:
+    """Returns the topics the email has confirmed its subscription to, checking them all in one query."""
+    query = """
+    SELECT s.topic_name
+    FROM subscription s
+    JOIN subscriber sb ON s.subscriber_id = sb.subscriber_id
+    WHERE sb.email = %s AND s.topic_name = ANY(%s) AND s.status = 'confirmed'
+    """
+    with conn.cursor(cached=False) as cursor:
+        cursor.execute(query, (email, list(topic_names)))
+        return {row["topic_name"] for row in cursor.fetchall()}
+
+
+def save_subscriptions(conn: connection, email: str, subscriptions: list[tuple], first_name: str = None,
+                       last_name: str = None, price_range: str = None) -> None:
+    """Records the pending (topic_name, topic_arn, subscription_arn) subscriptions of an email in one transaction,
+    adding the subscriber if they're new. The price range is only saved if it's set, "Any" clears it."""
+    subscriber_query = """
+    INSERT INTO subscriber (email, first_name, last_name, price_range)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (email) DO UPDATE SET
+        first_name = COALESCE(EXCLUDED.first_name, subscriber.first_name),
+        last_name = COALESCE(EXCLUDED.last_name, subscriber.last_name),
+        price_range = CASE WHEN %s THEN EXCLUDED.price_range ELSE subscriber.price_range END
+    RETURNING subscriber_id
+    """
+    subscription_query = """
+    INSERT INTO subscription (subscriber_id, topic_name, topic_arn, subscription_arn, status)
+    SELECT %s, s.topic_name, s.topic_arn, s.subscription_arn, 'pending'
+    FROM UNNEST(%s::TEXT[], %s::TEXT[], %s::TEXT[]) AS s(topic_name, topic_arn, subscription_arn)
+    ON CONFLICT (subscriber_id, topic_name) DO UPDATE SET
+        topic_arn = EXCLUDED.topic_arn,
+        subscription_arn = EXCLUDED.subscription_arn,
+        status = 'pending',
+        updated_at = CURRENT_TIMESTAMP
+    """
+    topic_names, topic_arns, subscription_arns = (list(column) for column in zip(*subscriptions))
+    with conn.cursor(cached=False) as cursor:
+        cursor.execute(subscriber_query, (email, first_name or None, last_name or None,
+                                          price_range if price_range != "Any" else None, price_range is not None))
+        subscriber_id = cursor.fetchone()["subscriber_id"]
+        cursor.execute(subscription_query, (subscriber_id, topic_names, topic_arns, subscription_arns))
+        cursor.connection.commit()
+
+
+class TopicCache:
+    """The ARN of each topic, read from the subscription table or created in SNS the first time it's needed.
+    A topic's ARN never changes, so they're kept for as long as the dashboard runs."""
+
+    def __init__(self):
+        self.arns = {}
+        self.lock = Lock()
+
+    def get_arns(self, client, conn: connection, topic_names: list[str]) -> dict:
+        """Returns {topic_name: topic_arn}, reading the ones it doesn't have in one query
+        and creating the topics no one has subscribed to yet."""
+        with self.lock:
+            missing = [topic_name for topic_name in topic_names if topic_name not in self.arns]
+        if missing:
+            query = """
+            SELECT DISTINCT ON (topic_name) topic_name, topic_arn
+            FROM subscription
+            WHERE topic_name = ANY(%s)
+            """
+            with conn.cursor(cached=False) as cursor:
+                cursor.execute(query, (missing,))
+                found = {row["topic_name"]: row["topic_arn"] for row in cursor.fetchall()}
+
+            # create_topic returns the existing topic if there is one
+            for topic_name in missing:
+                if topic_name not in found:
+                    found[topic_name] = client.create_topic(Name=topic_name)["TopicArn"]
+            with self.lock:
+                self.arns.update(found)
+
+        with self.lock:
+            return {topic_name: self.arns[topic_name] for topic_name in topic_names}
+
+
+@st.cache_resource
+def get_topic_cache() -> TopicCache:
+    """Creates the topic ARN cache, once per dashboard process."""
+    return TopicCache()
+
+
+def subscribe(client, conn: connection, email: str, topic_names: list[str], topic_cache: TopicCache,
+              first_name: str = None, last_name: str = None, price_range: str = None) -> dict:
+    """Subscribes the email to the topics it isn't already subscribed to, in parallel, and saves them.
+    Returns {topic_name: result}, where the result is "subscribed", "already subscribed" or the error."""
+    subscribed = get_subscribed_topics(conn, email, topic_names)
+    results = {topic_name: "already subscribed" for topic_name in subscribed}
+    new_topics = [topic_name for topic_name in topic_names if topic_name not in subscribed]
+    if not new_topics:
+        return results
+
+    topic_arns = topic_cache.get_arns(client, conn, new_topics)
+
+    def subscribe_to(topic_name: str):
+        try:
+            return client.subscribe(TopicArn=topic_arns[topic_name], Protocol="email",
+                                    Endpoint=email, ReturnSubscriptionArn=True).get("SubscriptionArn")
+        except Exception as e: # pylint: disable=broad-exception-caught
+            return e
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(new_topics))) as executor:
+        responses = dict(zip(new_topics, executor.map(subscribe_to, new_topics)))
+
+    saved = []
+    for topic_name, response in responses.items():
+        if isinstance(response, Exception):
+            results[topic_name] = str(response)
+        else:
+            results[topic_name] = "subscribed"
+            saved.append((topic_name, topic_arns[topic_name], response))
+
+    if saved:
+        digest_price_range = price_range if get_topic_name(WEEKLY_DIGEST) in topic_names else None
+        save_subscriptions(conn, email, saved, first_name, last_name, digest_price_range)
+    return results
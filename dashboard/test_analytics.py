@@ -0,0 +1,148 @@
+# pylint: skip-file
+import re
+import sqlite3
+from pathlib import Path
+
+import pytest
+from pages import analytics, platforms
+from test_queries import FakeConnection
+
+SCHEMA = Path(__file__).parent.parent / "database" / "schema.sql"
+PLATFORMS = ["Steam", "Epic Games Store", "GOG"]
+
+
+def load_views(db):
+    """Creates the schema's materialised views as plain SQLite views, so they're always up to date."""
+    views = re.findall(r'CREATE MATERIALIZED VIEW (".*?" AS.*?);', SCHEMA.read_text(), re.DOTALL)
+    assert views
+    for view in views:
+        db.execute(f"CREATE VIEW {view.replace('NOT g.is_nsfw', 'g.is_nsfw = 0')}")
+
+
+@pytest.fixture
+def seeded_db():
+    """Seeds a SQLite copy of the tables the analytics views are built from."""
+    db = sqlite3.connect(":memory:")
+    db.executescript("""
+        CREATE TABLE game (game_id INT, game_name TEXT, age_rating_id INT, is_nsfw BOOL);
+        CREATE TABLE platform (platform_id INT, platform_name TEXT);
+        CREATE TABLE genre (genre_id INT, genre_name TEXT);
+        CREATE TABLE tag (tag_id INT, tag_name TEXT);
+        CREATE TABLE developer (developer_id INT, developer_name TEXT);
+        CREATE TABLE publisher (publisher_id INT, publisher_name TEXT);
+        CREATE TABLE age_rating (age_rating_id INT, age_rating_name TEXT);
+        CREATE TABLE game_platform_assignment (platform_assignment_id INT, game_id INT, platform_id INT);
+        CREATE TABLE genre_game_platform_assignment (genre_id INT, platform_assignment_id INT);
+        CREATE TABLE tag_game_platform_assignment (tag_id INT, platform_assignment_id INT);
+        CREATE TABLE developer_game_assignment (developer_id INT, game_id INT);
+        CREATE TABLE publisher_game_assignment (publisher_id INT, game_id INT);
+    """)
+    db.executemany("INSERT INTO platform VALUES (?, ?)", enumerate(PLATFORMS, 1))
+    for table in ["genre", "tag", "developer", "publisher", "age_rating"]:
+        db.executemany(f"INSERT INTO {table} VALUES (?, ?)",
+                       [(i, f"{table} {i}") for i in range(1, 13)])
+
+    assignment_id = 0
+    for game_id in range(1, 81):
+        db.execute("INSERT INTO game VALUES (?, ?, ?, ?)",
+                   (game_id, f"Game {game_id}", 1 + game_id % 5, game_id % 6 == 0))
+        db.execute("INSERT INTO developer_game_assignment VALUES (?, ?)", (1 + game_id % 12, game_id))
+        db.execute("INSERT INTO publisher_game_assignment VALUES (?, ?)", (1 + game_id % 11, game_id))
+        db.execute("INSERT INTO publisher_game_assignment VALUES (?, ?)", (1 + game_id % 3, game_id))
+        for platform_id in range(1, 1 + game_id % 3 + 1):
+            assignment_id += 1
+            db.execute("INSERT INTO game_platform_assignment VALUES (?, ?, ?)",
+                       (assignment_id, game_id, platform_id))
+            for genre_id in range(1, 1 + assignment_id % 4 + 1):
+                db.execute("INSERT INTO genre_game_platform_assignment VALUES (?, ?)",
+                           (genre_id, assignment_id))
+            for tag_id in range(1 + assignment_id % 3, 5):
+                db.execute("INSERT INTO tag_game_platform_assignment VALUES (?, ?)",
+                           (tag_id, assignment_id))
+    load_views(db)
+    return db
+
+
+def query(db, sql, params=()):
+    return db.execute(sql.replace("%s", "?"), params).fetchall()
+
+
+def test_games_by_platform_matches_legacy(seeded_db):
+    expected = query(seeded_db, """
+        SELECT p.platform_name, COUNT(g.game_id) AS game_count
+        FROM platform p
+        JOIN game_platform_assignment gp ON p.platform_id = gp.platform_id
+        JOIN game g ON g.game_id = gp.game_id
+        WHERE g.is_nsfw = 0
+        GROUP BY p.platform_name""")
+    result = analytics.get_number_of_games_by_platform(FakeConnection(seeded_db))
+    assert sorted(result.itertuples(index=False, name=None)) == sorted(expected)
+    assert result["game_count"].is_monotonic_decreasing
+
+
+@pytest.mark.parametrize("item", ["genre", "tag"])
+def test_games_by_genre_and_tag_match_legacy(seeded_db, item):
+    expected = query(seeded_db, f"""
+        SELECT x.{item}_name, COUNT(DISTINCT g.game_id) AS game_count
+        FROM {item} x
+        JOIN {item}_game_platform_assignment xpa ON x.{item}_id = xpa.{item}_id
+        JOIN game_platform_assignment gp ON xpa.platform_assignment_id = gp.platform_assignment_id
+        JOIN game g ON g.game_id = gp.game_id
+        GROUP BY x.{item}_name""")
+    get_counts = getattr(analytics, f"get_number_of_games_by_{item}")
+    result = get_counts(FakeConnection(seeded_db))
+    assert sorted(result.itertuples(index=False, name=None)) == sorted(expected)
+
+
+@pytest.mark.parametrize("platform", PLATFORMS)
+def test_platform_game_count(seeded_db, platform):
+    expected = query(seeded_db, """
+        SELECT COUNT(*) FROM game_platform_assignment gpa
+        JOIN platform p ON gpa.platform_id = p.platform_id
+        WHERE p.platform_name = %s""", (platform,))[0][0]
+    assert platforms.get_platform_data(FakeConnection(seeded_db), platform) == expected
+
+
+def test_platform_game_count_unknown_platform(seeded_db):
+    assert platforms.get_platform_data(FakeConnection(seeded_db), "Itch") == 0
+
+
+@pytest.mark.parametrize("platform", PLATFORMS)
+def test_platform_breakdowns_match_legacy(seeded_db, platform):
+    conn = FakeConnection(seeded_db)
+    legacy = {
+        platforms.get_genre_breakdown: """
+            SELECT g.genre_name, COUNT(gpa.game_id) FROM genre g
+            JOIN genre_game_platform_assignment ggpa ON g.genre_id = ggpa.genre_id
+            JOIN game_platform_assignment gpa ON ggpa.platform_assignment_id = gpa.platform_assignment_id
+            JOIN platform p ON gpa.platform_id = p.platform_id
+            WHERE p.platform_name = %s GROUP BY g.genre_name""",
+        platforms.get_age_rating_breakdown: """
+            SELECT ar.age_rating_name, COUNT(g.game_id) FROM age_rating ar
+            JOIN game g ON ar.age_rating_id = g.age_rating_id
+            JOIN game_platform_assignment gpa ON g.game_id = gpa.game_id
+            JOIN platform p ON gpa.platform_id = p.platform_id
+            WHERE p.platform_name = %s GROUP BY ar.age_rating_name"""
+    }
+    for get_breakdown, sql in legacy.items():
+        result = get_breakdown(conn, platform)
+        assert sorted(result.itertuples(index=False, name=None)) == sorted(query(seeded_db, sql, (platform,)))
+
+
+@pytest.mark.parametrize("platform", PLATFORMS)
+@pytest.mark.parametrize("item", ["developer", "publisher"])
+def test_top_developers_and_publishers_match_legacy(seeded_db, platform, item):
+    expected = query(seeded_db, f"""
+        SELECT x.{item}_name, COUNT(g.game_id) AS num_games FROM {item} x
+        JOIN {item}_game_assignment xga ON x.{item}_id = xga.{item}_id
+        JOIN game g ON xga.game_id = g.game_id
+        JOIN game_platform_assignment gpa ON g.game_id = gpa.game_id
+        JOIN platform pl ON gpa.platform_id = pl.platform_id
+        WHERE pl.platform_name = %s GROUP BY x.{item}_name""", (platform,))
+    get_top = getattr(platforms, f"get_top_{item}s")
+    result = get_top(FakeConnection(seeded_db), platform)
+
+    counts = dict(expected)
+    assert len(result) == min(10, len(expected))
+    assert list(result["Number of Games"]) == sorted(counts.values(), reverse=True)[:len(result)]
+    assert all(counts[name] == num for name, num in result.itertuples(index=False, name=None))
@@ -0,0 +1,170 @@
+# pylint: skip-file
+from unittest.mock import MagicMock, patch
+
+import pytest
+from psycopg2 import OperationalError, ProgrammingError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+
+import database
+from query_cache import QueryCache
+
+
+def make_connection(closed=0, status=TRANSACTION_STATUS_IDLE):
+    conn = MagicMock()
+    conn.closed = closed
+    conn.get_transaction_status.return_value = status
+    cursor = conn.cursor.return_value
+    cursor.__enter__.return_value = cursor
+    return conn
+
+
+def make_pool(*connections, size=2):
+    pool = MagicMock()
+    pool.getconn.side_effect = list(connections)
+    return database.ConnectionPool(pool, size)
+
+
+DATA = [
+    (make_connection(), True),
+    (make_connection(closed=1), False),
+    (make_connection(status=TRANSACTION_STATUS_UNKNOWN), False)
+]
+@pytest.mark.parametrize("conn, expected", DATA)
+def test_is_healthy(conn, expected):
+    assert database.is_healthy(conn) is expected
+
+
+def test_cursor_returns_connection():
+    conn = make_connection()
+    pool = make_pool(conn)
+    conn.cursor.return_value.fetchall.return_value = [("Action",)]
+
+    with database.Database(pool).cursor() as cursor:
+        cursor.execute("SELECT genre_name FROM genre")
+        assert cursor.fetchall() == [("Action",)]
+
+    conn.rollback.assert_called_once()
+    pool.pool.putconn.assert_called_once_with(conn, close=False)
+
+
+def test_cursor_passes_cursor_factory():
+    conn = make_connection()
+    factory = MagicMock()
+
+    with database.Database(make_pool(conn), factory).cursor() as cursor:
+        cursor.execute("SELECT 1")
+    conn.cursor.assert_called_once_with(cursor_factory=factory)
+
+
+def test_broken_connection_is_replaced():
+    broken = make_connection(closed=2)
+    healthy = make_connection()
+    pool = make_pool(broken, healthy)
+
+    assert pool.getconn() is healthy
+    pool.pool.putconn.assert_called_once_with(broken, close=True)
+
+
+def test_execute_reconnects_once():
+    dropped = make_connection()
+    dropped.cursor.return_value.execute.side_effect = OperationalError("server closed the connection")
+    healthy = make_connection()
+    pool = make_pool(dropped, healthy)
+
+    with database.Database(pool).cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+    healthy.cursor.return_value.execute.assert_called_once_with("SELECT 1", None)
+    pool.pool.putconn.assert_any_call(dropped, close=True)
+    pool.pool.putconn.assert_called_with(healthy, close=False)
+
+
+def test_query_error_keeps_connection():
+    conn = make_connection()
+    conn.cursor.return_value.execute.side_effect = ProgrammingError("syntax error")
+    pool = make_pool(conn)
+
+    with pytest.raises(ProgrammingError):
+        with database.Database(pool).cursor() as cursor:
+            cursor.execute("SELEC 1")
+
+    conn.rollback.assert_called_once()
+    pool.pool.putconn.assert_called_once_with(conn, close=False)
+
+
+def test_connections_are_released_to_waiting_sessions():
+    pool = make_pool(*[make_connection() for _ in range(3)], size=1)
+    db = database.Database(pool)
+
+    for _ in range(3):
+        with db.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    assert pool.pool.putconn.call_count == 3
+
+
+def test_execute_logs_query_time():
+    with patch("logging.info") as mock_info:
+        with database.Database(make_pool(make_connection())).cursor() as cursor:
+            cursor.execute("""
+                SELECT genre_name
+                FROM genre""")
+    assert mock_info.call_args[0][0] == "Query took %.1fms: %s"
+    assert mock_info.call_args[0][2] == "SELECT genre_name FROM genre"
+
+
+def test_cached_query_does_not_borrow_connection():
+    conn = make_connection()
+    conn.cursor.return_value.fetchone.return_value = (1,)
+    conn.cursor.return_value.fetchall.return_value = [("Action",)]
+    pool = make_pool(conn, conn, conn)
+    db = database.Database(pool, cache=QueryCache())
+
+    with db.cursor() as cursor:
+        cursor.execute("SELECT genre_name FROM genre")
+    borrowed = pool.pool.getconn.call_count
+
+    for _ in range(3):
+        with db.cursor() as cursor:
+            cursor.execute("SELECT genre_name FROM genre")
+            assert cursor.fetchall() == [("Action",)]
+    assert pool.pool.getconn.call_count == borrowed
+
+
+def test_cache_is_cleared_when_data_version_changes():
+    conn = make_connection()
+    conn.cursor.return_value.fetchone.side_effect = [(1,), (2,)]
+    conn.cursor.return_value.fetchall.side_effect = [[("Action",)], [("RPG",)]]
+    pool = make_pool(*[conn] * 4)
+    db = database.Database(pool, cache=QueryCache(version_interval=0))
+
+    results = []
+    for _ in range(2):
+        with db.cursor() as cursor:
+            cursor.execute("SELECT genre_name FROM genre")
+            results.append(cursor.fetchall())
+    assert results == [[("Action",)], [("RPG",)]]
+
+
+def test_missing_data_version_falls_back_to_ttl():
+    conn = make_connection()
+    conn.cursor.return_value.execute.side_effect = [ProgrammingError("no data_version"), None]
+    conn.cursor.return_value.fetchall.return_value = [("Action",)]
+    pool = make_pool(*[conn] * 2)
+
+    with patch("logging.warning") as mock_warning:
+        with database.Database(pool, cache=QueryCache()).cursor() as cursor:
+            cursor.execute("SELECT genre_name FROM genre")
+            assert cursor.fetchall() == [("Action",)]
+        mock_warning.assert_called_once()
+
+
+def test_uncached_cursor_skips_cache():
+    conn = make_connection()
+    conn.cursor.return_value.fetchall.return_value = [("Action",)]
+    pool = make_pool(conn, conn)
+    cache = QueryCache()
+
+    with database.Database(pool, cache=cache).cursor(cached=False) as cursor:
+        cursor.execute("SELECT genre_name FROM genre")
+        assert cursor.fetchall() == [("Action",)]
+    assert not cache.entries
@@ -0,0 +1,157 @@
+# pylint: skip-file
+from datetime import datetime
+
+import pytest
+import marketplace
+from facets import FacetIndex, FACETS, NO_FILTER, SYNC_OVERLAP, get_price_range
+from test_queries import seeded_db, FILTERS
+
+
+def facet_rows(db):
+    """Builds the game_facet rows of the seeded database, the way the pipeline's upsert does."""
+    rows = []
+    for assignment_id, platform_name, price, is_nsfw in db.execute("""
+        SELECT gp.platform_assignment_id, p.platform_name, gp.platform_price, g.is_nsfw
+        FROM game_platform_assignment gp
+        JOIN game g ON gp.game_id = g.game_id
+        JOIN platform p ON gp.platform_id = p.platform_id""").fetchall():
+        genres = [row[0] for row in db.execute("""
+            SELECT ge.genre_name FROM genre_game_platform_assignment gga JOIN genre ge USING (genre_id)
+            WHERE gga.platform_assignment_id = ?""", (assignment_id,))]
+        tags = [row[0] for row in db.execute("""
+            SELECT t.tag_name FROM tag_game_platform_assignment tga JOIN tag t USING (tag_id)
+            WHERE tga.platform_assignment_id = ?""", (assignment_id,))]
+        rows.append({"platform_assignment_id": assignment_id, "platform_name": platform_name,
+                     "platform_price": price, "is_nsfw": bool(is_nsfw), "genres": genres, "tags": tags,
+                     "updated_at": datetime(2025, 1, 1)})
+    return rows
+
+
+class FakeCursor:
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query, params=()):
+        self.conn.queries.append((query, params))
+
+    def fetchall(self):
+        rows, self.conn.rows = self.conn.rows, []
+        return [tuple(row.values()) for row in rows]
+
+
+class FakeDatabase:
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def cursor(self, cached=True):
+        assert cached is False
+        return FakeCursor(self)
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def index(seeded_db):
+    index = FacetIndex()
+    index.apply(facet_rows(seeded_db.db))
+    return index
+
+
+@pytest.mark.parametrize("genre, tag, price_range, platform, include_nsfw", FILTERS)
+def test_counts_match_filtered_games(seeded_db, index, genre, tag, price_range, platform, include_nsfw):
+    selected = {"genre": genre, "tag": tag, "price_range": price_range, "platform": platform}
+    counts = index.count(selected, include_nsfw)
+
+    # Choosing an option shows the games matching it and every other selected filter
+    for facet in FACETS:
+        for option, count in counts[facet].items():
+            chosen = {**selected, facet: option}
+            assert count == marketplace.count_filtered_games(
+                seeded_db, chosen["genre"], chosen["tag"], chosen["price_range"],
+                chosen["platform"], include_nsfw), (facet, option)
+
+
+def test_no_filter_count_is_every_game(seeded_db, index):
+    counts = index.count(dict(NO_FILTER), True)
+    assert all(counts[facet][NO_FILTER[facet]] == 60 * 2 for facet in FACETS)
+
+
+DATA = [(0, "Free"), (1, "£0.01 - £10"), (1000, "£0.01 - £10"), (1001, "£10.01 - £50"),
+        (10000, "£50.01 - £100"), (10001, None), (10002, "Above £100")]
+@pytest.mark.parametrize("price, expected", DATA)
+def test_get_price_range(price, expected):
+    assert get_price_range(price) == expected
+
+
+def test_apply_replaces_listing(seeded_db, index):
+    row = facet_rows(seeded_db.db)[0]
+    before = index.count(dict(NO_FILTER), True)
+    index.apply([{**row, "genres": ["Horror"], "updated_at": datetime(2025, 2, 1)}])
+    after = index.count(dict(NO_FILTER), True)
+
+    assert after["genre"]["All"] == before["genre"]["All"]
+    assert after["genre"]["Horror"] == 1
+    assert index.updated_at == datetime(2025, 2, 1)
+
+
+def test_sync_only_reads_updated_rows(seeded_db):
+    rows = facet_rows(seeded_db.db)
+    clock = FakeClock()
+    index = FacetIndex(sync_interval=30, clock=clock)
+    conn = FakeDatabase(rows)
+
+    index.sync(conn)
+    assert conn.queries[0][1] == ()
+    assert len(index.listings) == len(rows)
+
+    clock.now = 10
+    index.sync(conn)
+    assert len(conn.queries) == 1
+
+    clock.now = 31
+    conn.rows = [{**rows[0], "platform_price": 0, "updated_at": datetime(2025, 3, 1)}]
+    index.sync(conn)
+    assert conn.queries[1][1] == (datetime(2025, 1, 1), SYNC_OVERLAP)
+    assert index.listings[rows[0]["platform_assignment_id"]]["price_range"] == ["Free"]
+
+
+def test_sync_reads_rows_committed_late(seeded_db):
+    rows = facet_rows(seeded_db.db)
+    clock = FakeClock()
+    index = FacetIndex(sync_interval=30, clock=clock)
+    conn = FakeDatabase(rows)
+    index.sync(conn)
+
+    # a transaction that started before the newest row was stamped commits after the last sync
+    late = {**rows[1], "platform_price": 0, "updated_at": datetime(2024, 12, 31, 23, 59)}
+    clock.now = 31
+    conn.rows = [rows[0], late]
+    index.sync(conn)
+
+    assert "updated_at > %s - %s::INTERVAL" in conn.queries[1][0]
+    assert len(index.listings) == len(rows)
+    assert index.listings[late["platform_assignment_id"]]["price_range"] == ["Free"]
+    assert index.updated_at == datetime(2025, 1, 1)
+
+
+def test_apply_skips_unchanged_rows(seeded_db, index):
+    postings = index.postings
+    index.apply(facet_rows(seeded_db.db))
+
+    assert index.postings is postings
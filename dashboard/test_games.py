@@ -0,0 +1,141 @@
+# pylint: skip-file
+import json
+import re
+import sqlite3
+from unittest.mock import MagicMock
+
+import pytest
+from pages import games
+
+GAME = {
+    "game_name": "Portal",
+    "game_image": "image",
+    "age_rating_name": "PEGI 12",
+    "is_nsfw": False,
+    "publishers": ["Valve"],
+    "developers": ["Valve"],
+    "platforms": [{"platform_name": "Steam", "platform_release_date": "2007-10-10",
+                   "platform_score": 95, "platform_price": 799, "platform_discount": 0,
+                   "platform_url": "url", "genres": ["Puzzle"], "tags": ["Singleplayer"]}]
+}
+
+
+def make_connection(row):
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchone.return_value = row
+    return conn, cursor
+
+
+def test_get_game_info_returns_one_object():
+    conn, cursor = make_connection((GAME,))
+    assert games.get_game_info("Portal", conn, False) == GAME
+    cursor.execute.assert_called_once()
+    cursor.fetchall.assert_not_called()
+
+
+def test_get_game_info_missing_game():
+    conn, _ = make_connection(None)
+    assert games.get_game_info("Portal 3", conn, False) is None
+
+
+@pytest.fixture
+def seeded_db():
+    """Seeds a SQLite copy of one game with two publishers and developers, and genres and tags on
+    each of its platforms, with another game sharing some of them so nothing leaks between games.
+    The rows are inserted in name order, as this SQLite can't order inside an aggregate."""
+    db = sqlite3.connect(":memory:")
+    db.executescript("""
+        CREATE TABLE age_rating (age_rating_id INT, age_rating_name TEXT);
+        CREATE TABLE game (game_id INT, game_name TEXT, game_image TEXT, age_rating_id INT,
+            is_nsfw BOOL);
+        CREATE TABLE publisher (publisher_id INT, publisher_name TEXT);
+        CREATE TABLE developer (developer_id INT, developer_name TEXT);
+        CREATE TABLE publisher_game_assignment (publisher_id INT, game_id INT);
+        CREATE TABLE developer_game_assignment (developer_id INT, game_id INT);
+        CREATE TABLE platform (platform_id INT, platform_name TEXT);
+        CREATE TABLE game_platform_assignment (platform_assignment_id INT, game_id INT,
+            platform_id INT, platform_release_date TEXT, platform_score INT, platform_price INT,
+            platform_discount INT, platform_url TEXT);
+        CREATE TABLE genre (genre_id INT, genre_name TEXT);
+        CREATE TABLE tag (tag_id INT, tag_name TEXT);
+        CREATE TABLE genre_game_platform_assignment (genre_id INT, platform_assignment_id INT);
+        CREATE TABLE tag_game_platform_assignment (tag_id INT, platform_assignment_id INT);
+
+        INSERT INTO age_rating VALUES (1, 'PEGI 12');
+        INSERT INTO game VALUES (1, 'Portal', 'image', 1, 0), (2, 'Portal 2', 'image 2', 1, 0);
+        INSERT INTO publisher VALUES (1, 'EA'), (2, 'Valve');
+        INSERT INTO developer VALUES (1, 'Nuclear Monkey'), (2, 'Valve');
+        INSERT INTO publisher_game_assignment VALUES (1, 1), (2, 1), (2, 2);
+        INSERT INTO developer_game_assignment VALUES (1, 1), (2, 1), (2, 2);
+        INSERT INTO platform VALUES (1, 'GOG'), (2, 'Steam');
+        INSERT INTO game_platform_assignment VALUES
+            (1, 1, 1, '2008-01-01', 90, 899, 10, 'gog url'),
+            (2, 1, 2, '2007-10-10', 95, 799, 0, 'steam url'),
+            (3, 2, 2, '2011-04-18', 98, 999, 0, 'portal 2 url');
+        INSERT INTO genre VALUES (1, 'Action'), (2, 'Puzzle');
+        INSERT INTO tag VALUES (1, 'Co-op'), (2, 'Singleplayer');
+        INSERT INTO genre_game_platform_assignment VALUES (2, 1), (1, 2), (2, 2), (1, 3);
+        INSERT INTO tag_game_platform_assignment VALUES (1, 2), (2, 2), (1, 3);
+    """)
+    return FakeConnection(db)
+
+
+class FakeCursor:
+    """Runs the game query against SQLite, with its Postgres JSON functions swapped for SQLite's."""
+
+    def __init__(self, db):
+        self.cursor = db.cursor()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cursor.close()
+
+    def execute(self, query, params=()):
+        query = (query.replace("%s", "?").replace("TRUE", "1").replace("FALSE", "0")
+                 .replace("json_build_object", "json_object")
+                 .replace("json_agg", "json_group_array")
+                 # SQLite's subqueries return text, so each list is made json again
+                 .replace("COALESCE((", "json(COALESCE((").replace("), '[]')", "), '[]'))"))
+        self.cursor.execute(re.sub(r"\s+ORDER BY [\w.]+\)", ")", query), params)
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        # psycopg2 returns json as python objects
+        return (json.loads(row[0]),) if row else None
+
+
+class FakeConnection:
+
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+
+def test_get_game_info_lists_each_once(seeded_db):
+    game = games.get_game_info("Portal", seeded_db, False)
+
+    assert game["game_name"] == "Portal"
+    assert game["age_rating_name"] == "PEGI 12"
+    # each list has every item of its own game once, however many of the others there are
+    assert game["publishers"] == ["EA", "Valve"]
+    assert game["developers"] == ["Nuclear Monkey", "Valve"]
+    assert game["platforms"] == [
+        {"platform_name": "GOG", "platform_release_date": "2008-01-01", "platform_score": 90,
+         "platform_price": 899, "platform_discount": 10, "platform_url": "gog url",
+         "genres": ["Puzzle"], "tags": []},
+        {"platform_name": "Steam", "platform_release_date": "2007-10-10", "platform_score": 95,
+         "platform_price": 799, "platform_discount": 0, "platform_url": "steam url",
+         "genres": ["Action", "Puzzle"], "tags": ["Co-op", "Singleplayer"]}
+    ]
+
+
+@pytest.mark.parametrize("include_nsfw, expected", [(True, "g.is_nsfw = TRUE"), (False, "g.is_nsfw = FALSE")])
+def test_get_game_info_nsfw_filter(include_nsfw, expected):
+    conn, cursor = make_connection(None)
+    games.get_game_info("Portal", conn, include_nsfw)
+    assert expected in cursor.execute.call_args[0][0]
@@ -0,0 +1,198 @@
+# pylint: skip-file
+import sqlite3
+from datetime import date
+
+import pytest
+import marketplace
+from queries import build_game_filters, build_game_query
+
+
+PLATFORMS = [(1, "Steam"), (2, "GOG"), (3, "Epic Games Store")]
+GENRES = [(1, "Action"), (2, "RPG"), (3, "Puzzle")]
+TAGS = [(1, "Indie"), (2, "Co-op"), (3, "Retro")]
+PRICES = [0, 1, 999, 1000, 1001, 4999, 5000, 5001, 10000, 10001, 10002, 25000]
+SCORES = [-1, 40, 75, 75, 90]
+
+
+@pytest.fixture
+def seeded_db():
+    """Seeds a SQLite copy of the games tables with overlapping genres, tags and nsfw games."""
+    db = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES)
+    db.executescript("""
+        CREATE TABLE game (game_id INT, game_name TEXT, game_image TEXT, is_nsfw BOOL,
+            is_image_valid BOOL);
+        CREATE TABLE platform (platform_id INT, platform_name TEXT);
+        CREATE TABLE genre (genre_id INT, genre_name TEXT);
+        CREATE TABLE tag (tag_id INT, tag_name TEXT);
+        CREATE TABLE game_platform_assignment (platform_assignment_id INT, game_id INT,
+            platform_id INT, platform_release_date DATE, platform_score INT,
+            platform_price INT, platform_url TEXT);
+        CREATE TABLE genre_game_platform_assignment (genre_id INT, platform_assignment_id INT);
+        CREATE TABLE tag_game_platform_assignment (tag_id INT, platform_assignment_id INT);
+    """)
+    db.executemany("INSERT INTO platform VALUES (?, ?)", PLATFORMS)
+    db.executemany("INSERT INTO genre VALUES (?, ?)", GENRES)
+    db.executemany("INSERT INTO tag VALUES (?, ?)", TAGS)
+
+    assignment_id = 0
+    for game_id in range(1, 61):
+        db.execute("INSERT INTO game VALUES (?, ?, ?, ?, ?)",
+                   (game_id, f"Game {game_id}", "image", game_id % 7 == 0, game_id % 5 != 0))
+        for platform_id in range(1, 1 + game_id % 3 + 1):
+            assignment_id += 1
+            db.execute("INSERT INTO game_platform_assignment VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       (assignment_id, game_id, platform_id, date(2025, 1, 1 + game_id % 4),
+                        SCORES[game_id % len(SCORES)], PRICES[assignment_id % len(PRICES)],
+                        f"url {assignment_id}"))
+            for genre_id in range(1, 1 + assignment_id % 3 + 1):
+                db.execute("INSERT INTO genre_game_platform_assignment VALUES (?, ?)",
+                           (genre_id, assignment_id))
+            for tag_id in range(1 + assignment_id % 2, 4):
+                db.execute("INSERT INTO tag_game_platform_assignment VALUES (?, ?)",
+                           (tag_id, assignment_id))
+    return FakeConnection(db)
+
+
+class FakeCursor:
+    """Runs the dashboard's psycopg2 style queries against SQLite."""
+
+    def __init__(self, db):
+        self.cursor = db.cursor()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cursor.close()
+
+    def execute(self, query, params=()):
+        query = query.replace("%s", "?").replace("TRUE", "1").replace("FALSE", "0")
+        self.cursor.execute(query, params)
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+
+class FakeConnection:
+
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+
+def legacy_filtered_games(conn, select, genre, tag, price_range, platform, include_nsfw):
+    """The query the dashboard used before, joining every genre and tag of every game."""
+    query = select + """
+    FROM game g
+    JOIN game_platform_assignment gp ON g.game_id = gp.game_id
+    JOIN platform p ON gp.platform_id = p.platform_id
+    LEFT JOIN genre_game_platform_assignment gpa ON gp.platform_assignment_id = gpa.platform_assignment_id
+    LEFT JOIN genre ge ON gpa.genre_id = ge.genre_id
+    LEFT JOIN tag_game_platform_assignment tgpa ON gp.platform_assignment_id = tgpa.platform_assignment_id
+    LEFT JOIN tag t ON tgpa.tag_id = t.tag_id
+    """
+    filters = []
+    params = []
+    if genre and genre != "All":
+        filters.append("ge.genre_name = %s")
+        params.append(genre)
+    if tag and tag != "All":
+        filters.append("t.tag_name = %s")
+        params.append(tag)
+    if price_range == "Free":
+        filters.append("gp.platform_price = 0")
+    if price_range == "£0.01 - £10":
+        filters.append("gp.platform_price BETWEEN 1 AND 1000")
+    if price_range == "£10.01 - £50":
+        filters.append("gp.platform_price BETWEEN 1001 AND 5000")
+    if price_range == "£50.01 - £100":
+        filters.append("gp.platform_price BETWEEN 5001 AND 10000")
+    if price_range == "Above £100":
+        filters.append("gp.platform_price > 10001")
+    if platform and platform != "All":
+        filters.append("p.platform_name = %s")
+        params.append(platform)
+    # The old query added this to the tag join instead of the WHERE, so it never filtered anything
+    if not include_nsfw:
+        filters.append("g.is_nsfw = FALSE")
+    if filters:
+        query += " WHERE " + " AND ".join(filters)
+
+    with conn.cursor() as cursor:
+        cursor.execute(query, tuple(params))
+        return cursor.fetchall()
+
+
+FILTERS = [
+    ("All", "All", "Any", "All", False),
+    ("All", "All", "Any", "All", True),
+    ("Action", "All", "Any", "All", False),
+    ("All", "Retro", "Any", "All", False),
+    ("RPG", "Indie", "Any", "All", True),
+    ("Puzzle", "Co-op", "Any", "GOG", False),
+    ("All", "All", "Free", "All", False),
+    ("All", "All", "£0.01 - £10", "Steam", True),
+    ("Action", "All", "£10.01 - £50", "All", False),
+    ("All", "Indie", "£50.01 - £100", "All", True),
+    ("All", "All", "Above £100", "All", True),
+    ("Action", "Retro", "Above £100", "Epic Games Store", False)
+]
+MARKETPLACE_COLUMNS = """
+    SELECT DISTINCT g.game_name, g.game_image, gp.platform_score, gp.platform_price,
+                    gp.platform_release_date, p.platform_name, gp.platform_url, gp.platform_assignment_id,
+                    g.is_image_valid
+    """
+
+
+@pytest.mark.parametrize("genre, tag, price_range, platform, include_nsfw", FILTERS)
+def test_marketplace_pages_match_legacy(seeded_db, genre, tag, price_range, platform, include_nsfw):
+    expected = sorted(legacy_filtered_games(seeded_db, MARKETPLACE_COLUMNS, genre, tag,
+                                            price_range, platform, include_nsfw),
+                      key=lambda row: (row[2], row[4], row[7]), reverse=True)
+
+    rows = []
+    after = None
+    while True:
+        page = marketplace.get_filtered_games(seeded_db, genre, tag, price_range, platform,
+                                              7, after, include_nsfw)
+        if page.empty:
+            break
+        rows.extend(page.itertuples(index=False, name=None))
+        after = marketplace.get_page_key(page)
+
+    assert rows == expected
+
+
+@pytest.mark.parametrize("genre, tag, price_range, platform, include_nsfw", FILTERS)
+def test_marketplace_count_matches_legacy(seeded_db, genre, tag, price_range, platform, include_nsfw):
+    expected = legacy_filtered_games(seeded_db, MARKETPLACE_COLUMNS, genre, tag,
+                                     price_range, platform, include_nsfw)
+    assert marketplace.count_filtered_games(
+        seeded_db, genre, tag, price_range, platform, include_nsfw) == len(expected)
+
+
+@pytest.mark.parametrize("genre, tag, price_range, platform, include_nsfw", FILTERS)
+def test_analytics_query_matches_legacy(seeded_db, genre, tag, price_range, platform, include_nsfw):
+    select = "SELECT DISTINCT g.game_name, gp.platform_score, gp.platform_price, p.platform_name"
+    expected = legacy_filtered_games(seeded_db, select, genre, tag, price_range, platform, include_nsfw)
+
+    filters, params = build_game_filters(genre, tag, price_range, platform, include_nsfw)
+    with seeded_db.cursor() as cursor:
+        cursor.execute(build_game_query(select, filters), tuple(params))
+        assert sorted(cursor.fetchall()) == sorted(expected)
+
+
+def test_unset_filters_add_no_conditions():
+    assert build_game_filters("All", "All", "Any", "All", True) == ([], [])
+
+
+def test_genre_and_tag_filters_are_semi_joins():
+    filters, params = build_game_filters("Action", "Indie", include_nsfw=True)
+    assert all(condition.startswith("EXISTS") for condition in filters)
+    assert params == ["Action", "Indie"]
+    assert "JOIN genre" not in build_game_query("SELECT 1", [])
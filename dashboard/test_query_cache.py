@@ -0,0 +1,106 @@
+# pylint: skip-file
+import pytest
+from query_cache import QueryCache, make_key, is_cacheable
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_get_missing(clock):
+    cache = QueryCache(clock=clock)
+    assert cache.get(("SELECT 1", "None", None)) is None
+    assert cache.misses == 1
+
+
+def test_put_and_get(clock):
+    cache = QueryCache(clock=clock)
+    cache.put("key", [(1,)])
+    assert cache.get("key") == [(1,)]
+    assert cache.hits == 1
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = QueryCache(ttl=60, clock=clock)
+    cache.put("key", [(1,)])
+    clock.now = 61
+    assert cache.get("key") is None
+    assert "key" not in cache.entries
+
+
+def test_least_recently_used_is_evicted(clock):
+    cache = QueryCache(max_entries=2, clock=clock)
+    cache.put("a", [1])
+    cache.put("b", [2])
+    cache.get("a")
+    cache.put("c", [3])
+    assert list(cache.entries) == ["a", "c"]
+
+
+def test_version_change_clears_cache(clock):
+    cache = QueryCache(version_interval=30, clock=clock)
+    cache.check_version(lambda: 1)
+    cache.put("key", [(1,)])
+
+    clock.now = 31
+    cache.check_version(lambda: 2)
+    assert cache.get("key") is None
+
+
+def test_same_version_keeps_cache(clock):
+    cache = QueryCache(version_interval=30, clock=clock)
+    cache.check_version(lambda: 1)
+    cache.put("key", [(1,)])
+
+    clock.now = 31
+    cache.check_version(lambda: 1)
+    assert cache.get("key") == [(1,)]
+
+
+def test_version_is_only_read_once_per_interval(clock):
+    cache = QueryCache(version_interval=30, clock=clock)
+    reads = []
+    read_version = lambda: reads.append(1) or len(reads)
+
+    for now in [0, 10, 29, 30, 45]:
+        clock.now = now
+        cache.check_version(read_version)
+    assert len(reads) == 2
+
+
+def test_unreadable_version_keeps_cache(clock):
+    cache = QueryCache(clock=clock)
+    cache.check_version(lambda: 1)
+    cache.put("key", [(1,)])
+
+    clock.now = 100
+    cache.check_version(lambda: None)
+    assert cache.get("key") == [(1,)]
+
+
+def test_make_key_includes_params_and_cursor_factory():
+    class RealDictCursor:
+        pass
+    assert make_key("SELECT %s", (1,)) != make_key("SELECT %s", (2,))
+    assert make_key("SELECT 1", None) != make_key("SELECT 1", None, RealDictCursor)
+
+
+DATA = [
+    ("SELECT 1", True),
+    ("\n    WITH x AS (SELECT 1) SELECT * FROM x", True),
+    ("select genre_name from genre", True),
+    ("UPDATE game SET game_name = 'x'", False)
+]
+@pytest.mark.parametrize("query, expected", DATA)
+def test_is_cacheable(query, expected):
+    assert is_cacheable(query) is expected
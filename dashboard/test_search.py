@@ -0,0 +1,77 @@
+# pylint: skip-file
+from unittest.mock import MagicMock
+
+import pytest
+import search
+
+
+def make_connection(rows):
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = rows
+    return conn, cursor
+
+
+DATA = [
+    ("  half   life ", "half life"),
+    ("Portal", "Portal"),
+    ("", ""),
+    (None, "")
+]
+@pytest.mark.parametrize("term, expected", DATA)
+def test_normalise_term(term, expected):
+    assert search.normalise_term(term) == expected
+
+
+def test_escape_like():
+    assert search.escape_like("100%_off\\") == "100\\%\\_off\\\\"
+
+
+def test_short_terms_only_match_prefix():
+    query, params = search.build_search_query("game", "ha")
+    assert "ILIKE" not in query and "%%" not in query
+    assert params["prefix"] == "ha%"
+
+
+def test_long_terms_match_anywhere_and_by_similarity():
+    query, params = search.build_search_query("developer", "Valve")
+    assert "developer_name ILIKE %(contains)s" in query
+    assert "developer_name %% %(term)s" in query
+    assert params == {"prefix": "valve%", "term": "Valve", "contains": "%Valve%"}
+
+
+def test_prefix_matches_are_ranked_first():
+    query, _ = search.build_search_query("publisher", "Sega")
+    order_by = query[query.index("ORDER BY"):]
+    assert order_by.index("LIKE %(prefix)s") < order_by.index("similarity(")
+
+
+def test_filters_are_added():
+    query, _ = search.build_search_query("game", "doom", ["is_nsfw = FALSE"])
+    assert "AND is_nsfw = FALSE" in query
+
+
+def test_unknown_table():
+    with pytest.raises(KeyError):
+        search.build_search_query("game; DROP TABLE game", "doom")
+
+
+def test_search_names_returns_names():
+    conn, cursor = make_connection([("Doom",), ("Doom Eternal",)])
+    assert search.search_names(conn, "game", " doom ", limit=5) == ["Doom", "Doom Eternal"]
+    params = cursor.execute.call_args[0][1]
+    assert params["term"] == "doom"
+    assert params["limit"] == 5
+
+
+def test_empty_search_does_not_query():
+    conn, _ = make_connection([])
+    assert search.search_names(conn, "game", "   ") == []
+    conn.cursor.assert_not_called()
+
+
+@pytest.mark.parametrize("include_nsfw, expected", [(True, "is_nsfw = TRUE"), (False, "is_nsfw = FALSE")])
+def test_search_games_nsfw_filter(include_nsfw, expected):
+    conn, cursor = make_connection([])
+    search.search_games(conn, "doom", include_nsfw)
+    assert expected in cursor.execute.call_args[0][0]
@@ -0,0 +1,120 @@
+# pylint: skip-file
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import marketplace
+import snapshot
+from test_queries import seeded_db, legacy_filtered_games, FILTERS, MARKETPLACE_COLUMNS
+
+SCHEMA = pa.schema([
+    ("platform_assignment_id", pa.int32()),
+    ("game_id", pa.int32()),
+    ("game_name", pa.string()),
+    ("game_image", pa.string()),
+    ("is_image_valid", pa.bool_()),
+    ("is_nsfw", pa.bool_()),
+    ("platform_name", pa.string()),
+    ("platform_release_date", pa.date32()),
+    ("platform_score", pa.int32()),
+    ("platform_price", pa.int32()),
+    ("platform_url", pa.string()),
+    ("genres", pa.list_(pa.string())),
+    ("tags", pa.list_(pa.string()))
+])
+
+
+def list_names(db, item, assignment_id):
+    return [row[0] for row in db.execute(f"""
+        SELECT x.{item}_name FROM {item}_game_platform_assignment xa
+        JOIN {item} x ON xa.{item}_id = x.{item}_id
+        WHERE xa.platform_assignment_id = ?""", (assignment_id,))]
+
+
+@pytest.fixture
+def games(seeded_db, tmp_path):
+    """Writes the seeded database as the pipeline's snapshot and reads it back."""
+    db = seeded_db.db
+    rows = []
+    for row in db.execute("""
+        SELECT gp.platform_assignment_id, g.game_id, g.game_name, g.game_image, g.is_image_valid, g.is_nsfw,
+               p.platform_name, gp.platform_release_date, gp.platform_score, gp.platform_price, gp.platform_url
+        FROM game_platform_assignment gp
+        JOIN game g ON gp.game_id = g.game_id
+        JOIN platform p ON gp.platform_id = p.platform_id""").fetchall():
+        row = dict(zip(SCHEMA.names, row))
+        row["is_nsfw"] = bool(row["is_nsfw"])
+        row["is_image_valid"] = bool(row["is_image_valid"])
+        row["genres"] = list_names(db, "genre", row["platform_assignment_id"])
+        row["tags"] = list_names(db, "tag", row["platform_assignment_id"])
+        rows.append(row)
+
+    # Several row groups, so the filters are run across chunks
+    pq.write_table(pa.Table.from_pylist(rows, schema=SCHEMA), tmp_path / "games.parquet", row_group_size=16)
+    return snapshot.read_snapshot(str(tmp_path / "games.parquet"))
+
+
+def as_rows(df):
+    return [tuple(row) for row in df.itertuples(index=False, name=None)]
+
+
+@pytest.mark.parametrize("genre, tag, price_range, platform, include_nsfw", FILTERS)
+def test_snapshot_pages_match_database(seeded_db, games, genre, tag, price_range, platform, include_nsfw):
+    expected = sorted(legacy_filtered_games(seeded_db, MARKETPLACE_COLUMNS, genre, tag,
+                                            price_range, platform, include_nsfw),
+                      key=lambda row: (row[2], row[4], row[7]), reverse=True)
+    expected = [row[:8] + (bool(row[8]),) for row in expected]
+
+    rows = []
+    after = None
+    while True:
+        page = snapshot.get_filtered_games(games, genre, tag, price_range, platform, 7, after, include_nsfw)
+        if page.empty:
+            break
+        rows.extend(as_rows(page))
+        after = marketplace.get_page_key(page)
+
+    assert rows == expected
+    assert snapshot.count_filtered_games(games, genre, tag, price_range, platform, include_nsfw) == len(expected)
+
+
+def test_snapshot_counts_match_database(seeded_db, games):
+    db = seeded_db.db
+    for item, get_counts in [("genre", snapshot.get_number_of_games_by_genre),
+                             ("tag", snapshot.get_number_of_games_by_tag)]:
+        expected = db.execute(f"""
+            SELECT x.{item}_name, COUNT(DISTINCT gp.game_id) FROM {item} x
+            JOIN {item}_game_platform_assignment xa ON x.{item}_id = xa.{item}_id
+            JOIN game_platform_assignment gp ON xa.platform_assignment_id = gp.platform_assignment_id
+            GROUP BY x.{item}_name""").fetchall()
+        result = get_counts(games)
+        assert sorted(as_rows(result)) == sorted(expected)
+        assert result["game_count"].is_monotonic_decreasing
+
+    expected = db.execute("""
+        SELECT p.platform_name, COUNT(*) FROM game_platform_assignment gp
+        JOIN game g ON g.game_id = gp.game_id JOIN platform p ON gp.platform_id = p.platform_id
+        WHERE g.is_nsfw = 0 GROUP BY p.platform_name""").fetchall()
+    assert sorted(as_rows(snapshot.get_number_of_games_by_platform(games))) == sorted(expected)
+
+
+@pytest.mark.parametrize("genre, tag, price_range, platform, include_nsfw", FILTERS)
+def test_snapshot_analytics_games_match_database(seeded_db, games, genre, tag, price_range, platform, include_nsfw):
+    select = "SELECT DISTINCT g.game_name, g.game_image, gp.platform_score, gp.platform_price, p.platform_name, g.is_nsfw"
+    expected = [row[:5] + (bool(row[5]),) for row in
+                legacy_filtered_games(seeded_db, select, genre, tag, price_range, platform, include_nsfw)]
+    result = snapshot.get_analytics_games(games, genre, tag, price_range, platform, include_nsfw=include_nsfw)
+    assert sorted(as_rows(result)) == sorted(expected)
+
+
+def test_snapshot_top_games(games):
+    result = snapshot.get_analytics_games(games, top_n=5)
+    assert len(result) == 5
+    assert list(result["platform_score"]) == sorted(result["platform_score"], reverse=True)
+
+
+def test_use_snapshot(monkeypatch):
+    monkeypatch.delenv("SNAPSHOT_PATH", raising=False)
+    assert snapshot.use_snapshot() is False
+    monkeypatch.setenv("SNAPSHOT_PATH", "games.parquet")
+    assert snapshot.use_snapshot() is True
@@ -0,0 +1,142 @@
+# pylint: skip-file
+from unittest.mock import MagicMock
+
+import pytest
+
+from subscriptions import (WEEKLY_DIGEST, TopicCache, get_topic_name, get_subscribed_topics, save_subscriptions,
+                           subscribe)
+
+
+def make_database(rows=None):
+    """A mock of the dashboard's Database, whose cursors return the rows in turn."""
+    database = MagicMock()
+    cursor = MagicMock()
+    cursor.__enter__.return_value = cursor
+    cursor.fetchone.side_effect = list(rows or [None])
+    database.cursor.return_value = cursor
+    return database, cursor
+
+
+DATA = [("Action", "play_stream_action"), ("Free to Play", "play_stream_free_to_play"),
+        (WEEKLY_DIGEST, "play_stream_weekly_digest")]
+@pytest.mark.parametrize("genre, expected", DATA)
+def test_get_topic_name(genre, expected):
+    assert get_topic_name(genre) == expected
+
+
+class FakeSNS:
+    """A local stand in for SNS, recording each topic created and subscribed to."""
+
+    def __init__(self, failures=()):
+        self.failures = set(failures)
+        self.created = []
+        self.subscribed = []
+
+    def create_topic(self, Name):
+        self.created.append(Name)
+        return {"TopicArn": f"arn:{Name}"}
+
+    def subscribe(self, TopicArn, Protocol, Endpoint, ReturnSubscriptionArn):
+        if TopicArn in self.failures:
+            raise RuntimeError("SNS is down")
+        self.subscribed.append(TopicArn)
+        return {"SubscriptionArn": f"{TopicArn}:{Endpoint}"}
+
+
+def make_service_database(subscribed=(), known_arns=None):
+    """A mock Database answering the subscription check, the topic ARN lookup and the subscriber upsert."""
+    database = MagicMock()
+    cursor = MagicMock()
+    cursor.__enter__.return_value = cursor
+    cursor.fetchall.side_effect = [[{"topic_name": topic_name} for topic_name in subscribed],
+                                   [{"topic_name": name, "topic_arn": arn} for name, arn in (known_arns or {}).items()]]
+    cursor.fetchone.return_value = {"subscriber_id": 7}
+    database.cursor.return_value = cursor
+    return database, cursor
+
+
+def test_get_subscribed_topics_one_query():
+    database, cursor = make_service_database(["play_stream_action"])
+
+    assert get_subscribed_topics(database, "a@x.com", ["play_stream_action", "play_stream_rpg"]) == {"play_stream_action"}
+    database.cursor.assert_called_once_with(cached=False)
+    assert cursor.execute.call_args.args[1] == ("a@x.com", ["play_stream_action", "play_stream_rpg"])
+
+
+def test_save_subscriptions_commits_once():
+    database, cursor = make_database([{"subscriber_id": 7}])
+    save_subscriptions(database, "a@x.com", [("play_stream_action", "arn:action", "arn:sub1"),
+                                             ("play_stream_rpg", "arn:rpg", "arn:sub2")], "Ada", "")
+
+    subscriber, subscription = cursor.execute.call_args_list
+    assert subscriber.args[1] == ("a@x.com", "Ada", None, None, False)
+    assert subscription.args[1] == (7, ["play_stream_action", "play_stream_rpg"], ["arn:action", "arn:rpg"],
+                                    ["arn:sub1", "arn:sub2"])
+    cursor.connection.commit.assert_called_once()
+
+
+@pytest.mark.parametrize("price_range, expected", [
+    ("Free", ("Free", True)),
+    ("Any", (None, True)),
+    (None, (None, False))
+])
+def test_save_subscriptions_price_range(price_range, expected):
+    database, cursor = make_database([{"subscriber_id": 7}])
+    save_subscriptions(database, "a@x.com", [("play_stream_weekly_digest", "arn:topic", "arn:sub")],
+                       price_range=price_range)
+
+    assert cursor.execute.call_args_list[0].args[1][3:] == expected
+
+
+def test_topic_cache_reads_each_topic_once():
+    database, cursor = make_service_database()
+    cursor.fetchall.side_effect = [[{"topic_name": "play_stream_action", "topic_arn": "arn:action"}]]
+    sns = FakeSNS()
+    cache = TopicCache()
+
+    assert cache.get_arns(sns, database, ["play_stream_action", "play_stream_rpg"]) == {
+        "play_stream_action": "arn:action", "play_stream_rpg": "arn:play_stream_rpg"}
+    assert cache.get_arns(sns, database, ["play_stream_rpg", "play_stream_action"]) == {
+        "play_stream_rpg": "arn:play_stream_rpg", "play_stream_action": "arn:action"}
+    assert cursor.execute.call_count == 1
+    assert sns.created == ["play_stream_rpg"]
+
+
+def test_subscribe_skips_subscribed_topics():
+    database, cursor = make_service_database(["play_stream_action"], {"play_stream_rpg": "arn:rpg"})
+    sns = FakeSNS()
+
+    results = subscribe(sns, database, "a@x.com", ["play_stream_action", "play_stream_rpg",
+                                                   "play_stream_weekly_digest"], TopicCache(), price_range="Free")
+
+    assert results == {"play_stream_action": "already subscribed", "play_stream_rpg": "subscribed",
+                       "play_stream_weekly_digest": "subscribed"}
+    assert sorted(sns.subscribed) == ["arn:play_stream_weekly_digest", "arn:rpg"]
+    subscriber, subscription = cursor.execute.call_args_list[2:]
+    assert subscriber.args[1][3:] == ("Free", True)
+    assert subscription.args[1][1] == ["play_stream_rpg", "play_stream_weekly_digest"]
+    cursor.connection.commit.assert_called_once()
+
+
+def test_subscribe_keeps_going_when_one_fails():
+    database, cursor = make_service_database()
+    sns = FakeSNS(failures=["arn:play_stream_rpg"])
+
+    results = subscribe(sns, database, "a@x.com", ["play_stream_action", "play_stream_rpg"], TopicCache(),
+                        price_range="Free")
+
+    assert results == {"play_stream_action": "subscribed", "play_stream_rpg": "SNS is down"}
+    subscriber, subscription = cursor.execute.call_args_list[2:]
+    # the weekly digest wasn't chosen, so the price range is left as it was
+    assert subscriber.args[1][3:] == (None, False)
+    assert subscription.args[1][1] == ["play_stream_action"]
+
+
+def test_subscribe_already_subscribed_to_everything():
+    database, cursor = make_service_database(["play_stream_action"])
+    sns = FakeSNS()
+
+    assert subscribe(sns, database, "a@x.com", ["play_stream_action"], TopicCache()) == {
+        "play_stream_action": "already subscribed"}
+    assert cursor.execute.call_count == 1
+    assert sns.subscribed == []
@@ -1,4 +1,11 @@
 -- Dropping all of the tables
+DROP MATERIALIZED VIEW IF EXISTS "platform_summary";
+DROP MATERIALIZED VIEW IF EXISTS "genre_game_count";
+DROP MATERIALIZED VIEW IF EXISTS "tag_game_count";
+DROP MATERIALIZED VIEW IF EXISTS "platform_genre_count";
+DROP MATERIALIZED VIEW IF EXISTS "platform_developer_count";
+DROP MATERIALIZED VIEW IF EXISTS "platform_publisher_count";
+DROP MATERIALIZED VIEW IF EXISTS "platform_age_rating_count";
 DROP TABLE IF EXISTS "game" CASCADE;
 DROP TABLE IF EXISTS "genre" CASCADE;
 DROP TABLE IF EXISTS "genre_game_platform_assignment" CASCADE;
@@ -11,6 +18,20 @@ DROP TABLE IF EXISTS "platform" CASCADE;
 DROP TABLE IF EXISTS "developer_game_assignment" CASCADE;
 DROP TABLE IF EXISTS "publisher_game_assignment" CASCADE;
 DROP TABLE IF EXISTS "age_rating" CASCADE;
+DROP TABLE IF EXISTS "pipeline_run" CASCADE;
+DROP TABLE IF EXISTS "pipeline_checkpoint" CASCADE;
+DROP TABLE IF EXISTS "page_state" CASCADE;
+DROP TABLE IF EXISTS "price_history" CASCADE;
+DROP TABLE IF EXISTS "score_history" CASCADE;
+DROP TABLE IF EXISTS "data_version" CASCADE;
+DROP TABLE IF EXISTS "game_facet" CASCADE;
+DROP TABLE IF EXISTS "subscriber" CASCADE;
+DROP TABLE IF EXISTS "subscription" CASCADE;
+DROP TABLE IF EXISTS "game_event" CASCADE;
+DROP TABLE IF EXISTS "email_outbox" CASCADE;
+
+-- Trigram matching for the dashboard's name search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 -- Creating all of the tables
 
@@ -19,7 +40,8 @@ CREATE TABLE "game"(
     "game_name" VARCHAR(100) NOT NULL,
     "game_image" VARCHAR(255) NOT NULL,
     "age_rating_id" SMALLINT NOT NULL,
-    "is_nsfw" BOOLEAN NOT NULL
+    "is_nsfw" BOOLEAN NOT NULL,
+    "is_image_valid" BOOLEAN NOT NULL DEFAULT FALSE
 );
 
 CREATE TABLE "genre"(
@@ -88,6 +110,142 @@ CREATE TABLE "age_rating"(
     "age_rating_name" VARCHAR(25) NOT NULL
 );
 
+-- Creating the pipeline run tables, used to resume a run that didn't finish
+CREATE TABLE "pipeline_run"(
+    "run_id" INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    "platform_id" SMALLINT NOT NULL,
+    "target_date" DATE NOT NULL,
+    "status" VARCHAR(10) NOT NULL DEFAULT 'running',
+    "started_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "finished_at" TIMESTAMP
+);
+
+CREATE TABLE "pipeline_checkpoint"(
+    "checkpoint_id" INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    "run_id" INT NOT NULL,
+    "platform_url" VARCHAR(255) NOT NULL,
+    "raw_data" JSONB,
+    "extracted_at" TIMESTAMP,
+    "transformed_at" TIMESTAMP,
+    "loaded_at" TIMESTAMP,
+    UNIQUE ("run_id", "platform_url")
+);
+
+-- Creating the page state table, used to skip store pages that haven't changed
+CREATE TABLE "page_state"(
+    "platform_url" VARCHAR(255) PRIMARY KEY,
+    "etag" VARCHAR(255),
+    "last_modified" VARCHAR(50),
+    "content_fingerprint" CHAR(64),
+    "data_fingerprint" CHAR(64),
+    "checked_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Creating the data version table, a single row the pipelines increment after each load
+-- so the dashboard knows when its cached query results are stale
+CREATE TABLE "data_version"(
+    "data_version_id" SMALLINT PRIMARY KEY DEFAULT 1 CHECK ("data_version_id" = 1),
+    "version" INT NOT NULL DEFAULT 0,
+    "updated_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- The dashboard's filter facets, one row per game on each platform with everything it can be filtered by.
+-- The pipelines upsert the listings they change and the dashboard reads the rows updated since it last looked
+CREATE TABLE "game_facet"(
+    "platform_assignment_id" SMALLINT PRIMARY KEY,
+    "platform_name" VARCHAR(20) NOT NULL,
+    "platform_price" SMALLINT NOT NULL,
+    "is_nsfw" BOOLEAN NOT NULL,
+    "genres" TEXT[] NOT NULL,
+    "tags" TEXT[] NOT NULL,
+    "updated_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- The outbox of games the pipelines have loaded, one row per load with the ids and genres of its new releases.
+-- The new games notifier reads the unprocessed events in order and marks them processed once it has sent them
+CREATE TABLE "game_event"(
+    "event_id" BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    "event_type" VARCHAR(20) NOT NULL,
+    "payload" JSONB NOT NULL,
+    "created_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "processed_at" TIMESTAMP
+);
+
+-- Every email the email lambdas send, one row per recipient of each digest (daily:2025-03-01, weekly:2025-W10).
+-- The recipients are added as pending, claimed as sending by the run sending them and updated with the result,
+-- so a retry only sends to the ones that haven't been sent
+CREATE TABLE "email_outbox"(
+    "outbox_id" BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    "recipient" VARCHAR(255) NOT NULL,
+    "digest_key" VARCHAR(50) NOT NULL,
+    "status" VARCHAR(10) NOT NULL DEFAULT 'pending' CHECK ("status" IN ('pending', 'sending', 'sent', 'failed')),
+    "attempts" SMALLINT NOT NULL DEFAULT 0,
+    "message_id" VARCHAR(100),
+    "error" TEXT,
+    "created_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updated_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE ("digest_key", "recipient")
+);
+
+-- Creating the subscription tables, the record of who is subscribed to each SNS topic.
+-- The dashboard adds a pending subscription when someone subscribes and a reconciler
+-- brings the statuses in line with SNS, so emails are sent without listing every topic
+CREATE TABLE "subscriber"(
+    "subscriber_id" INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    "email" VARCHAR(255) NOT NULL UNIQUE,
+    "first_name" VARCHAR(50),
+    "last_name" VARCHAR(50),
+    -- The price range the weekly digest picks games in for them, NULL for any price
+    "price_range" VARCHAR(20),
+    "created_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE "subscription"(
+    "subscription_id" INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    "subscriber_id" INT NOT NULL,
+    "topic_name" VARCHAR(256) NOT NULL,
+    "topic_arn" VARCHAR(255) NOT NULL,
+    "subscription_arn" VARCHAR(255),
+    "status" VARCHAR(10) NOT NULL DEFAULT 'pending',
+    "updated_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE ("subscriber_id", "topic_name")
+);
+
+-- Creating the history tables, a row is only added when a price or score changes
+-- They are partitioned by year, add next year's partition before it starts
+CREATE TABLE "price_history"(
+    "price_history_id" INT GENERATED ALWAYS AS IDENTITY,
+    "platform_assignment_id" SMALLINT NOT NULL,
+    "platform_price" SMALLINT NOT NULL,
+    "platform_discount" SMALLINT NOT NULL,
+    "recorded_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY ("price_history_id", "recorded_at")
+) PARTITION BY RANGE ("recorded_at");
+
+CREATE TABLE "price_history_2025" PARTITION OF "price_history"
+    FOR VALUES FROM ('2025-01-01') TO ('2026-01-01');
+CREATE TABLE "price_history_2026" PARTITION OF "price_history"
+    FOR VALUES FROM ('2026-01-01') TO ('2027-01-01');
+CREATE TABLE "price_history_2027" PARTITION OF "price_history"
+    FOR VALUES FROM ('2027-01-01') TO ('2028-01-01');
+CREATE TABLE "price_history_default" PARTITION OF "price_history" DEFAULT;
+
+CREATE TABLE "score_history"(
+    "score_history_id" INT GENERATED ALWAYS AS IDENTITY,
+    "platform_assignment_id" SMALLINT NOT NULL,
+    "platform_score" SMALLINT NOT NULL,
+    "recorded_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY ("score_history_id", "recorded_at")
+) PARTITION BY RANGE ("recorded_at");
+
+CREATE TABLE "score_history_2025" PARTITION OF "score_history"
+    FOR VALUES FROM ('2025-01-01') TO ('2026-01-01');
+CREATE TABLE "score_history_2026" PARTITION OF "score_history"
+    FOR VALUES FROM ('2026-01-01') TO ('2027-01-01');
+CREATE TABLE "score_history_2027" PARTITION OF "score_history"
+    FOR VALUES FROM ('2027-01-01') TO ('2028-01-01');
+CREATE TABLE "score_history_default" PARTITION OF "score_history" DEFAULT;
+
 -- Adding all of the constraints for each table
 
 -- Developer Game Assignment
@@ -126,6 +284,76 @@ ALTER TABLE "game_platform_assignment"
     ADD CONSTRAINT "game_platform_assignment_game_id_foreign" 
     FOREIGN KEY("game_id") REFERENCES "game"("game_id");
 
+-- Matches the marketplace ordering, so each page can seek straight to its first row
+CREATE INDEX "game_platform_assignment_score_release_date_index"
+    ON "game_platform_assignment"
+    ("platform_score" DESC, "platform_release_date" DESC, "platform_assignment_id" DESC);
+
+CREATE INDEX "game_platform_assignment_platform_price_index"
+    ON "game_platform_assignment" ("platform_price");
+
+-- The daily genre email only reads the listings released since yesterday
+CREATE INDEX "game_platform_assignment_platform_release_date_index"
+    ON "game_platform_assignment" ("platform_release_date");
+
+-- The new games notifier reads the listings of the games in each event
+CREATE INDEX "game_platform_assignment_game_id_index"
+    ON "game_platform_assignment" ("game_id");
+
+-- Looked up by platform_assignment_id when filtering by genre or tag
+CREATE INDEX "genre_game_platform_assignment_platform_assignment_id_index"
+    ON "genre_game_platform_assignment" ("platform_assignment_id", "genre_id");
+
+CREATE INDEX "tag_game_platform_assignment_platform_assignment_id_index"
+    ON "tag_game_platform_assignment" ("platform_assignment_id", "tag_id");
+
+-- Name search, the GIN trigram indexes find names containing or similar to the search term
+-- and the lower case indexes find names starting with it
+CREATE INDEX "game_game_name_trigram_index"
+    ON "game" USING GIN ("game_name" gin_trgm_ops);
+
+CREATE INDEX "game_game_name_prefix_index"
+    ON "game" (lower("game_name") text_pattern_ops);
+
+CREATE INDEX "developer_developer_name_trigram_index"
+    ON "developer" USING GIN ("developer_name" gin_trgm_ops);
+
+CREATE INDEX "developer_developer_name_prefix_index"
+    ON "developer" (lower("developer_name") text_pattern_ops);
+
+CREATE INDEX "publisher_publisher_name_trigram_index"
+    ON "publisher" USING GIN ("publisher_name" gin_trgm_ops);
+
+CREATE INDEX "publisher_publisher_name_prefix_index"
+    ON "publisher" (lower("publisher_name") text_pattern_ops);
+
+-- Game Facet
+ALTER TABLE "game_facet" 
+    ADD CONSTRAINT "game_facet_platform_assignment_id_foreign" 
+    FOREIGN KEY("platform_assignment_id") REFERENCES "game_platform_assignment"("platform_assignment_id");
+
+CREATE INDEX "game_facet_updated_at_index"
+    ON "game_facet" ("updated_at");
+
+-- Game Event
+-- The notifier only ever reads the events it hasn't processed yet
+CREATE INDEX "game_event_unprocessed_index"
+    ON "game_event" ("event_id") WHERE "processed_at" IS NULL;
+
+-- Email Outbox
+-- The new games notifier looks up the digests with recipients still to send by their status
+CREATE INDEX "email_outbox_status_digest_key_index"
+    ON "email_outbox" ("status", "digest_key");
+
+-- Subscription
+ALTER TABLE "subscription" 
+    ADD CONSTRAINT "subscription_subscriber_id_foreign" 
+    FOREIGN KEY("subscriber_id") REFERENCES "subscriber"("subscriber_id");
+
+-- The send path looks up the confirmed subscribers of a day's genres in one query
+CREATE INDEX "subscription_topic_name_confirmed_index"
+    ON "subscription" ("topic_name", "subscriber_id") WHERE "status" = 'confirmed';
+
 -- Publisher Game Assignment
 ALTER TABLE "publisher_game_assignment" 
     ADD CONSTRAINT "publisher_game_assignment_game_id_foreign" 
@@ -135,7 +363,132 @@ ALTER TABLE "publisher_game_assignment"
     ADD CONSTRAINT "publisher_game_assignment_publisher_id_foreign" 
     FOREIGN KEY("publisher_id") REFERENCES "publisher"("publisher_id");
 
+-- Pipeline Run
+ALTER TABLE "pipeline_run" 
+    ADD CONSTRAINT "pipeline_run_platform_id_foreign" 
+    FOREIGN KEY("platform_id") REFERENCES "platform"("platform_id");
+
+CREATE INDEX "pipeline_run_platform_id_status_index"
+    ON "pipeline_run" ("platform_id", "status");
+
+-- Pipeline Checkpoint
+ALTER TABLE "pipeline_checkpoint" 
+    ADD CONSTRAINT "pipeline_checkpoint_run_id_foreign" 
+    FOREIGN KEY("run_id") REFERENCES "pipeline_run"("run_id");
+
+-- Price History
+ALTER TABLE "price_history" 
+    ADD CONSTRAINT "price_history_platform_assignment_id_foreign" 
+    FOREIGN KEY("platform_assignment_id") REFERENCES "game_platform_assignment"("platform_assignment_id");
+
+CREATE INDEX "price_history_recorded_at_brin_index"
+    ON "price_history" USING BRIN ("recorded_at");
+
+CREATE INDEX "price_history_platform_assignment_id_recorded_at_index"
+    ON "price_history" ("platform_assignment_id", "recorded_at");
+
+-- Score History
+ALTER TABLE "score_history" 
+    ADD CONSTRAINT "score_history_platform_assignment_id_foreign" 
+    FOREIGN KEY("platform_assignment_id") REFERENCES "game_platform_assignment"("platform_assignment_id");
+
+CREATE INDEX "score_history_recorded_at_brin_index"
+    ON "score_history" USING BRIN ("recorded_at");
+
+CREATE INDEX "score_history_platform_assignment_id_recorded_at_index"
+    ON "score_history" ("platform_assignment_id", "recorded_at");
+
+-- Analytics aggregates, read by the dashboard instead of grouping the assignment tables on every page view.
+-- The pipelines refresh them concurrently after each load, which needs a unique index on each.
+CREATE MATERIALIZED VIEW "platform_summary" AS
+    SELECT p.platform_name,
+        COUNT(gp.platform_assignment_id) AS num_games,
+        COUNT(gp.platform_assignment_id) FILTER (WHERE NOT g.is_nsfw) AS num_sfw_games,
+        (SELECT COUNT(DISTINCT gga.genre_id)
+         FROM genre_game_platform_assignment gga
+         JOIN game_platform_assignment gp2 ON gga.platform_assignment_id = gp2.platform_assignment_id
+         WHERE gp2.platform_id = p.platform_id) AS num_genres
+    FROM platform p
+    JOIN game_platform_assignment gp ON p.platform_id = gp.platform_id
+    JOIN game g ON g.game_id = gp.game_id
+    GROUP BY p.platform_id, p.platform_name;
+
+CREATE UNIQUE INDEX "platform_summary_platform_name_index"
+    ON "platform_summary" ("platform_name");
+
+CREATE MATERIALIZED VIEW "genre_game_count" AS
+    SELECT ge.genre_name, COUNT(DISTINCT gp.game_id) AS game_count
+    FROM genre ge
+    JOIN genre_game_platform_assignment gga ON ge.genre_id = gga.genre_id
+    JOIN game_platform_assignment gp ON gga.platform_assignment_id = gp.platform_assignment_id
+    GROUP BY ge.genre_name;
+
+CREATE UNIQUE INDEX "genre_game_count_genre_name_index"
+    ON "genre_game_count" ("genre_name");
+
+CREATE MATERIALIZED VIEW "tag_game_count" AS
+    SELECT t.tag_name, COUNT(DISTINCT gp.game_id) AS game_count
+    FROM tag t
+    JOIN tag_game_platform_assignment tga ON t.tag_id = tga.tag_id
+    JOIN game_platform_assignment gp ON tga.platform_assignment_id = gp.platform_assignment_id
+    GROUP BY t.tag_name;
+
+CREATE UNIQUE INDEX "tag_game_count_tag_name_index"
+    ON "tag_game_count" ("tag_name");
+
+CREATE MATERIALIZED VIEW "platform_genre_count" AS
+    SELECT p.platform_name, ge.genre_name, COUNT(gp.game_id) AS num_games
+    FROM genre ge
+    JOIN genre_game_platform_assignment gga ON ge.genre_id = gga.genre_id
+    JOIN game_platform_assignment gp ON gga.platform_assignment_id = gp.platform_assignment_id
+    JOIN platform p ON gp.platform_id = p.platform_id
+    GROUP BY p.platform_name, ge.genre_name;
+
+CREATE UNIQUE INDEX "platform_genre_count_platform_name_genre_name_index"
+    ON "platform_genre_count" ("platform_name", "genre_name");
+
+CREATE MATERIALIZED VIEW "platform_developer_count" AS
+    SELECT p.platform_name, d.developer_name, COUNT(gp.game_id) AS num_games
+    FROM developer d
+    JOIN developer_game_assignment dga ON d.developer_id = dga.developer_id
+    JOIN game_platform_assignment gp ON dga.game_id = gp.game_id
+    JOIN platform p ON gp.platform_id = p.platform_id
+    GROUP BY p.platform_name, d.developer_name;
+
+CREATE UNIQUE INDEX "platform_developer_count_platform_name_developer_name_index"
+    ON "platform_developer_count" ("platform_name", "developer_name");
+
+CREATE INDEX "platform_developer_count_platform_name_num_games_index"
+    ON "platform_developer_count" ("platform_name", "num_games" DESC);
+
+CREATE MATERIALIZED VIEW "platform_publisher_count" AS
+    SELECT p.platform_name, pu.publisher_name, COUNT(gp.game_id) AS num_games
+    FROM publisher pu
+    JOIN publisher_game_assignment pga ON pu.publisher_id = pga.publisher_id
+    JOIN game_platform_assignment gp ON pga.game_id = gp.game_id
+    JOIN platform p ON gp.platform_id = p.platform_id
+    GROUP BY p.platform_name, pu.publisher_name;
+
+CREATE UNIQUE INDEX "platform_publisher_count_platform_name_publisher_name_index"
+    ON "platform_publisher_count" ("platform_name", "publisher_name");
+
+CREATE INDEX "platform_publisher_count_platform_name_num_games_index"
+    ON "platform_publisher_count" ("platform_name", "num_games" DESC);
+
+CREATE MATERIALIZED VIEW "platform_age_rating_count" AS
+    SELECT p.platform_name, ar.age_rating_name, COUNT(gp.game_id) AS num_games
+    FROM age_rating ar
+    JOIN game g ON ar.age_rating_id = g.age_rating_id
+    JOIN game_platform_assignment gp ON g.game_id = gp.game_id
+    JOIN platform p ON gp.platform_id = p.platform_id
+    GROUP BY p.platform_name, ar.age_rating_name;
+
+CREATE UNIQUE INDEX "platform_age_rating_count_platform_name_age_rating_name_index"
+    ON "platform_age_rating_count" ("platform_name", "age_rating_name");
+
 -- Seeding all of the data
+INSERT INTO "data_version" DEFAULT VALUES;
+
 INSERT INTO "platform" ("platform_name") 
 VALUES
     ('Steam'),
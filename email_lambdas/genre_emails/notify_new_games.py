@@ -0,0 +1,140 @@
+"""Emails the subscribers of each new game's genres within minutes of the pipelines loading it.
+The pipelines add a games_inserted event to the game_event outbox after each load, and this reads the
+unprocessed events in order, sends one digest per subscriber for all of them and marks them processed.
+Each run's events share a key in the email outbox, so a later run only retries the subscribers it didn't send"""
+import json
+import logging
+import psycopg2
+from psycopg2.extras import Json
+
+from send_emails import (SENDER, get_connection, get_games_by_id, get_games_dict, get_subscribers_for_genres,
+                         get_subscriber_games, build_digests, get_ses_connection)
+from email_outbox import MAX_SEND_ATTEMPTS, SENDING_TIMEOUT, add_recipients, send_once
+
+# The most events handled in one run, the rest are left for the next
+BATCH_SIZE = 100
+
+
+def claim_events(conn: psycopg2.connect, limit: int = BATCH_SIZE) -> list[dict]:
+    """Locks and returns the oldest unprocessed games_inserted events.
+    Events another run has locked are skipped, so overlapping runs never email the same games"""
+    query = """SELECT event_id, payload
+    FROM game_event
+    WHERE processed_at IS NULL
+    AND event_type = 'games_inserted'
+    ORDER BY event_id
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED;
+    """
+    with conn.cursor() as cur:
+        cur.execute(query, (limit,))
+        events = cur.fetchall()
+    print(f"Claimed {len(events)} events.")
+    return events
+
+
+def get_unsent_events(conn: psycopg2.connect) -> dict:
+    """Returns {digest_key: events} of the processed events with subscribers still to be sent,
+    those a failed run left pending or failed and the ones claimed by a run that stopped"""
+    query = """SELECT e.payload->>'digest_key' AS digest_key, e.event_id, e.payload
+    FROM game_event AS e
+    WHERE e.processed_at IS NOT NULL
+    AND e.payload->>'digest_key' IN (
+        SELECT DISTINCT digest_key
+        FROM email_outbox
+        WHERE digest_key LIKE 'new_games:%%'
+        AND attempts < %s
+        AND (status IN ('pending', 'failed')
+             OR (status = 'sending' AND updated_at < CURRENT_TIMESTAMP - %s::INTERVAL)))
+    ORDER BY e.event_id;
+    """
+    with conn.cursor() as cur:
+        cur.execute(query, (MAX_SEND_ATTEMPTS, SENDING_TIMEOUT))
+        rows = cur.fetchall()
+
+    unsent = {}
+    for row in rows:
+        unsent.setdefault(row["digest_key"], []).append(row)
+    return unsent
+
+
+def get_event_games(events: list[dict]) -> dict:
+    """Returns {game_id: genres} of the games in the events, merging a game that's in more than one"""
+    games = {}
+    for event in events:
+        for game in event["payload"]["games"]:
+            games.setdefault(game["game_id"], set()).update(game["genres"])
+    return games
+
+
+def get_digest_key(events: list[dict]) -> str:
+    """Returns the outbox key of the digest for the events, from their first and last ids"""
+    return f"new_games:{events[0]['event_id']}-{events[-1]['event_id']}"
+
+
+def build_messages(conn: psycopg2.connect, events: list[dict]) -> list[dict]:
+    """Builds one digest per subscriber of the events' genres with every one of their games in it"""
+    event_games = get_event_games(events)
+    games_dict = get_games_dict(get_games_by_id(conn, list(event_games)))
+
+    # the events already say which genres are new, so only their subscribers are read
+    subscribers_by_genre = get_subscribers_for_genres(conn, set().union(*event_games.values()))
+    subscriber_games = get_subscriber_games(games_dict, subscribers_by_genre)
+    messages = build_digests(games_dict, subscriber_games)
+    logging.info(f"Digests prepared for {len(messages)} subscribers from {len(events)} events.")
+    return messages
+
+
+def mark_processed(conn: psycopg2.connect, event_ids: list[int], digest_key: str) -> None:
+    """Marks the events processed, keeping the key of their digest in their payloads"""
+    query = """UPDATE game_event
+    SET processed_at = CURRENT_TIMESTAMP,
+        payload = payload || %s
+    WHERE event_id = ANY(%s);
+    """
+    with conn.cursor() as cur:
+        cur.execute(query, (Json({"digest_key": digest_key}), event_ids))
+
+
+def notify_new_games(conn: psycopg2.connect, ses_client=None) -> dict:
+    """Retries the subscribers earlier runs didn't send, then sends the subscribers of the new games'
+    genres one digest for every unprocessed event. The events are marked processed in the same
+    transaction that adds their subscribers to the email outbox, which then sends each of them once"""
+    ses_client = ses_client or get_ses_connection()
+    results = []
+    try:
+        for digest_key, events in get_unsent_events(conn).items():
+            results.extend(send_once(conn, ses_client, SENDER, digest_key, build_messages(conn, events)))
+
+        events = claim_events(conn)
+        if events:
+            digest_key = get_digest_key(events)
+            messages = build_messages(conn, events)
+            mark_processed(conn, [event["event_id"] for event in events], digest_key)
+            add_recipients(conn, digest_key, [message["recipient"] for message in messages])
+            results.extend(send_once(conn, ses_client, SENDER, digest_key, messages))
+        else:
+            conn.rollback()
+
+    except psycopg2.Error as e:
+        conn.rollback()
+        logging.error(f"Notifying subscribers of the new games failed: {e}")
+        raise
+
+    sent = sum(result["status"] == "sent" for result in results)
+    return {"events": len(events), "sent": sent, "failed": len(results) - sent}
+
+
+def lambda_handler(event, context):
+    """lambda handler function for aws lambda execution"""
+    logging.basicConfig(level=logging.INFO)
+    db_conn = get_connection()
+    try:
+        results = notify_new_games(db_conn)
+    finally:
+        db_conn.close()
+    return {'statusCode': 200, 'body': json.dumps(results)}
+
+
+if __name__ == "__main__":
+    lambda_handler(None, None)
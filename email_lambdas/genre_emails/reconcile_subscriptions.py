@@ -0,0 +1,139 @@
+"""Brings the subscription table in line with SNS, run on a schedule so the send path never has to list topics"""
+import logging
+import boto3
+import psycopg2
+
+from send_emails import TOPIC_PREFIX, sns_connect, get_connection
+
+PENDING_ARN = 'PendingConfirmation'
+
+
+def list_all(client: boto3.client, method: str, key: str, **params) -> list:
+    """Pages through an SNS list call, returning every item under the key"""
+    items = []
+    while True:
+        response = getattr(client, method)(**params)
+        items.extend(response.get(key, []))
+
+        params["NextToken"] = response.get("NextToken")
+        if not params["NextToken"]:
+            return items
+
+
+def get_topics(client: boto3.client) -> dict:
+    """Returns {topic_name: topic_arn} for the dashboard's topics"""
+    topics = {}
+    for topic in list_all(client, "list_topics", "Topics"):
+        topic_name = topic["TopicArn"].split(":")[-1]
+        if topic_name.startswith(TOPIC_PREFIX):
+            topics[topic_name] = topic["TopicArn"]
+    print(f"Found {len(topics)} topics.")
+    return topics
+
+
+def get_sns_subscriptions(client: boto3.client, topics: dict) -> list[dict]:
+    """Returns the email subscriptions to each topic, one per subscriber and topic.
+    A confirmed subscription wins over a pending one for the same email"""
+    subscriptions = {}
+    for topic_name, topic_arn in topics.items():
+        for sub in list_all(client, "list_subscriptions_by_topic", "Subscriptions", TopicArn=topic_arn):
+            if sub["Protocol"] != "email":
+                continue
+
+            is_pending = sub["SubscriptionArn"] == PENDING_ARN
+            key = (topic_name, sub["Endpoint"])
+            if is_pending and key in subscriptions:
+                continue
+
+            subscriptions[key] = {
+                "topic_name": topic_name,
+                "topic_arn": topic_arn,
+                "email": sub["Endpoint"],
+                "subscription_arn": None if is_pending else sub["SubscriptionArn"],
+                "status": "pending" if is_pending else "confirmed"
+            }
+    print(f"Found {len(subscriptions)} subscriptions.")
+    return list(subscriptions.values())
+
+
+def get_database_time(conn: psycopg2.connect):
+    """Returns the database's current time"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT CURRENT_TIMESTAMP::TIMESTAMP AS now;")
+        return cur.fetchone()["now"]
+
+
+def save_subscriptions(conn: psycopg2.connect, topics: dict, subscriptions: list[dict], listed_at) -> None:
+    """Upserts the subscribers and subscriptions found in SNS, and deletes the subscriptions to
+    those topics that SNS no longer has. Subscriptions the dashboard added after listed_at are
+    kept, as they may not have been listed"""
+    columns = {column: [sub[column] for sub in subscriptions]
+               for column in ["topic_name", "topic_arn", "email", "subscription_arn", "status"]}
+    params = {**columns, "topics": list(topics), "listed_at": listed_at}
+
+    subscriber_query = """INSERT INTO subscriber (email)
+    SELECT DISTINCT email FROM UNNEST(%(email)s::TEXT[]) AS email
+    ON CONFLICT (email) DO NOTHING;
+    """
+
+    subscription_query = """INSERT INTO subscription (subscriber_id, topic_name, topic_arn, subscription_arn, status)
+    SELECT sb.subscriber_id, s.topic_name, s.topic_arn, s.subscription_arn, s.status
+    FROM UNNEST(%(topic_name)s::TEXT[], %(topic_arn)s::TEXT[], %(email)s::TEXT[],
+                %(subscription_arn)s::TEXT[], %(status)s::TEXT[])
+        AS s(topic_name, topic_arn, email, subscription_arn, status)
+    JOIN subscriber AS sb ON sb.email = s.email
+    ON CONFLICT (subscriber_id, topic_name) DO UPDATE SET
+        topic_arn = EXCLUDED.topic_arn,
+        subscription_arn = COALESCE(EXCLUDED.subscription_arn, subscription.subscription_arn),
+        status = EXCLUDED.status,
+        updated_at = CURRENT_TIMESTAMP;
+    """
+
+    delete_query = """DELETE FROM subscription AS s
+    USING subscriber AS sb
+    WHERE s.subscriber_id = sb.subscriber_id
+    AND s.topic_name = ANY(%(topics)s)
+    AND s.updated_at < %(listed_at)s
+    AND NOT EXISTS (
+        SELECT 1 FROM UNNEST(%(topic_name)s::TEXT[], %(email)s::TEXT[]) AS listed(topic_name, email)
+        WHERE listed.topic_name = s.topic_name AND listed.email = sb.email);
+    """
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(subscriber_query, params)
+            cur.execute(subscription_query, params)
+            cur.execute(delete_query, params)
+            deleted = cur.rowcount
+        conn.commit()
+        logging.info(f"Saved {len(subscriptions)} subscriptions and deleted {deleted}.")
+
+    except psycopg2.Error as e:
+        conn.rollback()
+        logging.error(f"Saving the subscriptions failed: {e}")
+        raise
+
+
+def reconcile_subscriptions(client: boto3.client, conn: psycopg2.connect) -> int:
+    """Reads every subscription to the dashboard's topics from SNS and saves them,
+    returning the number of subscriptions found"""
+    listed_at = get_database_time(conn)
+    topics = get_topics(client)
+    subscriptions = get_sns_subscriptions(client, topics)
+    save_subscriptions(conn, topics, subscriptions, listed_at)
+    return len(subscriptions)
+
+
+def lambda_handler(event, context):
+    """lambda handler function for aws lambda execution"""
+    logging.basicConfig(level=logging.INFO)
+    db_conn = get_connection()
+    try:
+        found = reconcile_subscriptions(sns_connect(), db_conn)
+    finally:
+        db_conn.close()
+    return {'statusCode': 200, 'body': f'Reconciled {found} subscriptions.'}
+
+
+if __name__ == "__main__":
+    lambda_handler(None, None)
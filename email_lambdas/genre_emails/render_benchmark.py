@@ -0,0 +1,85 @@
+"""Benchmarks building the daily digests for generated games and subscribers,
+comparing it to rendering every digest in full and failing if it's over its budget.
+Needs nothing but this folder's requirements, no emails are sent."""
+from argparse import ArgumentParser
+from random import Random
+from time import perf_counter
+import sys
+
+from send_emails import get_subscriber_games, build_digests, generate_game_html, generate_html
+
+GENRES = ["Action", "Adventure", "RPG", "Strategy", "Simulation", "Puzzle", "Racing", "Sports", "Horror",
+          "Indie", "Casual", "Platformer", "Shooter", "Fighting", "Survival", "Open World", "Sandbox",
+          "Roguelike", "Visual Novel", "Card Game", "Music", "Stealth", "Tower Defense", "Metroidvania"]
+
+# The slowest build of the digests allowed, in seconds
+BUDGET = 2
+
+
+def make_games(count: int, random: Random) -> dict:
+    """Makes a day's new games in the shape the lambda builds them, each in one to four genres."""
+    return {
+        f"Game {i}": {
+            "game_id": i,
+            "genres": set(random.sample(GENRES, random.randint(1, 4))),
+            "release_date": "2025-03-01",
+            "game_image": f"https://images.example.com/{i}.jpg",
+            "final_price": f"£{random.randint(0, 6000) / 100:.2f}",
+            "platform": random.choice(["Steam", "GOG", "Epic"])
+        }
+        for i in range(count)
+    }
+
+
+def make_subscribers(count: int, random: Random) -> dict:
+    """Makes the subscribers of each genre, each subscriber in one to eight genres."""
+    subscribers_by_genre = {genre: [] for genre in GENRES}
+    for i in range(count):
+        for genre in random.sample(GENRES, random.randint(1, 8)):
+            subscribers_by_genre[genre].append(f"user{i}@example.com")
+    return subscribers_by_genre
+
+
+def render_every_digest(games_dict: dict, subscriber_games: dict) -> list[str]:
+    """Renders each subscriber's digest in full, without sharing any of the HTML."""
+    return [generate_html(data["genres"], [generate_game_html(game_name, games_dict[game_name])
+                                           for game_name in data["games"]])
+            for data in subscriber_games.values()]
+
+
+def init_args():
+    """Gets the number of subscribers and games from the command line"""
+    parser = ArgumentParser(description="Benchmarks building the daily genre digests")
+    parser.add_argument("-s", "--subscribers", type=int, default=10000, help="The number of subscribers")
+    parser.add_argument("-g", "--games", type=int, default=50, help="The number of new games")
+    return parser.parse_args()
+
+
+def main():
+    """Builds the digests for the generated subscribers and prints how long it took."""
+    args = init_args()
+    random = Random(0)
+    games_dict = make_games(args.games, random)
+    subscribers_by_genre = make_subscribers(args.subscribers, random)
+
+    start = perf_counter()
+    subscriber_games = get_subscriber_games(games_dict, subscribers_by_genre)
+    messages = build_digests(games_dict, subscriber_games)
+    built = perf_counter() - start
+
+    start = perf_counter()
+    render_every_digest(games_dict, subscriber_games)
+    rendered = perf_counter() - start
+
+    size = sum(len(message["html"]) for message in messages) / len(messages)
+    print(f"{len(messages)} digests of {size / 1024:.1f}KB on average")
+    print(f"built in {built:.2f}s, rendering every digest in full took {rendered:.2f}s")
+
+    if built > BUDGET:
+        print(f"Building the digests took {built:.2f}s, over the {BUDGET}s budget")
+        sys.exit(1)
+    print(f"Building the digests was under the {BUDGET}s budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,35 @@
 import boto3
 import json
-from os import environ as ENV
+from os import environ as ENV, path
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 from collections import defaultdict
 import psycopg2
 import logging
 from psycopg2.extras import RealDictCursor
+from botocore.config import Config
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup
+
+from ses_sender import MAX_WORKERS
+from email_outbox import get_shard, send_once
 
 # Load environment variables from .env file
 load_dotenv()
 
+SENDER = 'trainee.jamie.groom@sigmalabs.co.uk'
+
+# The email templates are compiled once, when the lambda starts
+TEMPLATES = Environment(
+    loader=FileSystemLoader(path.join(path.dirname(path.abspath(__file__)), 'templates')),
+    autoescape=select_autoescape(['html'])
+)
+GAME_TEMPLATE = TEMPLATES.get_template('game.html')
+DIGEST_TEMPLATE = TEMPLATES.get_template('daily_digest.html')
+
+# Every topic the dashboard subscribes people to starts with this
+TOPIC_PREFIX = 'play_stream_'
+
 
 def sns_connect() -> boto3.client:
     """Connect to sns client"""
@@ -39,209 +58,189 @@ def get_connection() -> psycopg2.connect:
     return connection
 
 
-def get_new_games(conn: psycopg2.connect) -> list:
-    """Queries database for games released in past 24h"""
-    previous_day = (datetime.now() - timedelta(days=1)).date()
-    print(f"Fetching games released since {previous_day}...")
-
-    query = """SELECT 
-    g.game_id, 
-    g.game_name, 
-    g.game_image, 
-    STRING_AGG(ge.genre_name, ', ') AS genre_names,
-    p.platform_release_date, 
+# One row per game with all of its genres and the platform it's cheapest on, from the listings matching the filter
+GAMES_QUERY = """WITH new_listing AS (
+        SELECT
+        platform_assignment_id,
+        game_id,
+        platform_id,
+        platform_release_date,
+        platform_price,
+        platform_discount,
+        platform_price * (1 - platform_discount / 100.0) AS sale_price
+        FROM game_platform_assignment
+        WHERE {listing_filter}
+    ),
+    best_listing AS (
+        SELECT DISTINCT ON (game_id) *
+        FROM new_listing
+        ORDER BY game_id, sale_price, platform_release_date, platform_assignment_id
+    ),
+    game_genres AS (
+        SELECT
+        nl.game_id,
+        ARRAY_AGG(DISTINCT ge.genre_name ORDER BY ge.genre_name) AS genres
+        FROM new_listing AS nl
+        JOIN genre_game_platform_assignment AS gp USING (platform_assignment_id)
+        JOIN genre AS ge USING (genre_id)
+        GROUP BY nl.game_id
+    )
+    SELECT
+    g.game_id,
+    g.game_name,
+    g.game_image,
+    gg.genres,
+    b.platform_release_date,
     pl.platform_name,
     -- calc discount
-    CASE 
-        WHEN p.platform_discount > 0 
-        THEN CONCAT('£', ROUND((p.platform_price * (1 - p.platform_discount / 100.0)) / 100.0, 2)) 
-        WHEN p.platform_price = 0 
+    CASE
+        WHEN b.platform_discount > 0
+        THEN CONCAT('£', ROUND(b.sale_price / 100.0, 2))
+        WHEN b.platform_price = 0
         THEN 'Free'
-        ELSE CONCAT('£', ROUND(p.platform_price / 100.0, 2))
+        ELSE CONCAT('£', ROUND(b.platform_price / 100.0, 2))
     END AS final_price,
-    CASE 
-        WHEN p.platform_discount > 0 THEN CONCAT(p.platform_discount, '%% off')
+    CASE
+        WHEN b.platform_discount > 0 THEN CONCAT(b.platform_discount, '%% off')
         ELSE 'No discount'
     END AS discount_info
-    FROM game AS g
-    JOIN game_platform_assignment AS p USING (game_id)
-    JOIN genre_game_platform_assignment AS gp USING (platform_assignment_id)
-    JOIN genre AS ge USING (genre_id)
+    FROM best_listing AS b
+    JOIN game AS g USING (game_id)
+    JOIN game_genres AS gg USING (game_id)
     JOIN platform AS pl USING (platform_id)
-    WHERE p.platform_release_date >= %s
-    GROUP BY g.game_id, g.game_name, g.game_image, p.platform_release_date, pl.platform_name, p.platform_price, p.platform_discount;
+    ORDER BY g.game_name;
     """
 
+
+def get_new_games(conn: psycopg2.connect) -> list:
+    """Queries database for games released in past 24h, one row per game with all of its genres
+    and the platform it's cheapest on. Only the new listings are read, using the release date index"""
+    previous_day = (datetime.now() - timedelta(days=1)).date()
+    print(f"Fetching games released since {previous_day}...")
+
     with conn.cursor() as cur:
-        cur.execute(query, (previous_day,))
+        cur.execute(GAMES_QUERY.format(listing_filter="platform_release_date >= %s"), (previous_day,))
         res = cur.fetchall()
 
     print(f"Found {len(res)} new games.")
     return res
 
 
-def get_subscribers_for_genres(client: boto3.client) -> defaultdict:
-    """Retrieve all subscribers for each genre (SNS topic) in one call per genre."""
-    print("Fetching subscribers for each genre...")
-    subscribers_by_genre = defaultdict(set)
+def get_games_by_id(conn: psycopg2.connect, game_ids: list[int]) -> list:
+    """Queries database for the given games in the same shape as get_new_games,
+    reading only their listings using the game id index"""
+    with conn.cursor() as cur:
+        cur.execute(GAMES_QUERY.format(listing_filter="game_id = ANY(%s)"), (list(game_ids),))
+        res = cur.fetchall()
+
+    print(f"Found {len(res)} of {len(game_ids)} games.")
+    return res
+
 
-    next_token = None
-    topics = []
-    while True:
-        if next_token:
-            response = client.list_topics(NextToken=next_token)
-        else:
-            response = client.list_topics()
+def get_games_dict(new_games: list) -> dict:
+    """Keys the new games by name, with the details shown in the emails"""
+    return {
+        row["game_name"]: {
+            "game_id": row["game_id"],
+            "genres": set(row["genres"]),
+            "release_date": row["platform_release_date"],
+            "game_image": row["game_image"],
+            "final_price": row["final_price"],
+            "platform": row["platform_name"]
+        }
+        for row in new_games
+    }
 
-        topics.extend(response["Topics"])
 
-        next_token = response.get("NextToken")
-        if not next_token:
-            break
+def get_topic_name(genre: str) -> str:
+    """Returns the name of the SNS topic for a genre, "Free to Play" is play_stream_free_to_play"""
+    return TOPIC_PREFIX + genre.replace(' ', '_').lower()
 
-    print(f"Found {len(topics)} topics.")
 
-    for topic in topics:
-        topic_arn = topic["TopicArn"]
-        genre = topic_arn.split(":")[-1]
+def get_subscribers_for_genres(conn: psycopg2.connect, genres: set) -> dict:
+    """Retrieve the confirmed subscribers for each genre from the subscription table in one query.
+    The table is kept in line with SNS by reconcile_subscriptions.py"""
+    print("Fetching subscribers for each genre...")
+    topic_genres = {get_topic_name(genre): genre for genre in genres}
+
+    query = """SELECT
+    s.topic_name,
+    ARRAY_AGG(sb.email ORDER BY sb.email) AS emails
+    FROM subscription AS s
+    JOIN subscriber AS sb USING (subscriber_id)
+    WHERE s.topic_name = ANY(%s)
+    AND s.status = 'confirmed'
+    GROUP BY s.topic_name;
+    """
 
-        formatted_genre = genre.replace('play_stream_', '')
-        formatted_genre = formatted_genre.replace('_', ' ').title()
+    with conn.cursor() as cur:
+        cur.execute(query, (list(topic_genres),))
+        res = cur.fetchall()
 
-        if genre.startswith('play_stream'):
-            print(f"Checking topic: {topic_arn} ({formatted_genre})")
+    subscribers_by_genre = {topic_genres[row["topic_name"]]: row["emails"] for row in res}
+    print(f"Found subscribers for {len(subscribers_by_genre)} genres.")
+    return subscribers_by_genre
 
-            next_token = None
-            while True:
-                params = {"TopicArn": topic_arn}
-                if next_token:
-                    params["NextToken"] = next_token
 
-                response = client.list_subscriptions_by_topic(**params)
+def generate_game_html(game_name: str, game: dict) -> Markup:
+    """Generates the HTML table row for a game, made once and shared by every digest the game is in"""
+    return Markup(GAME_TEMPLATE.render(game_name=game_name, **game))
 
-                for sub in response["Subscriptions"]:
-                    if sub["Protocol"] == "email" and sub["SubscriptionArn"] != "PendingConfirmation":
-                        subscribers_by_genre[formatted_genre].add(
-                            sub["Endpoint"])
-                    else:
-                        print(
-                            f"Skipping {sub['Endpoint']} - Pending or deleted.")
 
-                next_token = response.get("NextToken")
-                if not next_token:
-                    break
+def get_genre_title(genres: list, most: int = 3) -> str:
+    """Lists the genres for a heading, "Action, RPG and 2 more" past the most shown"""
+    if len(genres) <= most:
+        return ", ".join(genres)
+    return f"{', '.join(genres[:most])} and {len(genres) - most} more"
 
-    print(f"Found subscribers for {len(subscribers_by_genre)} genres.")
-    for genre, subscribers in subscribers_by_genre.items():
-        print(f"Subscribers for {genre}: {list(subscribers)}")
-    return subscribers_by_genre
 
+def generate_html(genres: list, games_html: list) -> str:
+    """Generates HTML email body with the rendered games of all the subscriber's genres"""
+    return DIGEST_TEMPLATE.render(genre_title=get_genre_title(genres), games_html=Markup("".join(games_html)))
 
-def generate_html(genre_name: str, game_data: list, subscribers: list) -> str:
-    """Generates HTML email body with all games for the genre (with images)"""
-    print(
-        f"Generating HTML for {genre_name} genre with {len(game_data)} games and {len(subscribers)} subscribers...")
-
-    body_html = f"""
-        <html>
-            <head>
-                <link href='https://fonts.googleapis.com/css?family=Press Start 2P' rel='stylesheet'><link href='https://fonts.googleapis.com/css?family=Lexend' rel='stylesheet'>
-                <style>
-                    body {{
-                        color: #f0f0f0;
-                        padding: 20px;
-                        margin: 0;
-                        width: 100%;
-                        text-align: center;
-                        background-color: #152736;
-                    }}
-                    .email-container {{
-                        width: 90%;
-                        max-width: 600px;  
-                        margin: 40px auto;
-                        padding: 20px;
-                        background-color: #05122b;
-                        border-radius: 10px;
-                        text-align: center;
-                    }}
-                    h2, p, div {{
-                        font-family: 'Lexend';
-                        color: #00e5c2;
-                        text-align: center;
-                    }}               
-                    h1 {{
-                        font-family: 'Press Start 2P';
-                        color: #ffff00;
-                    }}
-                    .game-table {{
-                        width: 100%;
-                        border-spacing: 0;
-                    }}
-                    .game {{
-                        width: 100%;
-                        background-color: #05132e;
-                        border-radius: 8px;
-                        padding: 15px;
-                        margin-bottom: 15px;
-                        text-align: center;
-                    }}
-                    .game img {{
-                        max-width: 100%;
-                        height: auto;
-                        display: block;
-                        margin: 0 auto;
-                        border-radius: 5px;
-                    }}
-                    .game-title {{
-                        font-size: 24px;
-                        font-weight: bold;
-                        color: #00e5c2;
-                        margin-top: 10px;
-                    }}
-                    .game-info {{
-                        font-size: 16px;
-                        color: #00e5c2;
-                        margin-top: 5px;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="email-container">
-                    <img src="https://i.imgur.com/hY6MSBU.png" alt="Playstream logo" style="width:150px;height:150px;">
-                    <h1>New Game Releases in {genre_name}</h1>
-                    <table class="game-table">
-    """
 
-    # List games one by one using table rows
-    print('GAME DATA ', game_data)
-    for game in game_data:
-        game_name = game["game_name"]
-        game_image = game["game_image"]
-        release_date = game["release_date"]
-        price = game["final_price"]
-        platform = game["platform"]
-
-        body_html += f"""
-            <tr>
-                <td class="game">
-                    <img src="{game_image}" alt="{game_name}">
-                    <div class="game-title">{game_name} - {price}</div>
-                    <div class="game-info">Release Date: {release_date}</div>
-                    <div class="game-info">Available for the best price on <b>{platform}</b></div>
-                </td>
-            </tr>
-        """
-
-    body_html += f"""
-                    </table>
-                    <p>Check out these new games now! Available on Steam, GoG, and Epic.</p>
-                </div>
-            </body>
-        </html>
-    """
+def get_subscriber_games(games_dict: dict, subscribers_by_genre: dict) -> dict:
+    """Inverts the subscribers of each genre into the genres and games of each subscriber.
+    A game in several of a subscriber's genres is only listed once"""
+    subscriber_games = defaultdict(lambda: {"genres": set(), "games": {}})
 
-    print(f"HTML generated for {genre_name} genre:\n{body_html[:500]}...")
-    return body_html
+    for game_name, details in games_dict.items():
+        for genre in details["genres"]:
+            for subscriber in subscribers_by_genre.get(genre, []):
+                subscriber_games[subscriber]["genres"].add(genre)
+                # A dict keeps the games in order without repeats
+                subscriber_games[subscriber]["games"][game_name] = None
+
+    return {subscriber: {"genres": sorted(data["genres"]), "games": list(data["games"])}
+            for subscriber, data in subscriber_games.items()}
+
+
+def build_digests(games_dict: dict, subscriber_games: dict) -> list[dict]:
+    """Builds one email for each subscriber with all of their new games.
+    Each game's HTML is made once, and subscribers with the same genres share the same body"""
+    games_html = {}
+    bodies = {}
+    messages = []
+
+    for subscriber, data in subscriber_games.items():
+        genres = tuple(data["genres"])
+        if genres not in bodies:
+            fragments = []
+            for game_name in data["games"]:
+                game = games_dict[game_name]
+                if game["game_id"] not in games_html:
+                    games_html[game["game_id"]] = generate_game_html(game_name, game)
+                fragments.append(games_html[game["game_id"]])
+            bodies[genres] = generate_html(data["genres"], fragments)
+
+        messages.append({
+            'recipient': subscriber,
+            'subject': f'🎮 New Game Releases in {get_genre_title(data["genres"])}',
+            'html': bodies[genres]
+        })
+
+    print(f"Built {len(messages)} digests from {len(bodies)} bodies and {len(games_html)} games.")
+    return messages
 
 
 def get_ses_connection() -> boto3.client:
@@ -251,49 +250,34 @@ def get_ses_connection() -> boto3.client:
         'ses',
         aws_access_key_id=ENV['PRIVATE_AWS_ACCESS_KEY'],
         aws_secret_access_key=ENV['PRIVATE_AWS_SECRET_ACCESS_KEY'],
-        region_name=ENV['PRIVATE_AWS_REGION']
+        region_name=ENV['PRIVATE_AWS_REGION'],
+        config=Config(max_pool_connections=MAX_WORKERS)
     )
     print("Connected to SES.")
     return ses_client
 
 
-def send_email(ses_client: boto3.client, email_data: dict) -> dict:
-    """Send emails for each genre to subscribers using SES"""
+def get_digest_key(day=None) -> str:
+    """Returns the outbox key of a day's digest, each subscriber is sent it once"""
+    return f"daily:{(day or datetime.now().date()).isoformat()}"
+
+
+def send_email(ses_client: boto3.client, messages: list[dict], conn: psycopg2.connect,
+               digest_key: str, shard: int = 0, shards: int = 1) -> dict:
+    """Send each subscriber in the shard their digest using SES, in parallel at the account's send rate.
+    Subscribers the email outbox has already sent the digest to are skipped"""
     print("Sending emails...")
-    for genre, details in email_data.items():
-        subscribers = details['subscribers']
-        html_body = details['html_body']
-
-        # iterate each subscriber of the genre
-        for subscriber in subscribers:
-            email_params = {
-                'Destination': {
-                    'ToAddresses': [subscriber]
-                },
-                'Message': {
-                    'Body': {
-                        'Html': {
-                            'Data': html_body
-                        }
-                    },
-                    'Subject': {
-                        'Data': f'🎮 New Game Releases in {genre}'
-                    }
-                },
-                'Source': 'trainee.jamie.groom@sigmalabs.co.uk',
-            }
-
-            try:
-                response = ses_client.send_email(**email_params)
-                print(
-                    f"Email sent to {subscriber} with response: {response['ResponseMetadata']}")
-            except Exception as e:
-                print(f"Error sending email to {subscriber}: {e}")
+    results = send_once(conn, ses_client, SENDER, digest_key, messages, shard, shards)
+    sent = sum(result['status'] == 'sent' for result in results)
 
     print("Emails sent.")
     return {
         'statusCode': 200,
-        'body': json.dumps({'message': 'Emails sent successfully.'})
+        'body': json.dumps({
+            'message': 'Emails sent successfully.',
+            'sent': sent,
+            'failed': len(results) - sent
+        })
     }
 
 
@@ -309,84 +293,26 @@ def lambda_handler(event, context):
     )
     logging.info("Lambda function started")
 
-    sns_client = sns_connect()
     db_conn = get_connection()
 
     new_games = get_new_games(db_conn)
 
-    # get subscribers grouped by genre
-    subscribers_by_genre = get_subscribers_for_genres(sns_client)
-    print(f"Found {len(subscribers_by_genre)} genres with subscribers.")
-    logging.info(f"Found {len(subscribers_by_genre)} genres with subscribers.")
-
-    # organise games by game_name and associated genres
-    games_dict = defaultdict(
-        lambda: {"genres": set(), "release_date": None, "game_image": None, "final_price": None, "platform": None})
-
-    # get data from query and store in dict for each game
-    for row in new_games:
-        game_name = row["game_name"]
-        genres = row["genre_names"].split(", ")
-        release_date = row["platform_release_date"]
-        game_image = row["game_image"]
-        final_price = row['final_price']
-        platform = row['platform_name']
-
-        games_dict[game_name]["genres"].update(genres)
-        games_dict[game_name]["release_date"] = release_date
-        games_dict[game_name]["game_image"] = game_image
-        games_dict[game_name]["final_price"] = final_price
-        games_dict[game_name]["platform"] = platform
+    # the query has already grouped each game's genres and picked its cheapest platform
+    games_dict = get_games_dict(new_games)
 
     logging.info(f"Games dict populated with {len(games_dict)} games.")
 
-    logging.info("Games dict: ", games_dict)
+    # get subscribers grouped by genre, only for the genres of the new games
+    new_genres = set().union(*(details["genres"] for details in games_dict.values()))
+    subscribers_by_genre = get_subscribers_for_genres(db_conn, new_genres)
+    logging.info(f"Found {len(subscribers_by_genre)} genres with subscribers.")
 
-    email_data = defaultdict(lambda: {"games": [], "subscribers": []})
+    # one digest per subscriber, with every new game in any of their genres
+    subscriber_games = get_subscriber_games(games_dict, subscribers_by_genre)
+    messages = build_digests(games_dict, subscriber_games)
+    logging.info(f"Digests prepared for {len(messages)} subscribers.")
 
-    # populate email_data with games and their subscribers by genre
-    for game_name, details in games_dict.items():
-        game_genres = sorted(details["genres"])
-        release_date = details["release_date"]
-        game_image = details["game_image"]
-        final_price = details["final_price"]
-        platform = details["platform"]
-
-        for genre in game_genres:
-            formatted_genre = genre.replace('play_stream_', '')
-            formatted_genre = formatted_genre.replace('_', ' ').title()
-
-            if formatted_genre in subscribers_by_genre:
-                email_data[formatted_genre]["games"].append({
-                    "game_name": game_name,
-                    "game_image": game_image,
-                    "release_date": release_date,
-                    "final_price": final_price,
-                    "platform": platform
-                })
-                email_data[formatted_genre]["subscribers"] = list(
-                    subscribers_by_genre[formatted_genre])
-
-    # Generate html for each genre
-    final_email_data = {}
-
-    logging.info('Email Data', email_data)
-
-    for genre, data in email_data.items():
-        if data["subscribers"]:  # only send emails if there are subscribers
-            email_body = generate_html(
-                genre,
-                data["games"],
-                data["subscribers"]
-            )
-            final_email_data[genre] = {
-                "subscribers": data["subscribers"],
-                "html_body": email_body
-            }
-
-    logging.info(
-        f"Final email data prepared for {len(final_email_data)} genres.")
-
-    # Send emails through SES
+    # Send emails through SES, only to this shard's subscribers that haven't been sent today's digest
     ses_client = get_ses_connection()
-    return send_email(ses_client, final_email_data)
+    shard, shards = get_shard(event)
+    return send_email(ses_client, messages, db_conn, get_digest_key(), shard, shards)
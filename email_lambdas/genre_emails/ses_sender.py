@@ -0,0 +1,137 @@
+"""Sends emails through SES in parallel, without going over the account's send rate.
+Sends that are throttled are retried with a backoff, and every recipient's result is logged"""
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil
+from os import environ as ENV
+from random import uniform
+from threading import Lock
+from time import monotonic, sleep
+import logging
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+
+# The most emails sent at once, the SES client's connection pool is made this size
+MAX_WORKERS = 20
+
+MAX_ATTEMPTS = 5
+
+# Seconds before the first retry of a throttled send, doubled for each retry after it
+BACKOFF = 1
+
+# The sandbox send rate, used if the account's rate can't be read
+DEFAULT_SEND_RATE = 1
+
+# SES error codes for going over the send rate
+THROTTLING_ERRORS = {"Throttling", "ThrottlingException", "TooManyRequestsException"}
+
+
+class TokenBucket:
+    """Lets sends through at rate a second on average, with bursts of up to capacity"""
+
+    def __init__(self, rate: float, capacity: float = None, clock=monotonic, wait=sleep):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.wait = wait
+        self.updated_at = clock()
+        self.lock = Lock()
+
+    def acquire(self) -> None:
+        """Waits until a send is allowed"""
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            self.wait(delay)
+
+
+def get_send_rate(ses_client: boto3.client) -> float:
+    """Returns the most emails a second the account can send, SES_SEND_RATE overrides it"""
+    if ENV.get("SES_SEND_RATE"):
+        return float(ENV["SES_SEND_RATE"])
+    try:
+        return ses_client.get_send_quota()["MaxSendRate"]
+    except (BotoCoreError, ClientError) as e:
+        logging.warning(f"Couldn't read the SES send rate, sending {DEFAULT_SEND_RATE} a second: {e}")
+        return DEFAULT_SEND_RATE
+
+
+def is_throttled(error: Exception) -> bool:
+    """Returns true if SES rejected the send for going over the send rate.
+    Going over the daily quota uses the same code, but retrying won't help"""
+    if not isinstance(error, ClientError):
+        return False
+    code = error.response.get("Error", {}).get("Code")
+    message = error.response.get("Error", {}).get("Message", "")
+    return code in THROTTLING_ERRORS and "quota" not in message.lower()
+
+
+def send_message(ses_client: boto3.client, bucket: TokenBucket, source: str, message: dict,
+                 wait=sleep) -> dict:
+    """Sends one email, retrying if it's throttled. The message has the recipient, subject and html.
+    Returns the recipient's result, with the message id if it was sent or the error if it wasn't"""
+    result = {"recipient": message["recipient"], "status": "failed", "message_id": None, "error": None}
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        result["attempts"] = attempt
+        bucket.acquire()
+        try:
+            response = ses_client.send_email(
+                Source=source,
+                Destination={'ToAddresses': [message["recipient"]]},
+                Message={
+                    'Subject': {'Data': message["subject"]},
+                    'Body': {'Html': {'Data': message["html"]}}
+                }
+            )
+            result["status"] = "sent"
+            result["message_id"] = response.get("MessageId")
+            return result
+
+        except (BotoCoreError, ClientError) as e:
+            result["error"] = str(e)
+            if not is_throttled(e) or attempt == MAX_ATTEMPTS:
+                return result
+            # Jittered, so the throttled sends don't all retry at the same moment
+            wait(BACKOFF * 2 ** (attempt - 1) * uniform(0.5, 1))
+    return result
+
+
+def log_results(results: list[dict]) -> None:
+    """Logs the result of each recipient and how many were sent"""
+    for result in results:
+        if result["status"] == "sent":
+            logging.info(f"Sent to {result['recipient']} ({result['message_id']}) "
+                         f"after {result['attempts']} attempt(s)")
+        else:
+            logging.error(f"Sending to {result['recipient']} failed after "
+                          f"{result['attempts']} attempt(s): {result['error']}")
+    sent = sum(result["status"] == "sent" for result in results)
+    logging.info(f"Sent {sent} of {len(results)} emails.")
+
+
+def send_messages(ses_client: boto3.client, messages: list[dict], source: str,
+                  rate: float = None, max_workers: int = MAX_WORKERS) -> list[dict]:
+    """Sends the messages in parallel, no faster than the send rate, which defaults to the account's.
+    Returns each recipient's result in the order of the messages"""
+    if not messages:
+        return []
+
+    rate = rate or get_send_rate(ses_client)
+    bucket = TokenBucket(rate)
+    # More threads than sends allowed a second would only wait on the bucket
+    workers = max(1, min(max_workers, ceil(rate), len(messages)))
+    print(f"Sending {len(messages)} emails at up to {rate} a second with {workers} threads...")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            lambda message: send_message(ses_client, bucket, source, message), messages))
+
+    log_results(results)
+    return results
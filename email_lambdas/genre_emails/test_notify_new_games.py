@@ -0,0 +1,104 @@
+# pylint: skip-file
+from unittest.mock import MagicMock
+
+import psycopg2
+import pytest
+
+from notify_new_games import claim_events, get_unsent_events, get_event_games, notify_new_games
+from test_ses_sender import FakeSES
+
+EVENTS = [
+    {"event_id": 1, "payload": {"games": [{"game_id": 1, "genres": ["Action"]}]}},
+    {"event_id": 2, "payload": {"games": [{"game_id": 1, "genres": ["RPG"]},
+                                          {"game_id": 2, "genres": ["Puzzle"]}]}}
+]
+
+GAME_ROWS = [
+    {"game_id": 1, "game_name": "Game A", "game_image": "a.png", "genres": ["Action", "RPG"],
+     "platform_release_date": "2025-03-01", "platform_name": "GOG", "final_price": "£8.00"},
+    {"game_id": 2, "game_name": "Game B", "game_image": "b.png", "genres": ["Puzzle"],
+     "platform_release_date": "2025-03-01", "platform_name": "Steam", "final_price": "Free"}
+]
+
+SUBSCRIBER_ROWS = [
+    {"topic_name": "play_stream_action", "emails": ["a@x.com"]},
+    {"topic_name": "play_stream_rpg", "emails": ["a@x.com", "b@x.com"]}
+]
+
+
+def make_connection(*results):
+    """A connection whose queries return the results in turn"""
+    conn = MagicMock()
+    cursor = MagicMock()
+    conn.cursor.return_value.__enter__.return_value = cursor
+    cursor.fetchall.side_effect = list(results)
+    return conn, cursor
+
+
+def test_claim_events_skips_locked():
+    conn, cursor = make_connection(EVENTS)
+
+    assert claim_events(conn, 10) == EVENTS
+    query, params = cursor.execute.call_args.args
+    assert "FOR UPDATE SKIP LOCKED" in query
+    assert params == (10,)
+
+
+def test_get_event_games_merges_genres():
+    assert get_event_games(EVENTS) == {1: {"Action", "RPG"}, 2: {"Puzzle"}}
+
+
+def test_get_unsent_events_by_digest_key():
+    conn, cursor = make_connection([{"digest_key": "new_games:1-2", **event} for event in EVENTS])
+
+    assert get_unsent_events(conn) == {"new_games:1-2": [{"digest_key": "new_games:1-2", **event}
+                                                         for event in EVENTS]}
+
+
+def test_notify_new_games_sends_one_digest_per_subscriber():
+    conn, cursor = make_connection([], EVENTS, GAME_ROWS, SUBSCRIBER_ROWS,
+                                   [{"recipient": "a@x.com"}, {"recipient": "b@x.com"}])
+    ses = FakeSES()
+
+    results = notify_new_games(conn, ses)
+
+    assert results == {"events": 2, "sent": 2, "failed": 0}
+    assert sorted(email["recipient"] for email in ses.sent) == ["a@x.com", "b@x.com"]
+    queries = [call.args for call in cursor.execute.call_args_list]
+    # Game A is in two of the events but only read and sent once
+    assert queries[2][1] == ([1, 2],)
+    # the events are marked processed with their digest key before any email is sent
+    assert "processed_at = CURRENT_TIMESTAMP" in queries[4][0]
+    assert queries[4][1][0].adapted == {"digest_key": "new_games:1-2"}
+    assert queries[5][1] == ("new_games:1-2", ["a@x.com", "b@x.com"])
+    assert "UPDATE email_outbox AS o" in queries[-1][0]
+
+
+def test_notify_new_games_retries_unsent_subscribers():
+    unsent = [{"digest_key": "new_games:1-2", **event} for event in EVENTS]
+    conn, cursor = make_connection(unsent, GAME_ROWS, SUBSCRIBER_ROWS, [{"recipient": "b@x.com"}], [])
+    ses = FakeSES()
+
+    results = notify_new_games(conn, ses)
+
+    # a@x.com was sent by the run that failed, so only b@x.com is sent again
+    assert [email["recipient"] for email in ses.sent] == ["b@x.com"]
+    assert results == {"events": 0, "sent": 1, "failed": 0}
+
+
+def test_notify_new_games_no_events():
+    conn, cursor = make_connection([], [])
+
+    assert notify_new_games(conn, FakeSES()) == {"events": 0, "sent": 0, "failed": 0}
+    assert cursor.execute.call_count == 2
+    conn.commit.assert_not_called()
+
+
+def test_notify_new_games_leaves_events_on_error():
+    conn, cursor = make_connection([], EVENTS)
+    cursor.execute.side_effect = [None, None, psycopg2.Error("DB Error")]
+
+    with pytest.raises(psycopg2.Error):
+        notify_new_games(conn, FakeSES())
+    conn.rollback.assert_called_once()
+    conn.commit.assert_not_called()
@@ -0,0 +1,116 @@
+# pylint: skip-file
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import psycopg2
+import pytest
+
+from reconcile_subscriptions import (list_all, get_topics, get_sns_subscriptions,
+                                     save_subscriptions, reconcile_subscriptions)
+
+
+class StubSNS:
+    """A local stand in for SNS, returning two items per page like a real paged list call"""
+
+    def __init__(self, subscriptions: dict):
+        self.subscriptions = subscriptions
+        self.calls = []
+
+    def page(self, items, key, next_token):
+        start = int(next_token or 0)
+        response = {key: items[start:start + 2]}
+        if start + 2 < len(items):
+            response["NextToken"] = str(start + 2)
+        return response
+
+    def list_topics(self, NextToken=None):
+        self.calls.append("list_topics")
+        return self.page([{"TopicArn": arn} for arn in self.subscriptions], "Topics", NextToken)
+
+    def list_subscriptions_by_topic(self, TopicArn, NextToken=None):
+        self.calls.append("list_subscriptions_by_topic")
+        return self.page(self.subscriptions[TopicArn], "Subscriptions", NextToken)
+
+
+def arn(name):
+    return f"arn:aws:sns:eu-west-2:123:{name}"
+
+
+def sub(email, subscription_arn="arn:sub", protocol="email"):
+    return {"Endpoint": email, "SubscriptionArn": subscription_arn, "Protocol": protocol}
+
+
+@pytest.fixture
+def sns():
+    return StubSNS({
+        arn("play_stream_action"): [sub("a@x.com"), sub("b@x.com", "PendingConfirmation"),
+                                    sub("c@x.com"), sub("+44123", protocol="sms"), sub("d@x.com")],
+        arn("play_stream_rpg"): [],
+        arn("other_topic"): [sub("e@x.com")],
+    })
+
+
+def test_list_all_follows_next_token(sns):
+    subs = list_all(sns, "list_subscriptions_by_topic", "Subscriptions", TopicArn=arn("play_stream_action"))
+    assert len(subs) == 5
+    assert sns.calls.count("list_subscriptions_by_topic") == 3
+
+
+def test_get_topics_only_dashboard_topics(sns):
+    assert get_topics(sns) == {"play_stream_action": arn("play_stream_action"),
+                               "play_stream_rpg": arn("play_stream_rpg")}
+
+
+def test_get_sns_subscriptions_emails_only(sns):
+    subscriptions = get_sns_subscriptions(sns, get_topics(sns))
+    assert {s["email"]: s["status"] for s in subscriptions} == {
+        "a@x.com": "confirmed", "b@x.com": "pending", "c@x.com": "confirmed", "d@x.com": "confirmed"}
+    assert [s["subscription_arn"] for s in subscriptions if s["status"] == "pending"] == [None]
+
+
+def test_get_sns_subscriptions_confirmed_wins():
+    topic = arn("play_stream_action")
+    for subs in ([sub("a@x.com"), sub("a@x.com", "PendingConfirmation")],
+                 [sub("a@x.com", "PendingConfirmation"), sub("a@x.com")]):
+        subscriptions = get_sns_subscriptions(StubSNS({topic: subs}), {"play_stream_action": topic})
+        assert len(subscriptions) == 1
+        assert subscriptions[0]["status"] == "confirmed"
+
+
+def test_save_subscriptions_commits(sns):
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+    topics = get_topics(sns)
+    listed_at = datetime(2025, 3, 1)
+
+    save_subscriptions(mock_conn, topics, get_sns_subscriptions(sns, topics), listed_at)
+
+    assert mock_cursor.execute.call_count == 3
+    params = mock_cursor.execute.call_args.args[1]
+    assert params["topics"] == ["play_stream_action", "play_stream_rpg"]
+    assert params["email"] == ["a@x.com", "b@x.com", "c@x.com", "d@x.com"]
+    assert params["listed_at"] == listed_at
+    mock_conn.commit.assert_called_once()
+
+
+def test_save_subscriptions_rolls_back():
+    mock_conn = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value.execute.side_effect = psycopg2.Error("failed")
+
+    with pytest.raises(psycopg2.Error):
+        save_subscriptions(mock_conn, {}, [], datetime(2025, 3, 1))
+    mock_conn.rollback.assert_called_once()
+    mock_conn.commit.assert_not_called()
+
+
+def test_reconcile_subscriptions(sns):
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+    mock_cursor.fetchone.return_value = {"now": datetime(2025, 3, 1)}
+
+    assert reconcile_subscriptions(sns, mock_conn) == 4
+    # One page of topics plus the subscriptions of each dashboard topic
+    assert sns.calls.count("list_topics") == 2
+    assert sns.calls.count("list_subscriptions_by_topic") == 4
@@ -0,0 +1,139 @@
+# pylint: skip-file
+import json
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from send_emails import (get_new_games, get_games_dict, get_topic_name, get_subscribers_for_genres, get_subscriber_games, get_genre_title,
+                         generate_game_html, generate_html, build_digests, get_digest_key, send_email)
+from test_ses_sender import FakeSES, ses_error
+
+
+def test_get_new_games_since_yesterday():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+    mock_cursor.fetchall.return_value = [{"game_id": 1}]
+
+    assert get_new_games(mock_conn) == [{"game_id": 1}]
+    query, params = mock_cursor.execute.call_args.args
+    assert "DISTINCT ON (game_id)" in query
+    assert params == ((datetime.now() - timedelta(days=1)).date(),)
+
+
+def test_get_games_dict():
+    rows = [{"game_id": 1, "game_name": "Game A", "game_image": "a.png", "genres": ["Action", "RPG"],
+             "platform_release_date": "2025-03-01", "platform_name": "GOG", "final_price": "£8.00",
+             "discount_info": "20% off"}]
+
+    assert get_games_dict(rows) == {"Game A": {"game_id": 1, "genres": {"Action", "RPG"},
+                                               "release_date": "2025-03-01", "game_image": "a.png",
+                                               "final_price": "£8.00", "platform": "GOG"}}
+
+
+DATA = [("Action", "play_stream_action"), ("Free to Play", "play_stream_free_to_play"),
+        ("RPG", "play_stream_rpg")]
+@pytest.mark.parametrize("genre, expected", DATA)
+def test_get_topic_name(genre, expected):
+    assert get_topic_name(genre) == expected
+
+
+def test_get_subscribers_for_genres_one_query():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+    mock_cursor.fetchall.return_value = [
+        {"topic_name": "play_stream_free_to_play", "emails": ["a@x.com", "b@x.com"]},
+        {"topic_name": "play_stream_action", "emails": ["a@x.com"]}
+    ]
+
+    result = get_subscribers_for_genres(mock_conn, {"Action", "Free to Play", "Puzzle"})
+
+    assert result == {"Free to Play": ["a@x.com", "b@x.com"], "Action": ["a@x.com"]}
+    mock_cursor.execute.assert_called_once()
+    topic_names = mock_cursor.execute.call_args.args[1][0]
+    assert sorted(topic_names) == ["play_stream_action", "play_stream_free_to_play", "play_stream_puzzle"]
+
+
+GAMES = {
+    "Game A": {"game_id": 1, "genres": {"Action", "RPG"}, "release_date": "2025-03-01", "game_image": "a.png",
+               "final_price": "£10.00", "platform": "Steam"},
+    "Game B": {"game_id": 2, "genres": {"Action"}, "release_date": "2025-03-01", "game_image": "b.png",
+               "final_price": "Free", "platform": "GOG"},
+    "Game C": {"game_id": 3, "genres": {"Puzzle"}, "release_date": "2025-03-01", "game_image": "c.png",
+               "final_price": "£5.00", "platform": "Epic"}
+}
+
+SUBSCRIBERS = {"Action": ["a@x.com", "b@x.com"], "RPG": ["a@x.com", "c@x.com"], "Puzzle": ["d@x.com"]}
+
+
+def test_get_subscriber_games_one_entry_per_subscriber():
+    result = get_subscriber_games(GAMES, SUBSCRIBERS)
+
+    assert result == {
+        "a@x.com": {"genres": ["Action", "RPG"], "games": ["Game A", "Game B"]},
+        "b@x.com": {"genres": ["Action"], "games": ["Game A", "Game B"]},
+        "c@x.com": {"genres": ["RPG"], "games": ["Game A"]},
+        "d@x.com": {"genres": ["Puzzle"], "games": ["Game C"]}
+    }
+
+
+def test_get_subscriber_games_no_subscribers():
+    assert get_subscriber_games(GAMES, {}) == {}
+
+
+DATA = [(["Action"], "Action"), (["Action", "RPG", "Puzzle"], "Action, RPG, Puzzle"),
+        (["Action", "RPG", "Puzzle", "Racing", "Sports"], "Action, RPG, Puzzle and 2 more")]
+@pytest.mark.parametrize("genres, expected", DATA)
+def test_get_genre_title(genres, expected):
+    assert get_genre_title(genres) == expected
+
+
+def test_build_digests_one_per_subscriber():
+    messages = build_digests(GAMES, get_subscriber_games(GAMES, SUBSCRIBERS))
+    by_recipient = {message["recipient"]: message for message in messages}
+
+    assert len(messages) == 4
+    assert by_recipient["a@x.com"]["subject"] == "🎮 New Game Releases in Action, RPG"
+    # Game A is in both of a@x.com's genres but is only shown once
+    assert by_recipient["a@x.com"]["html"].count('alt="Game A"') == 1
+    assert 'alt="Game B"' in by_recipient["a@x.com"]["html"]
+    assert 'alt="Game B"' not in by_recipient["c@x.com"]["html"]
+
+
+def test_build_digests_renders_each_game_once():
+    subscriber_games = {f"user{i}@x.com": {"genres": ["Action"], "games": ["Game A", "Game B"]}
+                        for i in range(100)}
+    with patch("send_emails.generate_game_html", wraps=generate_game_html) as render_game, \
+         patch("send_emails.generate_html", wraps=generate_html) as render_body:
+        messages = build_digests(GAMES, subscriber_games)
+
+    assert len(messages) == 100
+    assert render_game.call_count == 2
+    assert render_body.call_count == 1
+    assert len({id(message["html"]) for message in messages}) == 1
+
+
+def test_generate_html_escapes_game_names():
+    game = {**GAMES["Game A"], "game_image": 'a.png" onerror="alert(1)'}
+    html = generate_html(["Action & Adventure"], [generate_game_html("Tom & Jerry <3", game)])
+
+    assert "Tom &amp; Jerry &lt;3" in html
+    assert 'a.png&#34; onerror' in html
+    assert "Action &amp; Adventure" in html
+    assert "<tr>" in html
+
+
+def test_send_email_to_each_subscriber():
+    ses = FakeSES({"b@x.com": [ses_error("MessageRejected")]})
+    messages = build_digests(GAMES, get_subscriber_games(GAMES, SUBSCRIBERS))
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = [{"recipient": message["recipient"]} for message in messages]
+
+    response = send_email(ses, messages, conn, get_digest_key(datetime(2025, 3, 1).date()))
+
+    assert sorted(email["recipient"] for email in ses.sent) == ["a@x.com", "c@x.com", "d@x.com"]
+    assert json.loads(response["body"]) == {"message": "Emails sent successfully.", "sent": 3, "failed": 1}
+    assert cursor.execute.call_args.args[1][-1] == "daily:2025-03-01"
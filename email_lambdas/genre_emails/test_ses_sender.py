@@ -0,0 +1,155 @@
+# pylint: skip-file
+from threading import Lock
+from unittest.mock import patch
+
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from ses_sender import (TokenBucket, get_send_rate, is_throttled, send_message, send_messages,
+                        MAX_ATTEMPTS)
+
+
+def ses_error(code, message="error"):
+    return ClientError({"Error": {"Code": code, "Message": message}}, "SendEmail")
+
+
+class FakeSES:
+    """A local stand in for SES, which records each email and can fail sends to chosen recipients.
+    failures maps a recipient to the errors its sends raise in turn before one succeeds"""
+
+    def __init__(self, failures: dict = None, send_rate: float = 1000):
+        self.failures = {recipient: list(errors) for recipient, errors in (failures or {}).items()}
+        self.send_rate = send_rate
+        self.sent = []
+        self.attempts = 0
+        self.lock = Lock()
+
+    def get_send_quota(self):
+        return {"Max24HourSend": 50000.0, "MaxSendRate": self.send_rate, "SentLast24Hours": 0.0}
+
+    def send_email(self, Source, Destination, Message):
+        recipient = Destination["ToAddresses"][0]
+        with self.lock:
+            self.attempts += 1
+            if self.failures.get(recipient):
+                raise self.failures[recipient].pop(0)
+            self.sent.append({"source": Source, "recipient": recipient,
+                              "subject": Message["Subject"]["Data"], "html": Message["Body"]["Html"]["Data"]})
+            return {"MessageId": f"id-{len(self.sent)}"}
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+        self.waits = []
+
+    def __call__(self):
+        return self.now
+
+    def wait(self, seconds):
+        self.waits.append(seconds)
+        self.now += seconds
+
+
+def make_messages(count):
+    return [{"recipient": f"user{i}@x.com", "subject": "Subject", "html": "<p>Hi</p>"} for i in range(count)]
+
+
+def test_token_bucket_allows_burst_then_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, clock=clock, wait=clock.wait)
+
+    for _ in range(6):
+        bucket.acquire()
+
+    # The first two are the burst, each one after waits half a second
+    assert clock.now == pytest.approx(2)
+    assert clock.waits == pytest.approx([0.5] * 4)
+
+
+def test_token_bucket_refills_to_capacity():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, clock=clock, wait=clock.wait)
+    clock.now = 100
+
+    for _ in range(2):
+        bucket.acquire()
+    assert clock.waits == []
+
+
+DATA = [("Throttling", "Maximum sending rate exceeded.", True),
+        ("TooManyRequestsException", "Too many requests", True),
+        ("Throttling", "Daily message quota exceeded.", False),
+        ("MessageRejected", "Email address is not verified.", False)]
+@pytest.mark.parametrize("code, message, expected", DATA)
+def test_is_throttled(code, message, expected):
+    assert is_throttled(ses_error(code, message)) == expected
+
+
+def test_get_send_rate_from_account():
+    assert get_send_rate(FakeSES(send_rate=14)) == 14
+
+
+def test_get_send_rate_from_env():
+    with patch.dict("ses_sender.ENV", {"SES_SEND_RATE": "5"}):
+        assert get_send_rate(FakeSES(send_rate=14)) == 5
+
+
+def test_send_message_retries_throttling():
+    ses = FakeSES({"user0@x.com": [ses_error("Throttling", "Maximum sending rate exceeded.")] * 2})
+    waits = []
+
+    result = send_message(ses, TokenBucket(1000), "from@x.com", make_messages(1)[0], wait=waits.append)
+
+    assert result["status"] == "sent"
+    assert result["attempts"] == 3
+    assert len(waits) == 2 and waits[1] > waits[0] / 2
+    assert ses.sent[0]["source"] == "from@x.com"
+
+
+def test_send_message_gives_up():
+    ses = FakeSES({"user0@x.com": [ses_error("Throttling", "Maximum sending rate exceeded.")] * MAX_ATTEMPTS})
+
+    result = send_message(ses, TokenBucket(1000), "from@x.com", make_messages(1)[0], wait=lambda _: None)
+
+    assert result["status"] == "failed"
+    assert result["attempts"] == MAX_ATTEMPTS
+    assert "Maximum sending rate" in result["error"]
+
+
+@pytest.mark.parametrize("error", [ses_error("MessageRejected"),
+                                   EndpointConnectionError(endpoint_url="https://email")])
+def test_send_message_does_not_retry_other_errors(error):
+    ses = FakeSES({"user0@x.com": [error]})
+
+    result = send_message(ses, TokenBucket(1000), "from@x.com", make_messages(1)[0], wait=lambda _: None)
+
+    assert result["status"] == "failed"
+    assert result["attempts"] == 1
+    assert ses.attempts == 1
+
+
+def test_send_messages_results_in_order():
+    ses = FakeSES({"user3@x.com": [ses_error("MessageRejected")],
+                   "user5@x.com": [ses_error("Throttling", "Maximum sending rate exceeded.")]})
+
+    with patch("ses_sender.BACKOFF", 0):
+        results = send_messages(ses, make_messages(50), "from@x.com")
+
+    assert [result["recipient"] for result in results] == [f"user{i}@x.com" for i in range(50)]
+    assert [result["recipient"] for result in results if result["status"] == "failed"] == ["user3@x.com"]
+    assert len(ses.sent) == 49
+    assert ses.attempts == 51
+
+
+def test_send_messages_threads_bounded_by_rate():
+    with patch("ses_sender.ThreadPoolExecutor") as executor:
+        executor.return_value.__enter__.return_value.map.return_value = []
+        send_messages(FakeSES(send_rate=3), make_messages(50), "from@x.com")
+    assert executor.call_args.kwargs["max_workers"] == 3
+
+
+def test_send_messages_nothing_to_send():
+    ses = FakeSES()
+    assert send_messages(ses, [], "from@x.com") == []
@@ -0,0 +1,113 @@
+"""Records every email a lambda sends in the email_outbox table, so each recipient of a digest is sent it once.
+The recipients are added as pending in bulk, each run claims only the ones not yet sent and records the results
+in batches as it goes. A retry after a partial failure only sends to the recipients that weren't sent, and the
+recipients can be split between parallel shards by the hash of their email"""
+from os import environ as ENV
+from zlib import crc32
+import logging
+
+import boto3
+import psycopg2
+
+from ses_sender import get_send_rate, send_messages
+
+# The recipients sent and recorded together, a run that fails loses at most this many results
+BATCH_SIZE = 500
+
+# The most runs that try to send a recipient a digest, after which it's left failed
+MAX_SEND_ATTEMPTS = 3
+
+# A recipient claimed for longer than this was claimed by a run that stopped, so it's claimed again
+SENDING_TIMEOUT = "15 minutes"
+
+
+def get_shard(event: dict) -> tuple[int, int]:
+    """Returns the (shard, shards) of this run from the event or the SHARD and SHARDS variables,
+    a run without them sends to every recipient"""
+    event = event or {}
+    return (int(event.get("shard", ENV.get("SHARD", 0))),
+            int(event.get("shards", ENV.get("SHARDS", 1))))
+
+
+def in_shard(recipient: str, shard: int = 0, shards: int = 1) -> bool:
+    """Returns true if the recipient is sent to by this shard, the same shard every run"""
+    return crc32(recipient.lower().encode()) % shards == shard
+
+
+def add_recipients(conn: psycopg2.connect, digest_key: str, recipients: list[str]) -> None:
+    """Adds the recipients of a digest as pending, leaving any already added as they are"""
+    query = """INSERT INTO email_outbox (recipient, digest_key)
+    SELECT recipient, %s FROM UNNEST(%s::TEXT[]) AS recipient
+    ON CONFLICT (digest_key, recipient) DO NOTHING;
+    """
+    with conn.cursor() as cur:
+        cur.execute(query, (digest_key, recipients))
+        added = cur.rowcount
+    conn.commit()
+    print(f"Added {added} new recipients of {digest_key}.")
+
+
+def claim_recipients(conn: psycopg2.connect, digest_key: str, recipients: list[str]) -> set[str]:
+    """Marks the recipients that still need the digest as sending and returns them.
+    Those sent, being sent by another run or out of attempts aren't returned"""
+    query = """UPDATE email_outbox
+    SET status = 'sending', attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE digest_key = %s
+    AND recipient = ANY(%s)
+    AND attempts < %s
+    AND (status IN ('pending', 'failed')
+         OR (status = 'sending' AND updated_at < CURRENT_TIMESTAMP - %s::INTERVAL))
+    RETURNING recipient;
+    """
+    with conn.cursor() as cur:
+        cur.execute(query, (digest_key, recipients, MAX_SEND_ATTEMPTS, SENDING_TIMEOUT))
+        claimed = {row["recipient"] for row in cur.fetchall()}
+    conn.commit()
+    print(f"Claimed {len(claimed)} of {len(recipients)} recipients of {digest_key}.")
+    return claimed
+
+
+def record_results(conn: psycopg2.connect, digest_key: str, results: list[dict]) -> None:
+    """Saves the status, SES message id and error of each recipient's send in one update"""
+    query = """UPDATE email_outbox AS o
+    SET status = r.status, message_id = r.message_id, error = r.error, updated_at = CURRENT_TIMESTAMP
+    FROM UNNEST(%s::TEXT[], %s::TEXT[], %s::TEXT[], %s::TEXT[]) AS r(recipient, status, message_id, error)
+    WHERE o.digest_key = %s AND o.recipient = r.recipient;
+    """
+    columns = [[result[column] for result in results]
+               for column in ["recipient", "status", "message_id", "error"]]
+    with conn.cursor() as cur:
+        cur.execute(query, (*columns, digest_key))
+    conn.commit()
+
+
+def send_once(conn: psycopg2.connect, ses_client: boto3.client, source: str, digest_key: str,
+              messages: list[dict], shard: int = 0, shards: int = 1) -> list[dict]:
+    """Sends the shard's messages to the recipients that haven't been sent the digest, recording each result.
+    Returns the results of the recipients sent to in this run"""
+    messages = [message for message in messages if in_shard(message["recipient"], shard, shards)]
+    recipients = [message["recipient"] for message in messages]
+    try:
+        add_recipients(conn, digest_key, recipients)
+        claimed = claim_recipients(conn, digest_key, recipients)
+    except psycopg2.Error as e:
+        conn.rollback()
+        logging.error(f"Claiming the recipients of {digest_key} failed: {e}")
+        raise
+
+    messages = [message for message in messages if message["recipient"] in claimed]
+    if not messages:
+        return []
+
+    rate = get_send_rate(ses_client)
+    results = []
+    for start in range(0, len(messages), BATCH_SIZE):
+        batch = send_messages(ses_client, messages[start:start + BATCH_SIZE], source, rate)
+        try:
+            record_results(conn, digest_key, batch)
+        except psycopg2.Error as e:
+            # The batch stays claimed and is sent again once the claim times out
+            conn.rollback()
+            logging.error(f"Recording the results of {digest_key} failed: {e}")
+        results.extend(batch)
+    return results
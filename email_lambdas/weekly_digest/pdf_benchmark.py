@@ -0,0 +1,115 @@
+"""Benchmarks saving the weekly digest PDF, with the cover images served by a local web server
+that takes as long as a real one to answer and a stub S3 that keeps the upload in memory.
+Compares fetching the covers one at a time, as xhtml2pdf does, to fetching them together,
+and fails if a run with an empty cache is over its budget."""
+from argparse import ArgumentParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from threading import Thread
+from time import perf_counter, sleep
+import sys
+
+import pandas as pd
+from PIL import Image
+
+from weekly_digest import generate_email_content, save_pdf_to_s3
+
+# The slowest save allowed with an empty cache, in seconds
+BUDGET = 3
+
+
+class StubS3:
+    """A local stand in for S3, keeping each upload in memory"""
+
+    def __init__(self):
+        self.objects = {}
+
+    def upload_fileobj(self, fileobj, bucket, key):
+        self.objects[(bucket, key)] = fileobj.read()
+
+
+def make_cover() -> bytes:
+    """Makes a JPEG the size of a store's cover image"""
+    cover = BytesIO()
+    Image.new("RGB", (460, 215), (5, 18, 43)).save(cover, "JPEG")
+    return cover.getvalue()
+
+
+def start_image_server(latency: float) -> ThreadingHTTPServer:
+    """Serves the same cover at every address, after waiting latency seconds"""
+    cover = make_cover()
+
+    class CoverHandler(BaseHTTPRequestHandler):
+        def do_GET(self):  # pylint: disable=invalid-name
+            sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.end_headers()
+            self.wfile.write(cover)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CoverHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_html(port: int, games: int) -> str:
+    """Makes the digest html for the week's top games, each with its own cover on the local server"""
+    top_games = pd.DataFrame({
+        'id': range(games),
+        'title': [f"Game {i}" for i in range(games)],
+        'release_date': ['2025-03-01'] * games,
+        'cover_image_url': [f"http://127.0.0.1:{port}/covers/{i}.jpg" for i in range(games)],
+        'platform_name': ['Steam'] * games,
+        'platform_score': range(games)
+    })
+    sum_of_games = pd.DataFrame({'platform_name': ['Steam', 'GOG', 'Epic'], 'game_count': [40, 12, 7]})
+    return generate_email_content(top_games, sum_of_games)
+
+
+def time_save(html: str, cache_dir: str, max_workers: int) -> float:
+    """Times saving the PDF to the stub S3"""
+    s3 = StubS3()
+    start = perf_counter()
+    save_pdf_to_s3(html, s3, cache_dir, max_workers)
+    return perf_counter() - start
+
+
+def init_args():
+    """Gets the number of games and the server's latency from the command line"""
+    parser = ArgumentParser(description="Benchmarks saving the weekly digest PDF")
+    parser.add_argument("-g", "--games", type=int, default=10, help="The number of games in the digest")
+    parser.add_argument("-l", "--latency", type=float, default=0.2, help="Seconds to serve each cover")
+    return parser.parse_args()
+
+
+def main():
+    """Saves the PDF with the covers fetched one at a time, together, and from the cache."""
+    args = init_args()
+    server = start_image_server(args.latency)
+    html = make_html(server.server_address[1], args.games)
+
+    try:
+        with TemporaryDirectory() as serial_cache, TemporaryDirectory() as cache:
+            serial = time_save(html, serial_cache, max_workers=1)
+            concurrent = time_save(html, cache, max_workers=10)
+            cached = time_save(html, cache, max_workers=10)
+    finally:
+        server.shutdown()
+
+    print(f"{'covers':<24}{'seconds':>8}")
+    print(f"{'one at a time':<24}{serial:>8.2f}")
+    print(f"{'together':<24}{concurrent:>8.2f}")
+    print(f"{'cached':<24}{cached:>8.2f}")
+
+    if concurrent > BUDGET:
+        print(f"Saving the PDF took {concurrent:.2f}s, over the {BUDGET}s budget")
+        sys.exit(1)
+    print(f"Saving the PDF was under the {BUDGET}s budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# pylint: skip-file
+from unittest.mock import MagicMock, patch
+
+import psycopg2
+import pytest
+
+from email_outbox import (get_shard, in_shard, add_recipients, claim_recipients, record_results, send_once,
+                          MAX_SEND_ATTEMPTS)
+from test_ses_sender import FakeSES, ses_error
+
+
+def make_connection(claimed=()):
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = [{"recipient": recipient} for recipient in claimed]
+    return conn, cursor
+
+
+def message(recipient):
+    return {"recipient": recipient, "subject": "Digest", "html": "<p>Hi</p>"}
+
+
+def test_get_shard():
+    assert get_shard(None) == (0, 1)
+    assert get_shard({"shard": 2, "shards": 4}) == (2, 4)
+    with patch.dict("email_outbox.ENV", {"SHARD": "1", "SHARDS": "3"}):
+        assert get_shard({}) == (1, 3)
+
+
+def test_in_shard_splits_every_recipient_once():
+    recipients = [f"user{i}@x.com" for i in range(1000)]
+    shards = [[recipient for recipient in recipients if in_shard(recipient, shard, 4)] for shard in range(4)]
+
+    assert sorted(sum(shards, [])) == sorted(recipients)
+    assert all(150 < len(shard) < 350 for shard in shards)
+    assert in_shard("User1@x.com", 0, 4) == in_shard("user1@x.com", 0, 4)
+
+
+def test_add_recipients_in_one_insert():
+    conn, cursor = make_connection()
+    add_recipients(conn, "daily:2025-03-01", ["a@x.com", "b@x.com"])
+
+    query, params = cursor.execute.call_args.args
+    assert "ON CONFLICT (digest_key, recipient) DO NOTHING" in query
+    assert params == ("daily:2025-03-01", ["a@x.com", "b@x.com"])
+    conn.commit.assert_called_once()
+
+
+def test_claim_recipients_returns_unsent():
+    conn, cursor = make_connection(["b@x.com"])
+
+    assert claim_recipients(conn, "daily:2025-03-01", ["a@x.com", "b@x.com"]) == {"b@x.com"}
+    query, params = cursor.execute.call_args.args
+    assert "status IN ('pending', 'failed')" in query
+    assert params[2] == MAX_SEND_ATTEMPTS
+
+
+def test_record_results_in_one_update():
+    conn, cursor = make_connection()
+    record_results(conn, "daily:2025-03-01", [
+        {"recipient": "a@x.com", "status": "sent", "message_id": "id-1", "error": None, "attempts": 1},
+        {"recipient": "b@x.com", "status": "failed", "message_id": None, "error": "Rejected", "attempts": 1}
+    ])
+
+    assert cursor.execute.call_count == 1
+    assert cursor.execute.call_args.args[1] == (["a@x.com", "b@x.com"], ["sent", "failed"],
+                                                ["id-1", None], [None, "Rejected"], "daily:2025-03-01")
+
+
+def test_send_once_only_sends_claimed():
+    conn, cursor = make_connection(["b@x.com", "c@x.com"])
+    ses = FakeSES({"c@x.com": [ses_error("MessageRejected")]})
+
+    results = send_once(conn, ses, "from@x.com", "daily:2025-03-01",
+                        [message("a@x.com"), message("b@x.com"), message("c@x.com")])
+
+    assert [email["recipient"] for email in ses.sent] == ["b@x.com"]
+    assert [result["status"] for result in results] == ["sent", "failed"]
+    assert cursor.execute.call_args.args[1][1] == ["sent", "failed"]
+
+
+def test_send_once_records_in_batches():
+    recipients = [f"user{i}@x.com" for i in range(5)]
+    conn, cursor = make_connection(recipients)
+
+    with patch("email_outbox.BATCH_SIZE", 2):
+        send_once(conn, FakeSES(), "from@x.com", "daily:2025-03-01", [message(r) for r in recipients])
+
+    updates = [call for call in cursor.execute.call_args_list if "UPDATE email_outbox AS o" in call.args[0]]
+    assert [len(update.args[1][0]) for update in updates] == [2, 2, 1]
+
+
+def test_send_once_only_adds_shard():
+    recipients = [f"user{i}@x.com" for i in range(20)]
+    conn, cursor = make_connection()
+
+    send_once(conn, FakeSES(), "from@x.com", "daily:2025-03-01", [message(r) for r in recipients], 1, 3)
+
+    added = cursor.execute.call_args_list[0].args[1][1]
+    assert added == [recipient for recipient in recipients if in_shard(recipient, 1, 3)]
+
+
+def test_send_once_claim_error():
+    conn, cursor = make_connection()
+    cursor.execute.side_effect = psycopg2.Error("DB Error")
+
+    with pytest.raises(psycopg2.Error):
+        send_once(conn, FakeSES(), "from@x.com", "daily:2025-03-01", [message("a@x.com")])
+    conn.rollback.assert_called_once()
@@ -1,31 +1,217 @@
 # pylint: skip-file
 
+from datetime import datetime
+
 import pandas as pd
 
-from unittest.mock import MagicMock
-from weekly_digest import get_weekly_top_games, sum_of_games_released_per_platform
+from unittest.mock import MagicMock, patch
+from weekly_digest import (get_weekly_releases, get_weekly_top_games, get_subscribers,
+                           get_subscriber_preferences, get_price_range, get_digest_key, WeeklyDigest, RELEASE_COLUMNS, sum_of_games_released_per_platform, generate_email_content,
+                           get_image_urls, get_cache_path, fetch_image, prefetch_images, convert_html_to_pdf,
+                           save_pdf_to_s3, BLANK_GIF)
 
 
-def test_get_weekly_top_games():
+def make_releases():
+    return pd.DataFrame([
+        (1, 'Game 1', '2025-02-10', 'http://TEST1.com', 'Steam', 100, 0, ['Action', 'RPG']),
+        (2, 'Game 2', '2025-02-11', 'http://TEST2.com', 'GOG', 2, 2500, ['RPG']),
+        (2, 'Game 2', '2025-02-11', 'http://TEST2.com', 'Steam', 50, 2000, ['RPG']),
+        (3, 'Game 3', '2025-02-12', 'http://TEST3.com', 'Steam', 0, 500, ['Puzzle']),
+        (4, 'Game 4', '2025-02-13', 'http://TEST4.com', 'Epic', 80, 800, ['Action'])
+    ], columns=RELEASE_COLUMNS)
+
+
+def test_get_weekly_releases():
     mock_conn = MagicMock()
 
     mock_cursor = MagicMock()
     mock_conn.cursor.return_value = mock_cursor
-    mock_cursor.fetchall.return_value = [
-        (1, 'Game 1', '2025-02-10', 'http://TEST1.com', 'Steam', 100),
-        (2, 'Game 2', '2025-02-11', 'http://TEST2.com', 'GOG', 2)
-    ]
+    mock_cursor.fetchall.return_value = make_releases().to_dict('records')
+
+    result = get_weekly_releases(mock_conn)
+
+    assert mock_cursor.execute.call_count == 1
+    assert list(result.columns) == RELEASE_COLUMNS
+    assert len(result) == 5
+
 
-    result = get_weekly_top_games(mock_conn)
+def test_get_weekly_top_games():
+    result = get_weekly_top_games(make_releases(), top_n=3)
 
     expected_result = pd.DataFrame({
+        'id': [1, 4, 2],
+        'title': ['Game 1', 'Game 4', 'Game 2'],
+        'release_date': ['2025-02-10', '2025-02-13', '2025-02-11'],
+        'cover_image_url': ['http://TEST1.com', 'http://TEST4.com', 'http://TEST2.com'],
+        'platform_name': ['Steam', 'Epic', 'Steam'],
+        'platform_score': [100, 80, 50]
+    })
+
+    assert result.equals(expected_result)
+
+
+def test_sum_of_games_released_per_platform():
+    result = sum_of_games_released_per_platform(make_releases())
+
+    assert result.to_dict('list') == {'platform_name': ['Steam', 'Epic', 'GOG'], 'game_count': [3, 1, 1]}
+
+
+def test_generate_email_content():
+    top_games = pd.DataFrame({
         'id': [1, 2],
-        'title': ['Game 1', 'Game 2'],
-        'release_date': ['2025-02-10', '2025-02-11'],
+        'title': ['Game & 1', 'Game 2'],
+        'release_date': ['2025-02-10', datetime(2025, 2, 11)],
         'cover_image_url': ['http://TEST1.com', 'http://TEST2.com'],
         'platform_name': ['Steam', 'GOG'],
         'platform_score': [100, 2]
     })
+    sum_of_games = pd.DataFrame({'platform_name': ['Steam', 'GOG'], 'game_count': [10, 3]})
+
+    html = generate_email_content(top_games, sum_of_games)
+
+    assert '<h3>Game &amp; 1</h3>' in html
+    assert '<h3>2025-02-11</h3>' in html
+    assert "<img src='http://TEST2.com'" in html
+    assert html.count('background-color: #000000"') == 2
+    assert '<h3>10</h3>' in html
+
+
+def test_get_price_range():
+    assert get_price_range(0) == 'Free'
+    assert get_price_range(1000) == '£0.01 - £10'
+    assert get_price_range(10001) is None
+    assert get_price_range(20000) == 'Above £100'
+
+
+def test_digest_picks_merge_genres_in_price_range():
+    digest = WeeklyDigest(make_releases(), picks=2)
+
+    assert [game['id'] for game in digest.get_picks(['RPG', 'Action'])] == [1, 4]
+    assert [game['id'] for game in digest.get_picks(['RPG'], '£10.01 - £50')] == [2]
+    assert [game['id'] for game in digest.get_picks(['Puzzle'], 'Free')] == []
+    assert digest.get_picks([], 'Free')[0]['price'] == 'Free'
+
+
+def test_digest_shares_bodies():
+    digest = WeeklyDigest(make_releases())
+    preferences = {
+        'a@test.com': {'genres': ['RPG', 'Action'], 'price_range': None},
+        'b@test.com': {'genres': ['Action', 'RPG'], 'price_range': None},
+        'c@test.com': {'genres': ['Puzzle'], 'price_range': '£0.01 - £10'},
+        'd@test.com': {'genres': [], 'price_range': None}
+    }
+
+    messages = digest.build_messages(['a@test.com', 'b@test.com', 'c@test.com', 'd@test.com', 'e@test.com'],
+                                     preferences)
+
+    bodies = {message['recipient']: message['html'] for message in messages}
+    assert bodies['a@test.com'] is bodies['b@test.com']
+    assert "Picked for you from this week's Action, RPG games" in bodies['a@test.com']
+    assert '<h3>Game 3</h3>' in bodies['c@test.com'] and '<h3>£5.00</h3>' in bodies['c@test.com']
+    assert bodies['d@test.com'] == bodies['e@test.com'] == digest.html
+    assert 'Picked for you' not in digest.html
+    assert len(digest.bodies) == 3
+
+
+def test_get_digest_key_iso_week():
+    assert get_digest_key(datetime(2025, 1, 1)) == 'weekly:2025-W01'
+    assert get_digest_key(datetime(2024, 12, 30)) == 'weekly:2025-W01'
+
+
+def test_get_subscribers_pages():
+    sns = MagicMock()
+    sns.list_subscriptions_by_topic.side_effect = [
+        {'Subscriptions': [{'Protocol': 'email', 'Endpoint': 'a@test.com', 'SubscriptionArn': 'arn:1'},
+                           {'Protocol': 'email', 'Endpoint': 'b@test.com', 'SubscriptionArn': 'PendingConfirmation'}],
+         'NextToken': 'next'},
+        {'Subscriptions': [{'Protocol': 'sms', 'Endpoint': '0123', 'SubscriptionArn': 'arn:2'},
+                           {'Protocol': 'email', 'Endpoint': 'c@test.com', 'SubscriptionArn': 'arn:3'}]}
+    ]
+    with patch.dict("weekly_digest.ENV", {"SNS_TOPIC_ARN": "arn:topic"}):
+        assert get_subscribers(sns) == ['a@test.com', 'c@test.com']
+
+    assert sns.list_subscriptions_by_topic.call_args_list[1].kwargs == {'TopicArn': 'arn:topic', 'NextToken': 'next'}
+
+
+def test_get_subscriber_preferences():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_cursor.fetchall.return_value = [{'email': 'a@test.com', 'price_range': 'Free', 'genres': ['RPG']}]
+
+    assert get_subscriber_preferences(mock_conn) == {'a@test.com': {'genres': ['RPG'], 'price_range': 'Free'}}
+    assert mock_cursor.execute.call_count == 1
+
+
+class StubS3:
+    """A local stand in for S3, keeping each upload in memory"""
+
+    def __init__(self):
+        self.objects = {}
+
+    def upload_fileobj(self, fileobj, bucket, key):
+        self.objects[(bucket, key)] = fileobj.read()
+
+
+def make_image(directory, name):
+    image = directory / name
+    image.write_bytes(BLANK_GIF)
+    return image.as_uri()
+
+
+def test_get_image_urls():
+    html = """<img src="https://i.imgur.com/logo.png" alt="logo"><img src='http://a.com/1.jpg?w=1&amp;h=2'/>
+              <img src='http://a.com/1.jpg?w=1&amp;h=2'/><img src='/local.png'/>"""
+    assert get_image_urls(html) == ["https://i.imgur.com/logo.png", "http://a.com/1.jpg?w=1&h=2"]
+
+
+def test_fetch_image_caches(tmp_path):
+    url = make_image(tmp_path, "cover.gif")
+    cache = tmp_path / "cache"
+    cache.mkdir()
+
+    file_path = fetch_image(url, str(cache))
+    assert file_path == get_cache_path(url, str(cache))
+
+    # Served from the cache once it's there, even if the original has gone
+    (tmp_path / "cover.gif").unlink()
+    assert fetch_image(url, str(cache)) == file_path
+
+
+def test_prefetch_images_blank_on_failure(tmp_path):
+    good = make_image(tmp_path, "cover.gif")
+    bad = (tmp_path / "missing.gif").as_uri()
+
+    images = prefetch_images([good, bad], str(tmp_path / "cache"))
+
+    assert images[good] == get_cache_path(good, str(tmp_path / "cache"))
+    assert images[bad].endswith("blank.gif")
+
+
+def test_convert_html_to_pdf_uses_cached_images(tmp_path):
+    url = "http://covers.example.com/1.gif"
+    image = tmp_path / "1.gif"
+    image.write_bytes(BLANK_GIF)
+
+    with patch("weekly_digest.urlopen") as mock_urlopen:
+        pdf = convert_html_to_pdf(f"<html><body><img src='{url}'/></body></html>", {url: str(image)},
+                                  str(tmp_path))
+
+    assert pdf.startswith(b"%PDF")
+    mock_urlopen.assert_not_called()
+
+
+def test_save_pdf_to_s3_in_memory(tmp_path):
+    s3 = StubS3()
+    image = tmp_path / "1.gif"
+    image.write_bytes(BLANK_GIF)
+    images = {"http://a.com/1.gif": str(image)}
+    with patch.dict("weekly_digest.ENV", {"PRIVATE_BUCKET_NAME": "bucket"}), \
+         patch("weekly_digest.prefetch_images", return_value=images) as mock_prefetch, \
+         patch("weekly_digest.open", create=True) as mock_open:
+        key = save_pdf_to_s3("<html><body><img src='http://a.com/1.gif'/></body></html>", s3, str(tmp_path))
 
-    assert all(result ==
-               expected_result)
+    assert key.startswith("weekly_summaries/") and key.endswith(".pdf")
+    assert s3.objects[("bucket", key)].startswith(b"%PDF")
+    assert mock_prefetch.call_args.args[0] == ["http://a.com/1.gif"]
+    mock_open.assert_not_called()
@@ -1,7 +1,13 @@
 """Creates an email giving weekly digestible information on new game platform trends"""
 
-from os import environ as ENV, makedirs, path
+from os import environ as ENV, makedirs, path, replace
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from hashlib import sha256
+from html import unescape
+from io import BytesIO
+from urllib.request import urlopen
+import re
 
 from dotenv import load_dotenv
 from psycopg2.extensions import connection
@@ -10,6 +16,51 @@ from psycopg2.extras import RealDictCursor
 import pandas as pd
 from xhtml2pdf import pisa
 import boto3
+from botocore.config import Config
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup
+
+from ses_sender import MAX_WORKERS
+from email_outbox import get_shard, in_shard, send_once
+
+SENDER = "trainee.jamie.groom@sigmalabs.co.uk"
+
+# The email template is compiled once, when the lambda starts
+TEMPLATES = Environment(
+    loader=FileSystemLoader(path.join(path.dirname(path.abspath(__file__)), "templates")),
+    autoescape=select_autoescape(["html"]),
+    trim_blocks=True
+)
+DIGEST_TEMPLATE = TEMPLATES.get_template("weekly_digest.html")
+PICKS_TEMPLATE = TEMPLATES.get_template("picks.html")
+
+# Where each subscriber's picks go in the digest
+PICKS_MARKER = "<!-- picks -->"
+
+TOP_GAMES = 10
+PICKS = 5
+
+RELEASE_COLUMNS = ['id', 'title', 'release_date', 'cover_image_url',
+                   'platform_name', 'platform_score', 'platform_price', 'genres']
+
+# The same price ranges, in pence, as the dashboard's filters
+PRICE_RANGES = {
+    "Free": (0, 0),
+    "£0.01 - £10": (1, 1000),
+    "£10.01 - £50": (1001, 5000),
+    "£50.01 - £100": (5001, 10000),
+    "Above £100": (10002, None)
+}
+
+# Cover images are kept here between runs of a warm lambda
+IMAGE_CACHE = "/tmp/covers"
+IMAGE_WORKERS = 10
+IMAGE_TIMEOUT = 10
+
+# A transparent 1x1 GIF
+BLANK_GIF = (b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00"
+             b",\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;")
+
 
 def get_sns_connection() -> boto3.client:
     """Get SNS client connection"""
@@ -31,7 +82,8 @@ def get_ses_connection() -> boto3.client:
         'ses',
         aws_access_key_id=ENV['PRIVATE_AWS_ACCESS_KEY'],
         aws_secret_access_key=ENV['PRIVATE_AWS_SECRET_ACCESS_KEY'],
-        region_name=ENV['PRIVATE_AWS_REGION']
+        region_name=ENV['PRIVATE_AWS_REGION'],
+        config=Config(max_pool_connections=MAX_WORKERS)
     )
     print("Connected to SES.")
     return ses_client
@@ -51,162 +103,271 @@ def get_database_connection() -> connection:
     return connection
 
 
-def get_weekly_top_games(conn: connection) -> pd.DataFrame:
-    """Returns a Dataframe of the top games of the week per week"""
+def get_weekly_releases(conn: connection) -> pd.DataFrame:
+    """Returns every game released this week on each platform with its genres,
+    which the whole digest is worked out from"""
     query = """SELECT
     g.game_id AS id,
     g.game_name AS title,
     gpa.platform_release_date AS release_date,
     g.game_image AS cover_image_url,
     p.platform_name,
-    gpa.platform_score
+    gpa.platform_score,
+    gpa.platform_price,
+    ARRAY(SELECT ge.genre_name
+          FROM genre_game_platform_assignment AS gga
+          JOIN genre AS ge ON gga.genre_id = ge.genre_id
+          WHERE gga.platform_assignment_id = gpa.platform_assignment_id) AS genres
     FROM game AS g
     JOIN game_platform_assignment AS gpa ON g.game_id = gpa.game_id
     JOIN platform AS p ON gpa.platform_id = p.platform_id
-    WHERE gpa.platform_release_date >= CURRENT_DATE - INTERVAL '7 days'
-    AND gpa.platform_score > 0
-    ORDER BY gpa.platform_score DESC
-    LIMIT 10;
+    WHERE gpa.platform_release_date >= CURRENT_DATE - INTERVAL '7 days';
     """
     cursor = conn.cursor()
     cursor.execute(query)
     result = cursor.fetchall()
-    return pd.DataFrame(
-        result, columns=['id', 'title', 'release_date',
-                         'cover_image_url', 'platform_name', 'platform_score'])
+    return pd.DataFrame(result, columns=RELEASE_COLUMNS)
 
 
-def sum_of_games_released_per_platform(conn: connection) -> pd.DataFrame:
-    """Returns the number of games released this week per platform"""
-    query = """SELECT
-    p.platform_name,
-    COUNT(g.game_id) AS game_count
-    FROM game AS g
-    JOIN game_platform_assignment AS gpa ON g.game_id = gpa.game_id
-    JOIN platform AS p ON gpa.platform_id = p.platform_id
-    WHERE gpa.platform_release_date >= CURRENT_DATE - INTERVAL '7 days'  -- Games released this week
-    GROUP BY p.platform_name
-    ORDER BY game_count DESC;"""
+def get_weekly_top_games(releases: pd.DataFrame, top_n: int = TOP_GAMES) -> pd.DataFrame:
+    """Returns a Dataframe of the top games of the week per week"""
+    top_games = releases[releases['platform_score'] > 0].sort_values(
+        'platform_score', ascending=False, kind='stable').head(top_n)
+    return top_games[['id', 'title', 'release_date', 'cover_image_url',
+                      'platform_name', 'platform_score']].reset_index(drop=True)
 
-    cursor = conn.cursor()
-    cursor.execute(query)
-    result = cursor.fetchall()
-    return pd.DataFrame(result, columns=['platform_name', 'game_count'])
 
+def sum_of_games_released_per_platform(releases: pd.DataFrame) -> pd.DataFrame:
+    """Returns the number of games released this week per platform"""
+    counts = releases.groupby('platform_name').size().reset_index(name='game_count')
+    return counts.sort_values('game_count', ascending=False, kind='stable', ignore_index=True)
 
-def generate_email_content(
-        top_games: pd.DataFrame, sum_of_games: pd.DataFrame) -> str:
-    """Generates an HTML email with the platform game
-    count table at the top and the top games table below"""
-    html = """<html><head>
-    <link href='https://fonts.googleapis.com/css?family=Press Start 2P' rel='stylesheet'>
-    <link href='https://fonts.googleapis.com/css?family=Lexend' rel='stylesheet'><style>
-    h2 {
-        font-family: 'Press Start 2P';font-size: 32px;
-        color: #ffff00;
-        text-align: center;
-    }
-    h3 {
-        font-family: 'Lexend';font-size: 26px;
-        color: #00e5c2;
-        text-align: center;
-    }
-    table { 
-    margin-left: auto;
-    margin-right: auto;
-    width: 80%;
-    }
-    </style></head>
-    <body style="background-color:#05122b;">
-    <img src="https://i.imgur.com/hY6MSBU.png" alt="Playstream logo" style="width:150px;height:150px;">
-    <h2>Weekly Game Platform Trends</h2>
-    <p><h3>Here are the number of games released per platform this week:</h3></p>
-    <table border='1' cellpadding='5' cellspacing='0' style="border-collapse: collapse; width: 50%;">
-    <tr style="background-color: #000000;">
-        <th><h2>Platform</h2></th><th><h2>Games Released</h2></th>
-    </tr>"""
-
-    for i, (_, row) in enumerate(sum_of_games.iterrows()):
-        row_style = "background-color: #05122b;" if i % 2 == 0 else "background-color: #000000"
-        html += f"""<tr style='{row_style}'><td><h3>{row['platform_name']}</h3></td>
-                                            <td><h3>{row['game_count']}</h3></td></tr>"""
-
-    html += "</table>"
-
-    html += "<p><h3>Here are the top games released this week:</h3></p>"
-    html += """<table border='1' cellpadding='5' cellspacing='0' style="border-collapse: collapse;">
-    <tr style="background-color: #000000;">
-        <th><h2>Title</h2></th><th><h2>Platform</h2></th><th><h2>Release Date</h2></th><th><h2>Score</h2></th><th><h2>Cover</h2></th>
-    </tr>"""
-
-    for i, (_, row) in enumerate(top_games.iterrows()):
-        release_date = datetime.strptime(row['release_date'], '%Y-%m-%d') if isinstance(
-            row['release_date'], str) else row['release_date']
-        release_date_str = release_date.strftime('%Y-%m-%d')
-
-        row_style = "background-color: #05122b;" if i % 2 == 0 else "background-color: #000000"
-
-        html += f"""
-        <tr style="{row_style}">
-            <td><h3>{row['title']}</h3></td>
-            <td><h3>{row['platform_name']}</h3></td>
-            <td><h3>{release_date_str}</h3></td>
-            <td><h3>{row['platform_score']}</h3></td>
-            <td><img src='{row['cover_image_url']}' style="width: 100%; height: 100%;"/></td>
-        </tr>"""
-
-    html += "</table></body></html>"
-
-    return html
 
+def format_release_date(release_date) -> str:
+    """Formats a release date from the database or a string as YYYY-MM-DD"""
+    if isinstance(release_date, str):
+        release_date = datetime.strptime(release_date, '%Y-%m-%d')
+    return release_date.strftime('%Y-%m-%d')
 
-def get_subscribers(sns_conn: boto3.client) -> list[str]:
-    """Gets a list of subscribers for the 'play_stream_weekly_digest' topic"""
-    response = sns_conn.list_subscriptions_by_topic(
-        TopicArn=ENV['SNS_TOPIC_ARN'])
-    subscribers = [sub['Endpoint'] for sub in response.get(
-        'Subscriptions', []) if sub['Protocol'] == 'email']
-    return subscribers
 
+def format_price(price: int) -> str:
+    """Formats a price in pence as Free or pounds"""
+    return "Free" if price == 0 else f"£{price / 100:.2f}"
 
-def send_email(ses_client: boto3.client, subscribers: list, html_body: str):
-    """Sends an email with the HTML content to subscribers"""
-    for subscriber in subscribers:
-        ses_client.send_email(
-            Source="trainee.jamie.groom@sigmalabs.co.uk",
-            Destination={'ToAddresses': [subscriber]},
-            Message={
-                'Subject': {'Data': "Weekly Game Platform Trends"},
-                'Body': {'Html': {'Data': html_body}}
-            }
-        )
 
+def get_price_range(price: int) -> str:
+    """Returns the price range a price is in, or None if it isn't in any"""
+    for price_range, (low, high) in PRICE_RANGES.items():
+        if price >= low and (high is None or price <= high):
+            return price_range
+    return None
 
-def convert_html_to_pdf(source_html: str, output_filename: str) -> None:
-    """Converts the html to a pdf."""
 
-    makedirs(path.dirname(output_filename), exist_ok=True)
-    
-    with open(output_filename, "w+b") as result_file:
-        pisa.CreatePDF(source_html, dest=result_file)
+def generate_email_content(
+        top_games: pd.DataFrame, sum_of_games: pd.DataFrame, picks_html: str = "") -> str:
+    """Generates an HTML email with the platform game
+    count table at the top, the top games table below and then any picks for the subscriber"""
+    games = top_games.to_dict('records')
+    for game in games:
+        game['release_date'] = format_release_date(game['release_date'])
+
+    return DIGEST_TEMPLATE.render(platforms=sum_of_games.to_dict('records'), games=games,
+                                  picks_html=picks_html)
+
+
+class WeeklyDigest:
+    """The week's releases held in memory, with everything the subscribers' digests share worked out once.
+    Each subscriber's picks are merged from the top games of each of their genres in their price range,
+    and subscribers with the same genres and price range are sent the same body"""
+
+    def __init__(self, releases: pd.DataFrame, picks: int = PICKS):
+        self.picks = picks
+        games = releases.sort_values('platform_score', ascending=False, kind='stable').to_dict('records')
+
+        # The best games of each genre in each price range, None is any genre or price range
+        self.top_by_genre = {}
+        for game in games:
+            game['price'] = format_price(game['platform_price'])
+            for genre in list(game['genres']) + [None]:
+                for price_range in (get_price_range(game['platform_price']), None):
+                    top = self.top_by_genre.setdefault((genre, price_range), [])
+                    if len(top) < picks and all(pick['id'] != game['id'] for pick in top):
+                        top.append(game)
+
+        # The picks go between the same start and end for everyone
+        page = generate_email_content(get_weekly_top_games(releases),
+                                      sum_of_games_released_per_platform(releases), Markup(PICKS_MARKER))
+        self.head, self.tail = page.split(PICKS_MARKER)
+        self.html = self.head + self.tail
+        self.bodies = {}
+
+    def get_picks(self, genres: list, price_range: str = None) -> list[dict]:
+        """Returns the best games released this week in any of the genres and the price range"""
+        candidates = [game for genre in (genres or [None])
+                      for game in self.top_by_genre.get((genre, price_range), [])]
+        picks = {}
+        for game in sorted(candidates, key=lambda game: game['platform_score'], reverse=True):
+            picks.setdefault(game['id'], game)
+            if len(picks) == self.picks:
+                break
+        return list(picks.values())
+
+    def get_body(self, genres: list, price_range: str = None) -> str:
+        """Returns the digest for a subscriber's genres and price range, made once for each combination"""
+        key = (tuple(sorted(genres)), price_range)
+        if key not in self.bodies:
+            if not genres and not price_range:
+                self.bodies[key] = self.html
+            else:
+                picks_html = PICKS_TEMPLATE.render(picks=self.get_picks(key[0], price_range),
+                                                   genres=key[0], price_range=price_range)
+                self.bodies[key] = self.head + picks_html + self.tail
+        return self.bodies[key]
+
+    def build_messages(self, subscribers: list[str], preferences: dict) -> list[dict]:
+        """Builds each subscriber's email, those without preferences get the digest without picks"""
+        messages = []
+        for subscriber in subscribers:
+            preference = preferences.get(subscriber, {})
+            body = self.get_body(preference.get('genres') or [], preference.get('price_range'))
+            messages.append({"recipient": subscriber, "subject": "Weekly Game Platform Trends", "html": body})
+        print(f"Built {len(messages)} digests from {len(self.bodies)} bodies.")
+        return messages
 
 
-def save_pdf_to_s3(html: str) -> None:
-    """Stores the most recent digest as a PDF file in a S3"""
+def get_subscribers(sns_conn: boto3.client) -> list[str]:
+    """Gets a list of confirmed subscribers for the 'play_stream_weekly_digest' topic, page by page"""
+    subscribers = []
+    params = {"TopicArn": ENV['SNS_TOPIC_ARN']}
+    while True:
+        response = sns_conn.list_subscriptions_by_topic(**params)
+        subscribers.extend(sub['Endpoint'] for sub in response.get('Subscriptions', [])
+                           if sub['Protocol'] == 'email' and sub['SubscriptionArn'] != 'PendingConfirmation')
 
-    file_name = str(datetime.strftime(datetime.today().date(),'%d-%m-%Y')) + ".pdf"
-    bucket_name = ENV['PRIVATE_BUCKET_NAME']
+        if not response.get('NextToken'):
+            return subscribers
+        params['NextToken'] = response['NextToken']
 
-    convert_html_to_pdf(html, "/tmp/" + file_name)
 
-    s3 = boto3.client(
+def get_subscriber_preferences(conn: connection) -> dict:
+    """Returns every subscriber's confirmed genres and price range in one query, keyed by email"""
+    query = """SELECT
+    sb.email,
+    sb.price_range,
+    ARRAY_REMOVE(ARRAY_AGG(DISTINCT ge.genre_name), NULL) AS genres
+    FROM subscriber AS sb
+    LEFT JOIN subscription AS s ON s.subscriber_id = sb.subscriber_id AND s.status = 'confirmed'
+    LEFT JOIN genre AS ge ON s.topic_name = 'play_stream_' || REPLACE(LOWER(ge.genre_name), ' ', '_')
+    GROUP BY sb.email, sb.price_range;
+    """
+    cursor = conn.cursor()
+    cursor.execute(query)
+    return {row['email']: {'genres': row['genres'], 'price_range': row['price_range']}
+            for row in cursor.fetchall()}
+
+
+def get_digest_key(day: datetime = None) -> str:
+    """Returns the outbox key of a week's digest, each subscriber is sent it once"""
+    return f"weekly:{(day or datetime.now()).strftime('%G-W%V')}"
+
+
+def send_email(ses_client: boto3.client, messages: list[dict], conn: connection,
+               digest_key: str, shard: int = 0, shards: int = 1) -> list[dict]:
+    """Sends each subscriber in the shard their digest, in parallel at the account's send rate.
+    Subscribers the email outbox has already sent the digest to are skipped.
+    Returns the result of each subscriber sent to"""
+    return send_once(conn, ses_client, SENDER, digest_key, messages, shard, shards)
+
+
+def get_image_urls(html: str) -> list[str]:
+    """Returns the distinct web addresses of the images in the html, in the order they appear"""
+    urls = re.findall(r"""<img[^>]+src=['"](https?://[^'"]+)['"]""", html)
+    return list(dict.fromkeys(unescape(url) for url in urls))
+
+
+def get_cache_path(url: str, cache_dir: str = IMAGE_CACHE) -> str:
+    """Returns where an image is cached, named by a hash of its address"""
+    return path.join(cache_dir, sha256(url.encode()).hexdigest())
+
+
+def fetch_image(url: str, cache_dir: str = IMAGE_CACHE) -> str:
+    """Downloads an image to the cache, unless it's already there from an earlier run.
+    Returns its path, or the blank image's path if it can't be downloaded"""
+    file_path = get_cache_path(url, cache_dir)
+    if path.exists(file_path):
+        return file_path
+    try:
+        with urlopen(url, timeout=IMAGE_TIMEOUT) as response:
+            image = response.read()
+    except (OSError, ValueError) as e:
+        print(f"Couldn't fetch {url}: {e}")
+        return get_blank_image(cache_dir)
+
+    # Written in one step, so a run that stops part way never leaves half an image in the cache
+    with open(file_path + ".tmp", "wb") as f:
+        f.write(image)
+    replace(file_path + ".tmp", file_path)
+    return file_path
+
+
+def get_blank_image(cache_dir: str = IMAGE_CACHE) -> str:
+    """Returns the path of a transparent image, shown in place of images that can't be downloaded"""
+    file_path = path.join(cache_dir, "blank.gif")
+    if not path.exists(file_path):
+        with open(file_path, "wb") as f:
+            f.write(BLANK_GIF)
+    return file_path
+
+
+def prefetch_images(urls: list[str], cache_dir: str = IMAGE_CACHE,
+                    max_workers: int = IMAGE_WORKERS) -> dict:
+    """Downloads the images at the same time, returning {url: cached path}"""
+    makedirs(cache_dir, exist_ok=True)
+    if not urls:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as executor:
+        paths = executor.map(lambda url: fetch_image(url, cache_dir), urls)
+        return dict(zip(urls, paths))
+
+
+def convert_html_to_pdf(source_html: str, images: dict = None, cache_dir: str = IMAGE_CACHE) -> bytes:
+    """Converts the html to a pdf in memory, reading any images in images from the cache
+    instead of downloading them"""
+    images = images or {}
+    pdf = BytesIO()
+    # xhtml2pdf only reads local files under the document's path, which is the cache
+    result = pisa.CreatePDF(source_html, dest=pdf, path=cache_dir,
+                            link_callback=lambda uri, rel: images.get(uri, uri))
+    if result.err:
+        print(f"The PDF had {result.err} error(s)")
+    return pdf.getvalue()
+
+
+def get_s3_connection() -> boto3.client:
+    """Get S3 client connection"""
+    return boto3.client(
         's3',
         aws_access_key_id=ENV['PRIVATE_AWS_ACCESS_KEY'],
         aws_secret_access_key=ENV['PRIVATE_AWS_SECRET_ACCESS_KEY'],
         region_name=ENV['PRIVATE_AWS_REGION']
     )
-    with open("/tmp/" + file_name, "rb") as f:
-        s3.upload_fileobj(f, bucket_name, "weekly_summaries/" + file_name)
+
+
+def save_pdf_to_s3(html: str, s3_client: boto3.client = None, cache_dir: str = IMAGE_CACHE,
+                   max_workers: int = IMAGE_WORKERS) -> str:
+    """Stores the most recent digest as a PDF file in a S3, returning its key.
+    The cover images are downloaded together beforehand and the PDF never touches the disk"""
+
+    file_name = str(datetime.strftime(datetime.today().date(),'%d-%m-%Y')) + ".pdf"
+    key = "weekly_summaries/" + file_name
+    bucket_name = ENV['PRIVATE_BUCKET_NAME']
+
+    images = prefetch_images(get_image_urls(html), cache_dir, max_workers)
+    pdf = convert_html_to_pdf(html, images, cache_dir)
+
+    s3_client = s3_client or get_s3_connection()
+    s3_client.upload_fileobj(BytesIO(pdf), bucket_name, key)
+    return key
 
 
 def lambda_handler(event, context):
@@ -214,16 +375,20 @@ def lambda_handler(event, context):
     load_dotenv()
     conn = get_database_connection()
 
-    top_games = get_weekly_top_games(conn)
-    sum_of_games = sum_of_games_released_per_platform(conn)
-    html_body = generate_email_content(top_games, sum_of_games)
-    save_pdf_to_s3(html_body)
+    shard, shards = get_shard(event)
+
+    digest = WeeklyDigest(get_weekly_releases(conn))
+    # Every shard works out the same digest, only the first saves it
+    if shard == 0:
+        save_pdf_to_s3(digest.html)
 
     sns_client = get_sns_connection()
-    subscribers = get_subscribers(sns_client)
+    subscribers = [subscriber for subscriber in get_subscribers(sns_client)
+                   if in_shard(subscriber, shard, shards)]
+    messages = digest.build_messages(subscribers, get_subscriber_preferences(conn))
     ses_client = get_ses_connection()
-    send_email(ses_client, subscribers, html_body)
+    send_email(ses_client, messages, conn, get_digest_key(), shard, shards)
 
 
 if __name__ == "__main__":
-    lambda_handler(None, None)
\ No newline at end of file
+    lambda_handler(None, None)
@@ -1,10 +1,19 @@
 """Extracts script that pulls game data from undocumented GraphQL API"""
 # Native imports
+from time import perf_counter
+import json
 import logging
 
 # Third-party imports
 import requests
 
+# Local imports
+import epic_checkpoint as ck
+import epic_archive as archive
+import epic_fetch as fetch
+
+
+RATING_URL = 'https://graphql.epicgames.com/graphql'
 
 
 def load_query(filename: str) -> str:
@@ -22,11 +31,14 @@ def extract_games(url: str) -> list[dict]:
         logging.error(f"Failed to fetch data: {response.status_code}")
         return []
 
-    data = response.json()
-    games = data.get("data", {}).get("Catalog", {}).get(
-        "searchStore", {}).get("elements", [])
+    archive.archive_response(f"{url}#query_all", response.text)
+    return parse_games(response.json())
 
-    return games
+
+def parse_games(data: dict) -> list[dict]:
+    """Gets the games out of a catalog response"""
+    return data.get("data", {}).get("Catalog", {}).get(
+        "searchStore", {}).get("elements", [])
 
 
 def get_platform_score(sandbox_id: str) -> str:
@@ -36,12 +48,17 @@ def get_platform_score(sandbox_id: str) -> str:
     query = query.replace("QUERY", sandbox_id)
 
     response = requests.post(
-        url='https://graphql.epicgames.com/graphql', json={"query": query})
+        url=RATING_URL, json={"query": query})
     if response.status_code != 200:
         logging.error(f"Failed to fetch data: {response.status_code}")
         return []
 
-    data = response.json()
+    archive.archive_response(f"{RATING_URL}#{sandbox_id}", response.text)
+    return parse_platform_score(response.json())
+
+
+def parse_platform_score(data: dict) -> str:
+    """Gets the rating out of a rating response"""
     try:
         platform_score = data.get("data", {}).get("RatingsPolls", {}).get(
             "getProductResult", {}).get("averageRating")
@@ -87,13 +104,43 @@ def get_link(game: dict) -> str:
     return link if link else None
 
 
-def format_data(games: list[dict]) -> list[dict]:
-    """Formats raw game data into a standardized list of dictionaries."""
+def format_data(games: list[dict], conn=None, run_id: int = None,
+                scores: dict = None, page_states: dict = None) -> list[dict]:
+    """Formats raw game data into a standardized list of dictionaries.
+    If a run_id is given, games already formatted by the run are taken from
+    its checkpoints and each newly formatted game is checkpointed.
+    If scores are given, in the form {sandbox_id: score}, they are used
+    instead of querying the API for each game's rating.
+    If page_states are given, in the form {link: state}, games that haven't
+    changed since they were loaded are skipped."""
+    checkpoints = ck.get_checkpoints(conn, run_id) if run_id else {}
     game_list = []
     for game in games:
+        link = get_link(game)
+        if ck.is_loaded(checkpoints, link):
+            continue
+        game_data = ck.get_extracted(checkpoints, link)
+        if game_data is not None:
+            game_list.append(game_data)
+            continue
+
+        state = None
+        if page_states is not None and link:
+            page = fetch.check_content(json.dumps(game, sort_keys=True),
+                                       fetch.new_page_state(link, page_states.get(link)))
+            if not page["changed"]:
+                continue
+            state = page["state"]
+
         mappings = game.get("catalogNs", {}).get("mappings")
         sandbox_id = mappings[0]["sandboxId"] if mappings else None
         genres, tags = get_genre_tags(game.get("tags", []))
+        if not sandbox_id:
+            platform_score = None
+        elif scores is not None:
+            platform_score = scores.get(sandbox_id)
+        else:
+            platform_score = get_platform_score(sandbox_id)
         game_data = {
             "title": game.get("title"),
             "genres": genres if genres else None,
@@ -102,8 +149,7 @@ def format_data(games: list[dict]) -> list[dict]:
             "developer": [game.get("developerDisplayName")]
                 if game.get("developerDisplayName") else None,
             "tag": tags if tags else None,
-            "platform_score": get_platform_score(sandbox_id)
-                if sandbox_id else None,
+            "platform_score": platform_score,
             "platform_price": game.get("price", {}).get(
                 "totalPrice", {}).get("originalPrice"),
             "platform_discount": game.get("price", {}).get(
@@ -111,17 +157,49 @@ def format_data(games: list[dict]) -> list[dict]:
             "release_date": game.get("releaseDate"),
             "game_image": game.get("keyImages", [{}])[0].get("url"),
             "age_rating": get_pegi_age_control(game),
-            "link": get_link(game)
+            "link": link
         }
+        if state:
+            data_changed = fetch.check_data(game_data, state)
+            if link in page_states and not data_changed:
+                continue
+            game_data["page_state"] = state
+        if run_id and link:
+            ck.save_extracted(conn, run_id, link, game_data)
         game_list.append(game_data)
 
     return game_list
 
 
-def main(url: str) -> list[dict]:
+def main(url: str, conn=None, run_id: int = None) -> list[dict]:
     """Extracts the data in the correct format"""
     games = extract_games(url)
-    return format_data(games)
+    page_states = fetch.get_page_states(
+        conn, [get_link(game) for game in games]) if conn else None
+    return format_data(games, conn, run_id, page_states=page_states)
+
+
+def replay_archive(location: str) -> list[dict]:
+    """Formats the archived catalog and rating responses instead of querying the API.
+    Logs the parsing throughput, so this doubles as an offline benchmark."""
+    responses = archive.get_archived_responses(location)
+    catalogs = [response for response in responses if response["url"].endswith("#query_all")]
+    if not catalogs:
+        logging.error("No archived catalog found in %s", location)
+        return []
+
+    start = perf_counter()
+    latest_catalog = max(catalogs, key=lambda response: response["fetched_at"])
+    games = parse_games(json.loads(latest_catalog["body"]))
+    scores = {response["url"].split("#")[-1]: parse_platform_score(json.loads(response["body"]))
+              for response in responses if response["url"].startswith(f"{RATING_URL}#")
+              and not response["url"].endswith("#query_all")}
+    game_list = format_data(games, scores=scores)
+    elapsed = perf_counter() - start
+
+    logging.info("Parsed %s archived games in %.2fs (%.1f games/s)",
+                 len(game_list), elapsed, len(game_list) / elapsed if elapsed else 0)
+    return game_list
 
 
 if __name__ == "__main__":
@@ -0,0 +1,124 @@
+"""Exports a Parquet snapshot of the games after each load, so the dashboard can run without the database"""
+# Native imports
+from os import environ as ENV, makedirs, path, replace
+import logging
+
+# Third-party imports
+import psycopg
+
+# Local imports
+from epic_archive import is_s3_location, split_s3_location, get_s3_client
+
+
+SNAPSHOT_NAME = "games.parquet"
+
+# One row per game on each platform, with its genres, tags, developers and publishers as lists
+SNAPSHOT_QUERY = """
+    SELECT
+        gp.platform_assignment_id,
+        g.game_id,
+        g.game_name,
+        g.game_image,
+        g.is_image_valid,
+        g.is_nsfw,
+        ar.age_rating_name,
+        p.platform_name,
+        gp.platform_release_date,
+        gp.platform_score,
+        gp.platform_price,
+        gp.platform_discount,
+        gp.platform_url,
+        ARRAY(SELECT ge.genre_name FROM genre_game_platform_assignment gga
+              JOIN genre ge ON gga.genre_id = ge.genre_id
+              WHERE gga.platform_assignment_id = gp.platform_assignment_id) AS genres,
+        ARRAY(SELECT t.tag_name FROM tag_game_platform_assignment tga
+              JOIN tag t ON tga.tag_id = t.tag_id
+              WHERE tga.platform_assignment_id = gp.platform_assignment_id) AS tags,
+        ARRAY(SELECT d.developer_name FROM developer_game_assignment dga
+              JOIN developer d ON dga.developer_id = d.developer_id
+              WHERE dga.game_id = g.game_id) AS developers,
+        ARRAY(SELECT pu.publisher_name FROM publisher_game_assignment pga
+              JOIN publisher pu ON pga.publisher_id = pu.publisher_id
+              WHERE pga.game_id = g.game_id) AS publishers
+    FROM game_platform_assignment gp
+    JOIN game g ON gp.game_id = g.game_id
+    JOIN platform p ON gp.platform_id = p.platform_id
+    LEFT JOIN age_rating ar ON g.age_rating_id = ar.age_rating_id
+    ORDER BY gp.platform_assignment_id"""
+
+
+def get_schema():
+    """Gets the snapshot's Arrow schema, pyarrow is only imported when a snapshot is written"""
+    import pyarrow as pa # pylint: disable=import-outside-toplevel
+    return pa.schema([
+        ("platform_assignment_id", pa.int32()),
+        ("game_id", pa.int32()),
+        ("game_name", pa.string()),
+        ("game_image", pa.string()),
+        ("is_image_valid", pa.bool_()),
+        ("is_nsfw", pa.bool_()),
+        ("age_rating_name", pa.string()),
+        ("platform_name", pa.string()),
+        ("platform_release_date", pa.date32()),
+        ("platform_score", pa.int32()),
+        ("platform_price", pa.int32()),
+        ("platform_discount", pa.int32()),
+        ("platform_url", pa.string()),
+        ("genres", pa.list_(pa.string())),
+        ("tags", pa.list_(pa.string())),
+        ("developers", pa.list_(pa.string())),
+        ("publishers", pa.list_(pa.string()))
+    ])
+
+
+def get_snapshot_rows(conn: psycopg.Connection) -> list[dict]:
+    """Gets every game on every platform, denormalised for the snapshot"""
+    with conn.cursor() as cur:
+        cur.execute(SNAPSHOT_QUERY)
+        return cur.fetchall()
+
+
+def make_snapshot(rows: list[dict]) -> bytes:
+    """Makes a zstd compressed Parquet file of the rows"""
+    import pyarrow as pa # pylint: disable=import-outside-toplevel
+    import pyarrow.parquet as pq # pylint: disable=import-outside-toplevel
+    table = pa.Table.from_pylist(rows, schema=get_schema())
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink, compression="zstd")
+    return sink.getvalue().to_pybytes()
+
+
+def write_snapshot(snapshot: bytes, location: str, s3_client=None) -> None:
+    """Writes the snapshot to a directory or an S3 location.
+    Local snapshots are replaced in one step, so a dashboard reading the old one is never given half a file"""
+    if is_s3_location(location):
+        bucket, prefix = split_s3_location(location)
+        s3_client = s3_client or get_s3_client()
+        s3_client.put_object(Bucket=bucket, Key=prefix + SNAPSHOT_NAME, Body=snapshot)
+        return
+
+    makedirs(location, exist_ok=True)
+    file_path = path.join(location, SNAPSHOT_NAME)
+    with open(file_path + ".tmp", "wb") as f:
+        f.write(snapshot)
+    replace(file_path + ".tmp", file_path)
+
+
+def export_snapshot(conn: psycopg.Connection, location: str = None, s3_client=None) -> bool:
+    """Exports the snapshot after a load. The location defaults to the SNAPSHOT_LOCATION
+    environment variable, if neither are set no snapshot is written.
+    Returns true if the snapshot was written"""
+    location = location or ENV.get("SNAPSHOT_LOCATION")
+    if not location:
+        return False
+
+    try:
+        rows = get_snapshot_rows(conn)
+        write_snapshot(make_snapshot(rows), location, s3_client)
+        logging.info(f"Exported a snapshot of {len(rows)} games to {location}")
+        return True
+
+    except Exception as e: # pylint: disable=broad-exception-caught
+        # The data is already loaded, the dashboard keeps the last snapshot until the next one
+        logging.error(f"Exporting the snapshot failed: {e}")
+        return False
@@ -129,11 +129,18 @@ def test_format_games_for_upload():
         game["game_name"],
         game["game_image"],
         game["age_rating"],
-        game["is_nsfw"]) 
+        game["is_nsfw"],
+        True) 
         for game in expected]
     assert lf.format_games_for_upload(NEW_GAMES_EXAMPLE, AGE_RATING_MAPPING) == expected
 
 
+def test_format_games_for_upload_invalid_image():
+    game = NEW_GAMES_EXAMPLE[0].copy()
+    game["game_image"] = "N/A"
+    assert lf.format_games_for_upload([game], AGE_RATING_MAPPING)[0][-1] is False
+
+
 # Upload and return devs
 
 def test_upload_and_return_devs():
@@ -541,6 +548,7 @@ def test_upload_genre_game_platform_assignment():
     with patch('logging.info') as mock_info:
         result = lf.upload_genre_game_platform_assignment(input_data, mock_conn)
         mock_info.assert_any_call("Successfully loaded genre_game_platform_assignments")
+    assert result is True
 
 
 def test_upload_genre_game_platform_assignment_no_data():
@@ -556,7 +564,7 @@ def test_upload_genre_game_platform_assignment_no_data():
 
 def test_upload_genre_game_platform_assignment_upload_error():
     input = [(1,2), (2,1)]
-    expected_output = None
+    expected_output = {}
     mock_conn = MagicMock()
     mock_cursor = MagicMock()
    
@@ -566,6 +574,7 @@ def test_upload_genre_game_platform_assignment_upload_error():
     with patch('logging.error') as mock_error:
         assert lf.upload_genre_game_platform_assignment(input, mock_conn) == expected_output
         mock_error.assert_any_call("Uploading genre_game_platform_assignments failed: DB Error. Data to be uploaded: [(1, 2), (2, 1)]")
+    mock_conn.rollback.assert_called_once()
 
 
 # Upload genre_game_platform_assignment
@@ -581,6 +590,7 @@ def test_upload_tag_game_platform_assignment():
     with patch('logging.info') as mock_info:
         result = lf.upload_tag_game_platform_assignment(input_data, mock_conn)
         mock_info.assert_any_call("Successfully loaded tag_game_platform_assignments")
+    assert result is True
 
 
 def test_upload_tag_game_platform_assignment_no_data():
@@ -596,7 +606,7 @@ def test_upload_tag_game_platform_assignment_no_data():
 
 def test_upload_tag_game_platform_assignment_upload_error():
     input = [(1,2), (2,1)]
-    expected_output = None
+    expected_output = {}
     mock_conn = MagicMock()
     mock_cursor = MagicMock()
    
@@ -606,4 +616,174 @@ def test_upload_tag_game_platform_assignment_upload_error():
     with patch('logging.error') as mock_error:
         assert lf.upload_tag_game_platform_assignment(input, mock_conn) == expected_output
         mock_error.assert_any_call("Uploading tag_game_platform_assignments failed: DB Error. Data to be uploaded: [(1, 2), (2, 1)]")
+    mock_conn.rollback.assert_called_once()
+
+
+
+# Upload initial history
+def test_upload_initial_history():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+
+    with patch('logging.info') as mock_info:
+        lf.upload_initial_history([1, 2], mock_conn)
+        mock_info.assert_any_call("Successfully loaded price and score history")
+    assert mock_cursor.execute.call_count == 2
+    mock_conn.commit.assert_called_once()
+
+
+def test_upload_initial_history_no_data():
+    mock_conn = MagicMock()
+
+    with patch('logging.info') as mock_info:
+        lf.upload_initial_history([], mock_conn)
+        mock_info.assert_any_call("No new price or score history to upload")
+    mock_conn.cursor.assert_not_called()
+
+
+def test_upload_initial_history_error():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+    mock_cursor.execute.side_effect = psycopg.Error("DB Error")
+
+    with patch('logging.error') as mock_error:
+        lf.upload_initial_history([1], mock_conn)
+        mock_error.assert_called_once()
+    mock_conn.rollback.assert_called_once()
+
+
+# Upload failed
+@pytest.mark.parametrize("data, result, expected", [
+    ([(1, 2)], {}, True),
+    ([(1, 2)], None, False),
+    ([(1, 2)], True, False),
+    ([(1, 2)], [{"platform_assignment_id": 1}], False),
+    ([], {}, False)
+])
+def test_upload_failed(data, result, expected):
+    assert lf.upload_failed(data, result) == expected
+
+
+# Bump data version
+def test_bump_data_version():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+
+    with patch('logging.info') as mock_info:
+        lf.bump_data_version(mock_conn)
+        mock_info.assert_any_call("Successfully bumped the data version")
+    mock_conn.commit.assert_called_once()
+
 
+def test_bump_data_version_error():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+    mock_cursor.execute.side_effect = psycopg.Error("DB Error")
+
+    with patch('logging.error') as mock_error:
+        lf.bump_data_version(mock_conn)
+        mock_error.assert_called_once()
+    mock_conn.rollback.assert_called_once()
+
+
+# Update game facets
+def test_update_game_facets():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+
+    with patch('logging.info') as mock_info:
+        lf.update_game_facets([3, 1], mock_conn)
+        mock_info.assert_any_call("Successfully updated the game facets")
+    query, params = mock_cursor.execute.call_args[0]
+    assert "ON CONFLICT (platform_assignment_id) DO UPDATE" in query
+    assert params == ([3, 1],)
+    mock_conn.commit.assert_called_once()
+
+
+def test_update_game_facets_no_data():
+    mock_conn = MagicMock()
+
+    with patch('logging.info') as mock_info:
+        lf.update_game_facets([], mock_conn)
+        mock_info.assert_any_call("No game facets to update")
+    mock_conn.cursor.assert_not_called()
+
+
+def test_update_game_facets_error():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+    mock_cursor.execute.side_effect = psycopg.Error("DB Error")
+
+    with patch('logging.error') as mock_error:
+        lf.update_game_facets([1], mock_conn)
+        mock_error.assert_called_once()
+    mock_conn.rollback.assert_called_once()
+
+
+# Emit games inserted
+def test_emit_games_inserted():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_cursor.rowcount = 1
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+
+    with patch('logging.info') as mock_info:
+        lf.emit_games_inserted([4, 2], mock_conn)
+        mock_info.assert_any_call("Emitted 1 games_inserted event(s)")
+    query, params = mock_cursor.execute.call_args[0]
+    assert "INSERT INTO game_event" in query
+    assert params == ([4, 2], lf.NEW_RELEASE_DAYS)
+    mock_conn.commit.assert_called_once()
+
+
+def test_emit_games_inserted_no_data():
+    mock_conn = MagicMock()
+
+    with patch('logging.info') as mock_info:
+        lf.emit_games_inserted([], mock_conn)
+        mock_info.assert_any_call("No new games to emit")
+    mock_conn.cursor.assert_not_called()
+
+
+def test_emit_games_inserted_error():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+    mock_cursor.execute.side_effect = psycopg.Error("DB Error")
+
+    with patch('logging.error') as mock_error:
+        lf.emit_games_inserted([1], mock_conn)
+        mock_error.assert_called_once()
+    mock_conn.rollback.assert_called_once()
+
+
+# Refresh analytics
+def test_refresh_analytics():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+
+    with patch('logging.info') as mock_info:
+        lf.refresh_analytics(mock_conn)
+        mock_info.assert_any_call("Successfully refreshed the analytics views")
+    assert mock_cursor.execute.call_count == len(lf.ANALYTICS_VIEWS)
+    assert all("CONCURRENTLY" in call.args[0] for call in mock_cursor.execute.call_args_list)
+    mock_conn.commit.assert_called_once()
+
+
+def test_refresh_analytics_error():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+    mock_cursor.execute.side_effect = psycopg.Error("DB Error")
+
+    with patch('logging.error') as mock_error:
+        lf.refresh_analytics(mock_conn)
+        mock_error.assert_called_once()
+    mock_conn.rollback.assert_called_once()
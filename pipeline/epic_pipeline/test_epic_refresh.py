@@ -0,0 +1,109 @@
+# pylint: skip-file
+from unittest.mock import MagicMock, patch
+
+import psycopg
+import pytest
+import epic_refresh as refresh
+
+
+LISTING = {
+    "platform_assignment_id": 1,
+    "platform_url": "game_platform_url",
+    "platform_price": 1999,
+    "platform_discount": 0,
+    "platform_score": 90
+}
+
+
+DATA = [
+    ({"platform_price": 1999, "platform_discount": 90, "platform_score": 4.5}, {"platform_price": 1999, "platform_discount": 10, "platform_score": 90}),
+    ({"platform_price": 1999, "platform_discount": None, "platform_score": None}, {"platform_price": 1999, "platform_discount": 0, "platform_score": -1}),
+    ({"platform_price": "1999", "platform_discount": None, "platform_score": None}, None)
+]
+@pytest.mark.parametrize("data, expected", DATA)
+def test_format_listing(data, expected):
+    assert refresh.format_listing(data) == expected
+
+
+def test_find_changes_unchanged():
+    current = {"platform_price": 1999, "platform_discount": 0, "platform_score": 90}
+    assert refresh.find_changes(LISTING, current) is None
+
+
+def test_find_changes_no_current():
+    assert refresh.find_changes(LISTING, None) is None
+
+
+DATA = [
+    ({"platform_price": 999, "platform_discount": 50, "platform_score": 90}, True, False),
+    ({"platform_price": 1999, "platform_discount": 0, "platform_score": 80}, False, True),
+    ({"platform_price": 999, "platform_discount": 50, "platform_score": 80}, True, True)
+]
+@pytest.mark.parametrize("current, price_changed, score_changed", DATA)
+def test_find_changes(current, price_changed, score_changed):
+    change = refresh.find_changes(LISTING, current)
+    assert change["platform_assignment_id"] == 1
+    assert change["price_changed"] is price_changed
+    assert change["score_changed"] is score_changed
+
+
+def test_apply_changes_no_changes():
+    mock_conn = MagicMock()
+
+    with patch('logging.info') as mock_info:
+        refresh.apply_changes(mock_conn, [])
+        mock_info.assert_any_call("No price or score changes to upload")
+    mock_conn.cursor.assert_not_called()
+
+
+def test_apply_changes_only_records_what_changed():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+    change = refresh.find_changes(
+        LISTING, {"platform_price": 999, "platform_discount": 50, "platform_score": 90})
+
+    refresh.apply_changes(mock_conn, [change])
+    assert mock_cursor.executemany.call_count == 2
+    assert mock_cursor.executemany.call_args_list[1][0][1] == [(1, 999, 50)]
+    mock_conn.commit.assert_called_once()
+
+
+def test_apply_changes_error():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+    mock_cursor.executemany.side_effect = psycopg.Error("DB Error")
+    change = refresh.find_changes(
+        LISTING, {"platform_price": 1999, "platform_discount": 0, "platform_score": 80})
+
+    with patch('logging.error') as mock_error:
+        assert not refresh.apply_changes(mock_conn, [change])
+        mock_error.assert_called_once()
+    mock_conn.rollback.assert_called_once()
+
+
+@pytest.mark.parametrize("applied, saved", [
+    (True, ["game_platform_url", "other_url"]),
+    (False, ["game_platform_url"])
+])
+def test_refresh_listings_saves_states_once_committed(applied, saved):
+    listings = [LISTING, {**LISTING, "platform_assignment_id": 2, "platform_url": "other_url"}]
+    data = {"platform_price": 999, "platform_discount": 50, "platform_score": 4.5,
+            "link": "other_url", "page_state": {"platform_url": "other_url"}}
+    games = [{"link": "game_platform_url"}, {"link": "other_url"}]
+    with patch.object(refresh, 'extract_games', return_value=games), \
+         patch.object(refresh, 'get_link', side_effect=lambda game: game["link"]), \
+         patch.object(refresh, 'format_data', return_value=[data]), \
+         patch.object(refresh, 'get_listings', return_value=listings), \
+         patch.object(refresh, 'fetch') as mock_fetch, \
+         patch.object(refresh, 'apply_changes', return_value=applied), \
+         patch.object(refresh, 'lf') as mock_lf:
+        mock_fetch.get_page_states.return_value = {}
+        mock_fetch.new_page_state.side_effect = lambda url, state: {"platform_url": url}
+        assert refresh.refresh_listings(MagicMock()) == 1
+
+    # the changed page's state is only saved if its change was committed
+    states = mock_fetch.save_page_states.call_args[0][1]
+    assert [state["platform_url"] for state in states] == saved
+    assert mock_lf.update_game_facets.called == applied
@@ -1,23 +1,34 @@
 """The extraction script for GOG"""
 from os import environ as ENV
 from tempfile import mkdtemp
-from time import sleep
+from time import sleep, perf_counter
+from typing import TYPE_CHECKING
 import json
 import re
 import logging
 
 import requests
 from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
 import psycopg
 from psycopg.rows import dict_row
 from dotenv import load_dotenv
 
+import gog_checkpoint as ck
+import gog_archive as archive
+import gog_fetch as fetch
+
+# Selenium and webdriver_manager are slow to import and only needed once a browser is
+# started, so they're imported inside the functions that use them
+if TYPE_CHECKING:
+    from selenium import webdriver
+
 
 def init_driver():
     """Sets up the selenium driver with proper service and options."""
+    # pylint: disable=import-outside-toplevel
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
     chrome_options = webdriver.ChromeOptions()
     chrome_options.add_argument("--headless=new")
     chrome_options.add_argument("--no-sandbox")
@@ -44,6 +55,18 @@ def init_driver():
     return driver
 
 
+def init_local_driver():
+    """Sets up a selenium driver using the local chrome install."""
+    # pylint: disable=import-outside-toplevel
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    options = webdriver.ChromeOptions()
+    # options.add_argument("--headless")
+    return webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+
+
 def get_current_games(conn: psycopg.Connection):
     """Gets the current games in the database."""
     sql = "SELECT game_name FROM game;"
@@ -52,13 +75,14 @@ def get_current_games(conn: psycopg.Connection):
         return cur.fetchall()
 
 
-def get_soup(url: str, driver: webdriver.Chrome) -> BeautifulSoup:
+def get_soup(url: str, driver: "webdriver.Chrome") -> BeautifulSoup:
     """Fetches the page content using Selenium and returns a BeautifulSoup object"""
     driver.get(url)
     sleep(1)
     driver.execute_script("window.scrollTo(0, document.body.scrollHeight);") # Some resources only load when scrolling
     sleep(1)
     page_source = driver.page_source
+    archive.archive_response(url, page_source)
 
     return BeautifulSoup(page_source, "html.parser")
 
@@ -146,9 +170,31 @@ def fetch_age_rating(soup: BeautifulSoup) -> str:
         return match.group(1) if match else None
 
 
-def get_data(link: str, driver: webdriver) -> dict:
+def get_data(link: str, driver: "webdriver.Chrome") -> dict:
     """Gets the needed data from GOG website"""
     soup = get_soup(link, driver)
+    return parse_data(soup, link)
+
+
+def get_changed_data(link: str, driver: "webdriver.Chrome", state: dict = None) -> dict:
+    """Gets the needed data from GOG website.
+    Given the page's stored state, returns None if neither the page
+    nor the game data on it have changed since it was loaded."""
+    soup = get_soup(link, driver)
+    page = fetch.check_content(str(soup), fetch.new_page_state(link, state))
+    if not page["changed"]:
+        return None
+
+    data = parse_data(soup, link)
+    data_changed = fetch.check_data(data, page["state"])
+    if state and not data_changed:
+        return None
+    data["page_state"] = page["state"]
+    return data
+
+
+def parse_data(soup: BeautifulSoup, link: str) -> dict:
+    """Scrapes the needed data from a GOG game page"""
     data = {}
     data['title'] = fetch_title(soup)
     data['link'] = link
@@ -165,20 +211,18 @@ def get_data(link: str, driver: webdriver) -> dict:
     return data
 
 
-def scrape_newest(url: str, local:bool, conn: psycopg) -> list[dict]:
+def scrape_newest(url: str, local:bool, conn: psycopg, run_id: int = None) -> list[dict]:
     """
     Scrapes all the newest games from GOG games
+    If a run_id is given, links already fetched by the run are taken from
+    its checkpoints and each newly fetched link is checkpointed.
     """
     current_games = get_current_games(conn)
     current_games = [game["game_name"] for game in current_games]
+    checkpoints = ck.get_checkpoints(conn, run_id) if run_id else {}
 
-    if local:
-        options = webdriver.ChromeOptions()
-        # options.add_argument("--headless")
-        driver = webdriver.Chrome(service=Service(
-            ChromeDriverManager().install()), options=options)
-    else:
-        driver = init_driver()
+    # The browser is only started once a page actually has to be fetched
+    driver = None
 
     response = requests.get(url)
 
@@ -186,13 +230,48 @@ def scrape_newest(url: str, local:bool, conn: psycopg) -> list[dict]:
     game_links = [link['href'] for link in soup.find_all('a', href=True)
                   if re.match(r'https://www\.gog\.com/en/game/', link["href"])]
 
+    page_states = fetch.get_page_states(conn, game_links)
     page_data_list = []
     for link in game_links:
-        game_data = get_data(link, driver)
+        if ck.is_loaded(checkpoints, link):
+            continue
+        game_data = ck.get_extracted(checkpoints, link)
+        if game_data is None:
+            if driver is None:
+                driver = init_local_driver() if local else init_driver()
+            game_data = get_changed_data(link, driver, page_states.get(link))
+            if game_data is None:
+                logging.info('%s is unchanged since it was loaded', link)
+                break
+            if run_id and game_data["title"] not in current_games:
+                ck.save_extracted(conn, run_id, link, game_data)
         if game_data["title"] in current_games:
             break
         page_data_list.append(game_data)
-    driver.quit()
+    if driver is not None:
+        driver.quit()
+    return page_data_list
+
+
+def replay_archive(location: str) -> list[dict]:
+    """Scrapes the archived game pages instead of the live website.
+    Logs the parsing throughput, so this doubles as an offline benchmark."""
+    responses = [response for response in archive.get_archived_responses(location)
+                 if re.match(r'https://www\.gog\.com/en/game/', response["url"])]
+
+    page_data_list = []
+    start = perf_counter()
+    for response in responses:
+        try:
+            soup = BeautifulSoup(response["body"], "html.parser")
+            page_data_list.append(parse_data(soup, response["url"]))
+        except (AttributeError, TypeError, ValueError) as e:
+            logging.warning("Couldn't parse archived page %s: %s", response["url"], e)
+    elapsed = perf_counter() - start
+
+    logging.info("Parsed %s of %s archived pages in %.2fs (%.1f pages/s)",
+                 len(page_data_list), len(responses), elapsed,
+                 len(responses) / elapsed if elapsed else 0)
     return page_data_list
 
 
@@ -0,0 +1,178 @@
+"""Re-fetches the GOG listings already in the database and records any price or score changes"""
+
+# Native imports
+from os import environ as ENV
+import logging
+
+# Third-party imports
+import psycopg
+from psycopg.rows import dict_row
+from dotenv import load_dotenv
+from selenium.common.exceptions import WebDriverException
+
+# Local imports
+from gog_extract import get_changed_data, init_driver
+import gog_transform as tf
+import gog_fetch as fetch
+import gog_load_functions as lf
+
+
+PLATFORM = "GOG"
+
+
+def get_listings(conn: psycopg.Connection, platform: str, batch_size: int) -> list[dict]:
+    """Gets the listings for a platform, least recently checked first"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT gpa.platform_assignment_id, gpa.platform_url,
+                gpa.platform_price, gpa.platform_discount, gpa.platform_score
+            FROM game_platform_assignment AS gpa
+            JOIN platform AS p USING (platform_id)
+            LEFT JOIN page_state AS ps ON ps.platform_url = gpa.platform_url
+            WHERE p.platform_name = %s
+            ORDER BY ps.checked_at ASC NULLS FIRST
+            LIMIT %s""", (platform, batch_size))
+        return cur.fetchall()
+
+
+def format_listing(data: dict) -> dict:
+    """Formats the price, discount and score of a scraped game the same way as the transform.
+    Returns None if the price isn't valid."""
+    if not tf.is_valid_price(data['platform_price']):
+        return None
+    return {
+        "platform_price": tf.format_price(data['platform_price']),
+        "platform_discount": tf.format_integer(data['platform_discount'])
+            if tf.is_valid_discount(data['platform_discount']) else 0,
+        "platform_score": tf.format_score(data['platform_score'])
+            if tf.is_valid_score(data['platform_score']) else -1
+    }
+
+
+def find_changes(listing: dict, current: dict) -> dict:
+    """Compares a stored listing with the current values, returns None if nothing has changed"""
+    if not current:
+        return None
+    price_changed = (listing["platform_price"] != current["platform_price"] or
+                     listing["platform_discount"] != current["platform_discount"])
+    score_changed = listing["platform_score"] != current["platform_score"]
+    if not price_changed and not score_changed:
+        return None
+    return {
+        "platform_assignment_id": listing["platform_assignment_id"],
+        **current,
+        "price_changed": price_changed,
+        "score_changed": score_changed
+    }
+
+
+def apply_changes(conn: psycopg.Connection, changes: list[dict]) -> bool:
+    """Updates the current listings and appends the changes to the history tables,
+    returns whether the changes were committed"""
+    if not changes:
+        logging.info("No price or score changes to upload")
+        return True
+
+    try:
+        with conn.cursor() as cur:
+            cur.executemany("""
+                UPDATE game_platform_assignment
+                SET platform_price = %s, platform_discount = %s, platform_score = %s
+                WHERE platform_assignment_id = %s""",
+                [(change["platform_price"], change["platform_discount"],
+                  change["platform_score"], change["platform_assignment_id"])
+                 for change in changes])
+
+            price_changes = [(change["platform_assignment_id"], change["platform_price"],
+                              change["platform_discount"])
+                             for change in changes if change["price_changed"]]
+            if price_changes:
+                cur.executemany("""
+                    INSERT INTO price_history
+                        (platform_assignment_id, platform_price, platform_discount)
+                    VALUES (%s, %s, %s)""", price_changes)
+
+            score_changes = [(change["platform_assignment_id"], change["platform_score"])
+                             for change in changes if change["score_changed"]]
+            if score_changes:
+                cur.executemany("""
+                    INSERT INTO score_history (platform_assignment_id, platform_score)
+                    VALUES (%s, %s)""", score_changes)
+        conn.commit()
+        logging.info("Recorded %s price and %s score changes",
+                     len(price_changes), len(score_changes))
+        return True
+    except psycopg.Error as e:
+        conn.rollback()
+        logging.error("Uploading price and score changes failed: %s", e)
+        return False
+
+
+def refresh_listings(conn: psycopg.Connection, batch_size: int) -> int:
+    """Re-fetches a batch of listings and records their changes, returns the number changed"""
+    listings = get_listings(conn, PLATFORM, batch_size)
+    page_states = fetch.get_page_states(conn, [listing["platform_url"] for listing in listings])
+
+    driver = init_driver()
+    changes = []
+    checked_states = []
+    # the states of the changed pages are only saved once their changes are committed,
+    # so a failed upload is retried the next time the page is checked
+    changed_states = []
+    for listing in listings:
+        url = listing["platform_url"]
+        try:
+            data = get_changed_data(url, driver, page_states.get(url))
+        except (WebDriverException, AttributeError, TypeError, ValueError) as e:
+            logging.warning("Couldn't refresh %s: %s", url, e)
+            continue
+
+        if data is None:
+            checked_states.append(fetch.new_page_state(url, page_states.get(url)))
+            continue
+
+        change = find_changes(listing, format_listing(data))
+        if change:
+            changes.append(change)
+            changed_states.append(data["page_state"])
+        else:
+            checked_states.append(data["page_state"])
+
+    driver.quit()
+
+    if apply_changes(conn, changes):
+        checked_states.extend(changed_states)
+        if changes:
+            lf.update_game_facets([change["platform_assignment_id"] for change in changes], conn)
+            lf.bump_data_version(conn)
+    fetch.save_page_states(conn, checked_states)
+    logging.info("Refreshed %s %s listings, %s changed", len(listings), PLATFORM, len(changes))
+    return len(changes)
+
+
+def lambda_handler(event=None, context=None) -> None:
+    """Function to refresh the prices and scores of the GOG listings"""
+    log_format = "{asctime} - {levelname} - {message}"
+    log_datefmt = "%Y-%m-%d %H:%M"
+    logging.basicConfig(
+            level=logging.INFO,
+            format=log_format,
+            style="{",
+            datefmt=log_datefmt
+        )
+
+    load_dotenv()
+    user = ENV['DB_USERNAME']
+    password = ENV["DB_PASSWORD"]
+    host = ENV["DB_HOST"]
+    port = ENV["DB_PORT"]
+    name = ENV["DB_NAME"]
+    conn_string = f"""postgresql://{user}:{password}@{host}:{port}/{name}"""
+    db_connection = psycopg.connect(conn_string, row_factory=dict_row)
+
+    refresh_listings(db_connection, int(ENV.get("REFRESH_BATCH_SIZE", 200)))
+    db_connection.close()
+
+
+if __name__ == "__main__":
+    lambda_handler()
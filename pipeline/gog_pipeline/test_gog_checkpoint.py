@@ -0,0 +1,122 @@
+# pylint: skip-file
+from unittest.mock import MagicMock, patch
+from datetime import date, datetime
+
+import psycopg
+import pytest
+import gog_checkpoint as ck
+
+
+CHECKPOINTS = {
+    "loaded_url": {"platform_url": "loaded_url", "raw_data": {"title": "BO3"},
+                   "extracted_at": datetime.now(), "transformed_at": datetime.now(),
+                   "loaded_at": datetime.now()},
+    "extracted_url": {"platform_url": "extracted_url", "raw_data": {"title": "rocket league"},
+                      "extracted_at": datetime.now(), "transformed_at": None,
+                      "loaded_at": None}
+}
+
+
+def make_mock_conn():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+    return mock_conn, mock_cursor
+
+
+def test_format_target_date():
+    assert ck.format_target_date("11 Feb, 2025") == date(2025, 2, 11)
+
+
+def test_start_run_resumes_unfinished_run():
+    mock_conn, mock_cursor = make_mock_conn()
+    mock_cursor.fetchone.return_value = {"run_id": 4}
+
+    assert ck.start_run(mock_conn, "GOG", "11 Feb, 2025") == 4
+    assert mock_cursor.execute.call_count == 1
+
+
+def test_start_run_creates_new_run():
+    mock_conn, mock_cursor = make_mock_conn()
+    mock_cursor.fetchone.side_effect = [None, {"run_id": 5}]
+
+    assert ck.start_run(mock_conn, "GOG", "11 Feb, 2025") == 5
+    assert mock_cursor.execute.call_count == 2
+    mock_conn.commit.assert_called_once()
+
+
+def test_get_checkpoints():
+    mock_conn, mock_cursor = make_mock_conn()
+    mock_cursor.fetchall.return_value = list(CHECKPOINTS.values())
+
+    assert ck.get_checkpoints(mock_conn, 1) == CHECKPOINTS
+
+
+DATA = [
+    ("loaded_url", True),
+    ("extracted_url", False),
+    ("new_url", False),
+    (None, False)
+]
+@pytest.mark.parametrize("url, expected", DATA)
+def test_is_loaded(url, expected):
+    assert ck.is_loaded(CHECKPOINTS, url) == expected
+
+
+DATA = [
+    ("loaded_url", {"title": "BO3"}),
+    ("extracted_url", {"title": "rocket league"}),
+    ("new_url", None)
+]
+@pytest.mark.parametrize("url, expected", DATA)
+def test_get_extracted(url, expected):
+    assert ck.get_extracted(CHECKPOINTS, url) == expected
+
+
+def test_save_extracted():
+    mock_conn, mock_cursor = make_mock_conn()
+
+    ck.save_extracted(mock_conn, 1, "url", {"title": "BO3"})
+    mock_cursor.execute.assert_called_once()
+    mock_conn.commit.assert_called_once()
+
+
+def test_save_extracted_error():
+    mock_conn, mock_cursor = make_mock_conn()
+    mock_cursor.execute.side_effect = psycopg.Error("DB Error")
+
+    with patch('logging.error') as mock_error:
+        ck.save_extracted(mock_conn, 1, "url", {"title": "BO3"})
+        mock_error.assert_called_once()
+    mock_conn.rollback.assert_called_once()
+
+
+def test_mark_stage():
+    mock_conn, mock_cursor = make_mock_conn()
+
+    ck.mark_stage(mock_conn, 1, ["url_1", "url_2"], "loaded")
+    args = mock_cursor.execute.call_args[0]
+    assert args[1] == (1, ["url_1", "url_2"])
+    mock_conn.commit.assert_called_once()
+
+
+def test_mark_stage_no_urls():
+    mock_conn = MagicMock()
+
+    with patch('logging.info') as mock_info:
+        ck.mark_stage(mock_conn, 1, [], "loaded")
+        mock_info.assert_called_once_with("No urls to mark as %s", "loaded")
+    mock_conn.cursor.assert_not_called()
+
+
+def test_mark_stage_invalid_stage():
+    with pytest.raises(ValueError):
+        ck.mark_stage(MagicMock(), 1, ["url"], "scraped")
+
+
+def test_finish_run():
+    mock_conn, mock_cursor = make_mock_conn()
+
+    ck.finish_run(mock_conn, 1)
+    assert mock_cursor.execute.call_args[0][1] == ("complete", 1)
+    mock_conn.commit.assert_called_once()
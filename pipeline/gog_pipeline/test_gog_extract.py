@@ -111,3 +111,13 @@ def test_get_data(mock_get_soup, false_soup):
         'age_rating': '16',
         'link': 'test'
     }
+
+
+def test_import_does_not_load_browser():
+    """Selenium should only be imported once a browser is started"""
+    import subprocess, sys, os
+    result = subprocess.run(
+        [sys.executable, "-c",
+         "import sys, gog_pipeline; print(any(name.split('.')[0] in ('selenium', 'webdriver_manager') for name in sys.modules))"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
@@ -0,0 +1,37 @@
+# pylint: skip-file
+from unittest.mock import MagicMock, patch
+
+import psycopg
+import pytest
+import gog_load as load
+import gog_load_functions as real_lf
+
+
+GAME_PLATFORM_TUPLE = (1, 1, 1999, 0, 90, "2025-01-01", "game_url")
+
+
+def make_lf(genre_conn):
+    """The load functions, with the genre upload run against genre_conn and the rest mocked"""
+    lf = MagicMock()
+    lf.assign_game_platform.return_value = [GAME_PLATFORM_TUPLE]
+    lf.upload_and_return_game_platform_assignment.return_value = [
+        {"platform_assignment_id": 1, "game_id": 1, "platform_id": 1}]
+    lf.assign_genre_game_platform.return_value = [(1, 1)]
+    lf.assign_tag_game_platform.return_value = []
+    lf.upload_genre_game_platform_assignment.side_effect = (
+        lambda data, conn: real_lf.upload_genre_game_platform_assignment(data, genre_conn))
+    lf.upload_failed.side_effect = real_lf.upload_failed
+    return lf
+
+
+@pytest.mark.parametrize("error, expected", [
+    (None, ["game_url"]),
+    (psycopg.Error("DB Error"), None)
+])
+def test_load_data_genre_upload(error, expected):
+    genre_conn = MagicMock()
+    genre_conn.cursor.return_value.__enter__.return_value.executemany.side_effect = error
+
+    with patch.object(load, 'lf', make_lf(genre_conn)), patch.object(load, 'snapshot'):
+        # a listing whose genres weren't uploaded isn't loaded, so its page is fetched again
+        assert load.load_data([{"game_name": "Game"}], MagicMock()) == expected
@@ -0,0 +1,83 @@
+# pylint: skip-file
+from unittest.mock import MagicMock, patch
+from datetime import date
+from os import listdir
+
+import psycopg
+import pyarrow.parquet as pq
+import pytest
+import gog_snapshot as snapshot
+
+
+ROWS = [{
+    "platform_assignment_id": 1,
+    "game_id": 1,
+    "game_name": "Portal",
+    "game_image": "image",
+    "is_image_valid": True,
+    "is_nsfw": False,
+    "age_rating_name": "PEGI 12",
+    "platform_name": "Steam",
+    "platform_release_date": date(2007, 10, 10),
+    "platform_score": 95,
+    "platform_price": 799,
+    "platform_discount": 0,
+    "platform_url": "url",
+    "genres": ["Puzzle"],
+    "tags": ["Singleplayer", "Physics"],
+    "developers": ["Valve"],
+    "publishers": []
+}]
+
+
+def make_connection(rows):
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+    mock_cursor.fetchall.return_value = rows
+    return mock_conn
+
+
+def test_snapshot_round_trip(tmp_path):
+    snapshot.write_snapshot(snapshot.make_snapshot(ROWS), str(tmp_path))
+    table = pq.read_table(tmp_path / snapshot.SNAPSHOT_NAME)
+    assert table.schema == snapshot.get_schema()
+    assert table.to_pylist() == ROWS
+
+
+def test_write_snapshot_replaces_file(tmp_path):
+    snapshot.write_snapshot(b"old", str(tmp_path))
+    snapshot.write_snapshot(b"new", str(tmp_path))
+    assert listdir(tmp_path) == [snapshot.SNAPSHOT_NAME]
+    assert (tmp_path / snapshot.SNAPSHOT_NAME).read_bytes() == b"new"
+
+
+def test_write_snapshot_to_s3():
+    s3_client = MagicMock()
+    snapshot.write_snapshot(b"data", "s3://bucket/snapshots", s3_client)
+    s3_client.put_object.assert_called_once_with(
+        Bucket="bucket", Key="snapshots/games.parquet", Body=b"data")
+
+
+def test_export_snapshot_no_location(monkeypatch):
+    monkeypatch.delenv("SNAPSHOT_LOCATION", raising=False)
+    mock_conn = make_connection(ROWS)
+    assert snapshot.export_snapshot(mock_conn) is False
+    mock_conn.cursor.assert_not_called()
+
+
+def test_export_snapshot_uses_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("SNAPSHOT_LOCATION", str(tmp_path))
+    with patch('logging.info') as mock_info:
+        assert snapshot.export_snapshot(make_connection(ROWS)) is True
+        mock_info.assert_called_once()
+    assert pq.read_table(tmp_path / snapshot.SNAPSHOT_NAME).num_rows == 1
+
+
+def test_export_snapshot_error(tmp_path):
+    mock_conn = make_connection(ROWS)
+    mock_conn.cursor.return_value.__enter__.return_value.execute.side_effect = psycopg.Error("DB Error")
+    with patch('logging.error') as mock_error:
+        assert snapshot.export_snapshot(mock_conn, str(tmp_path)) is False
+        mock_error.assert_called_once()
+    assert listdir(tmp_path) == []
@@ -0,0 +1,111 @@
+"""Measures the import time of each pipeline lambda handler with python -X importtime,
+failing if a handler goes over its budget or imports a module that should be lazy"""
+# Native imports
+from argparse import ArgumentParser
+from os import path
+from statistics import median
+import subprocess
+import sys
+
+
+PIPELINE_DIR = path.dirname(path.abspath(__file__))
+
+# Budgets are in milliseconds and leave headroom for slower CI machines
+HANDLERS = [
+    {"directory": "steam_pipeline", "module": "steam_pipeline", "budget": 500,
+     "lazy": ["selenium", "webdriver_manager", "boto3", "pyarrow"]},
+    {"directory": "steam_pipeline", "module": "steam_refresh", "budget": 500,
+     "lazy": ["selenium", "webdriver_manager", "boto3", "pyarrow"]},
+    {"directory": "gog_pipeline", "module": "gog_pipeline", "budget": 550,
+     "lazy": ["selenium", "webdriver_manager", "boto3", "pyarrow"]},
+    {"directory": "gog_pipeline", "module": "gog_refresh", "budget": 700,
+     "lazy": ["webdriver_manager", "boto3", "pyarrow"]},
+    {"directory": "epic_pipeline", "module": "epic_pipeline", "budget": 450,
+     "lazy": ["boto3", "pyarrow"]},
+    {"directory": "epic_pipeline", "module": "epic_refresh", "budget": 450,
+     "lazy": ["boto3", "pyarrow"]}
+]
+
+
+def parse_importtime(output: str) -> list[dict]:
+    """Parses the output of python -X importtime into
+    [{"module": x, "self": x, "cumulative": x, "depth": x}], with times in milliseconds"""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, cumulative, name = line.removeprefix("import time:").split("|")
+        imports.append({
+            "module": name.strip(),
+            "self": int(self_time) / 1000,
+            "cumulative": int(cumulative) / 1000,
+            "depth": (len(name) - len(name.lstrip())) // 2
+        })
+    return imports
+
+
+def measure_handler(handler: dict) -> list[dict]:
+    """Imports a handler in a fresh interpreter and returns its parsed import times"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {handler['module']}"],
+        cwd=path.join(PIPELINE_DIR, handler["directory"]),
+        capture_output=True, text=True, check=True)
+    return parse_importtime(result.stderr)
+
+
+def get_handler_time(imports: list[dict], module: str) -> float:
+    """Gets the cumulative import time of the handler module itself"""
+    return next(row["cumulative"] for row in imports if row["module"] == module)
+
+
+def find_lazy_imports(imports: list[dict], lazy: list[str]) -> list[str]:
+    """Returns the modules that should only be imported when used but were imported anyway"""
+    loaded = {row["module"].split(".")[0] for row in imports}
+    return [module for module in lazy if module in loaded]
+
+
+def get_slowest_imports(imports: list[dict], module: str, count: int = 5) -> list[dict]:
+    """Gets the slowest imports made directly by the handler module.
+    A module's line comes after everything it imported, so these are the rows
+    between the handler and the previous top level import."""
+    end = next(i for i, row in enumerate(imports) if row["module"] == module)
+    start = end
+    while start > 0 and imports[start - 1]["depth"] > 0:
+        start -= 1
+    direct = [row for row in imports[start:end] if row["depth"] == 1]
+    return sorted(direct, key=lambda row: row["cumulative"], reverse=True)[:count]
+
+
+def check_handler(handler: dict, runs: int) -> bool:
+    """Benchmarks a handler over several runs and prints the result.
+    Returns true if it is within its budget and nothing lazy was imported."""
+    measurements = [measure_handler(handler) for _ in range(runs)]
+    elapsed = median(get_handler_time(imports, handler["module"]) for imports in measurements)
+    eager = find_lazy_imports(measurements[0], handler["lazy"])
+    passed = elapsed <= handler["budget"] and not eager
+
+    print(f"{handler['module']}: {elapsed:.0f}ms (budget {handler['budget']}ms) "
+          f"{'OK' if passed else 'FAIL'}")
+    for row in get_slowest_imports(measurements[0], handler["module"]):
+        print(f"    {row['module']:<30} {row['cumulative']:>6.0f}ms")
+    if eager:
+        print(f"    imported at startup: {', '.join(eager)}")
+    return passed
+
+
+def init_args() -> dict:
+    """Sets up the command line arguments"""
+    parser = ArgumentParser()
+    parser.add_argument("-n", "--runs", type=int, default=5,
+                        help="Number of fresh interpreters to time each handler in")
+    parser.add_argument("-m", "--module", action="append",
+                        help="Only benchmark this handler, can be repeated")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = init_args()
+    handlers = [handler for handler in HANDLERS
+                if not args.module or handler["module"] in args.module]
+    results = [check_handler(handler, args.runs) for handler in handlers]
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,135 @@
+"""Functions to archive the raw responses fetched by the pipeline, so they can be replayed offline"""
+# Native imports
+from os import environ as ENV, makedirs, path, listdir
+from datetime import datetime
+import hashlib
+import gzip
+import json
+import logging
+
+
+def hash_text(text: str) -> str:
+    """Returns the sha256 hash of a string"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_key(url: str, body: str) -> str:
+    """Makes the archive key for a response, in the form url_hash/content_hash.json.gz"""
+    return f"{hash_text(url)}/{hash_text(body)}.json.gz"
+
+
+def compress_response(url: str, body: str) -> bytes:
+    """Compresses a response along with the url it was fetched from"""
+    response = {
+        "url": url,
+        "fetched_at": datetime.now().isoformat(),
+        "body": body
+    }
+    return gzip.compress(json.dumps(response).encode("utf-8"))
+
+
+def decompress_response(data: bytes) -> dict:
+    """Decompresses an archived response"""
+    return json.loads(gzip.decompress(data).decode("utf-8"))
+
+
+def is_s3_location(location: str) -> bool:
+    """Returns true if the archive location is an S3 bucket"""
+    return location.startswith("s3://")
+
+
+def split_s3_location(location: str) -> tuple[str, str]:
+    """Splits s3://bucket/prefix into the bucket name and the key prefix"""
+    bucket, _, prefix = location.removeprefix("s3://").partition("/")
+    if prefix and not prefix.endswith("/"):
+        prefix += "/"
+    return bucket, prefix
+
+
+def get_s3_client():
+    """Gets an S3 client, boto3 is only imported when archiving to S3"""
+    import boto3 # pylint: disable=import-outside-toplevel
+    return boto3.client("s3")
+
+
+def archive_exists(location: str, key: str, s3_client=None) -> bool:
+    """Returns true if the key is already in the archive"""
+    if is_s3_location(location):
+        bucket, prefix = split_s3_location(location)
+        response = s3_client.list_objects_v2(Bucket=bucket, Prefix=prefix + key, MaxKeys=1)
+        return response.get("KeyCount", 0) > 0
+    return path.exists(path.join(location, key))
+
+
+def archive_response(url: str, body: str, location: str = None, s3_client=None) -> bool:
+    """Archives a raw response, skipping it if an identical body is already archived for the url.
+    The location defaults to the ARCHIVE_LOCATION environment variable, if neither are set
+    nothing is archived. Returns true if the response was written."""
+    location = location or ENV.get("ARCHIVE_LOCATION")
+    if not location or not body:
+        return False
+
+    key = make_key(url, body)
+    try:
+        if is_s3_location(location):
+            s3_client = s3_client or get_s3_client()
+            if archive_exists(location, key, s3_client):
+                return False
+            bucket, prefix = split_s3_location(location)
+            s3_client.put_object(Bucket=bucket, Key=prefix + key,
+                                 Body=compress_response(url, body))
+        else:
+            if archive_exists(location, key):
+                return False
+            makedirs(path.dirname(path.join(location, key)), exist_ok=True)
+            with open(path.join(location, key), "wb") as file:
+                file.write(compress_response(url, body))
+    except Exception as e: # pylint: disable=broad-exception-caught
+        # Archiving must never stop the pipeline
+        logging.warning("Couldn't archive %s: %s", url, e)
+        return False
+    return True
+
+
+def get_latest_local_files(location: str) -> list[str]:
+    """Gets the most recently archived file for each url in a local archive"""
+    latest = []
+    if not path.isdir(location):
+        return latest
+    for url_hash in listdir(location):
+        url_dir = path.join(location, url_hash)
+        files = [path.join(url_dir, name) for name in listdir(url_dir)]
+        if files:
+            latest.append(max(files, key=path.getmtime))
+    return latest
+
+
+def get_latest_s3_keys(location: str, s3_client) -> list[str]:
+    """Gets the most recently archived key for each url in an S3 archive"""
+    bucket, prefix = split_s3_location(location)
+    latest = {}
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            url_hash = obj["Key"].removeprefix(prefix).split("/")[0]
+            if url_hash not in latest or obj["LastModified"] > latest[url_hash]["LastModified"]:
+                latest[url_hash] = obj
+    return [obj["Key"] for obj in latest.values()]
+
+
+def get_archived_responses(location: str, s3_client=None) -> list[dict]:
+    """Gets the latest archived response for every url, in the form
+    [{"url": x, "fetched_at": x, "body": x}]"""
+    responses = []
+    if is_s3_location(location):
+        s3_client = s3_client or get_s3_client()
+        bucket, _ = split_s3_location(location)
+        for key in get_latest_s3_keys(location, s3_client):
+            data = s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+            responses.append(decompress_response(data))
+    else:
+        for file_name in get_latest_local_files(location):
+            with open(file_name, "rb") as file:
+                responses.append(decompress_response(file.read()))
+    logging.info("Found %s archived responses", len(responses))
+    return responses
@@ -0,0 +1,117 @@
+"""Functions to record the progress of a pipeline run so an interrupted run can be resumed"""
+# Native imports
+from datetime import datetime
+import logging
+
+# Third-party imports
+import psycopg
+from psycopg import sql
+from psycopg.types.json import Jsonb
+
+
+STAGES = ("extracted", "transformed", "loaded")
+
+
+def format_target_date(target_date: str):
+    """Turns a target date in the form '11 Feb, 2025' into a date"""
+    return datetime.strptime(target_date, "%d %b, %Y").date()
+
+
+def start_run(conn: psycopg.Connection, platform: str, target_date: str) -> int:
+    """Returns the id of the unfinished run for this platform and target date,
+    or starts a new run if there isn't one"""
+    target_date = format_target_date(target_date)
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT pr.run_id
+            FROM pipeline_run AS pr
+            JOIN platform AS p USING (platform_id)
+            WHERE p.platform_name = %s
+            AND pr.target_date = %s
+            AND pr.status = 'running'
+            ORDER BY pr.started_at DESC
+            LIMIT 1""", (platform, target_date))
+        run = cur.fetchone()
+        if run:
+            logging.info("Resuming %s run %s", platform, run["run_id"])
+            return run["run_id"]
+
+        cur.execute("""
+            INSERT INTO pipeline_run (platform_id, target_date)
+            SELECT platform_id, %s FROM platform WHERE platform_name = %s
+            RETURNING run_id""", (target_date, platform))
+        run = cur.fetchone()
+    conn.commit()
+    logging.info("Started %s run %s", platform, run["run_id"])
+    return run["run_id"]
+
+
+def get_checkpoints(conn: psycopg.Connection, run_id: int) -> dict:
+    """Gets the checkpoints for a run in the form {platform_url: checkpoint}"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT platform_url, raw_data, extracted_at, transformed_at, loaded_at
+            FROM pipeline_checkpoint
+            WHERE run_id = %s""", (run_id,))
+        return {row["platform_url"]: row for row in cur.fetchall()}
+
+
+def is_loaded(checkpoints: dict, url: str) -> bool:
+    """Returns true if the url was loaded by a previous attempt of this run"""
+    checkpoint = checkpoints.get(url)
+    return bool(checkpoint and checkpoint["loaded_at"])
+
+
+def get_extracted(checkpoints: dict, url: str) -> dict:
+    """Returns the raw data stored for the url, or None if it hasn't been extracted"""
+    checkpoint = checkpoints.get(url)
+    if checkpoint and checkpoint["extracted_at"]:
+        return checkpoint["raw_data"]
+    return None
+
+
+def save_extracted(conn: psycopg.Connection, run_id: int, url: str, raw_data: dict) -> None:
+    """Stores the raw data for a url as soon as it has been fetched"""
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO pipeline_checkpoint (run_id, platform_url, raw_data, extracted_at)
+                VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+                ON CONFLICT (run_id, platform_url)
+                DO UPDATE SET raw_data = EXCLUDED.raw_data,
+                    extracted_at = EXCLUDED.extracted_at""",
+                (run_id, url, Jsonb(raw_data)))
+        conn.commit()
+    except psycopg.Error as e:
+        conn.rollback()
+        logging.error("Saving checkpoint for %s failed: %s", url, e)
+
+
+def mark_stage(conn: psycopg.Connection, run_id: int, urls: list[str], stage: str) -> None:
+    """Records that the urls have completed the given stage"""
+    if stage not in STAGES:
+        raise ValueError(f"Unknown stage: {stage}")
+    if not urls:
+        logging.info("No urls to mark as %s", stage)
+        return
+
+    query = sql.SQL("""
+        UPDATE pipeline_checkpoint
+        SET {column} = CURRENT_TIMESTAMP
+        WHERE run_id = %s
+        AND platform_url = ANY(%s)""").format(column=sql.Identifier(f"{stage}_at"))
+    with conn.cursor() as cur:
+        cur.execute(query, (run_id, list(urls)))
+    conn.commit()
+    logging.info("Marked %s urls as %s", len(urls), stage)
+
+
+def finish_run(conn: psycopg.Connection, run_id: int, status: str = "complete") -> None:
+    """Closes the run so the next invocation starts a fresh one"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE pipeline_run
+            SET status = %s, finished_at = CURRENT_TIMESTAMP
+            WHERE run_id = %s""", (status, run_id))
+    conn.commit()
+    logging.info("Run %s finished with status %s", run_id, status)
@@ -3,23 +3,31 @@ import re
 from os import environ as ENV
 from tempfile import mkdtemp
 from datetime import datetime, timedelta
+from time import perf_counter
+from typing import TYPE_CHECKING
 
 import logging
-import requests
 from bs4 import BeautifulSoup
-from rich.progress import Progress
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.keys import Keys
-from webdriver_manager.chrome import ChromeDriverManager
 import psycopg
 from psycopg.rows import dict_row
 from dotenv import load_dotenv
 
+import steam_checkpoint as ck
+import steam_archive as archive
+import steam_fetch as fetch
+
+# Selenium and webdriver_manager are slow to import and only needed once a browser is
+# started, so they're imported inside the functions that use them
+if TYPE_CHECKING:
+    from selenium import webdriver
+
 
 def init_driver():
     """Sets up the selenium driver with proper service and options."""
+    # pylint: disable=import-outside-toplevel
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
     chrome_options = webdriver.ChromeOptions()
     chrome_options.add_argument("--headless=new")
     chrome_options.add_argument("--no-sandbox")
@@ -46,6 +54,18 @@ def init_driver():
     return driver
 
 
+def init_local_driver():
+    """Sets up a selenium driver using the local chrome install."""
+    # pylint: disable=import-outside-toplevel
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    options = webdriver.ChromeOptions()
+    # options.add_argument("--headless")
+    return webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+
+
 def get_current_games(conn: psycopg.Connection):
     """Gets the current games in the database."""
     sql = "SELECT game_name FROM game;"
@@ -79,8 +99,12 @@ def setup_logging(output: str=None, filename="game_track.log", level=logging.INF
         logging.info("Logging to console.")
 
 
-def find_target_date(driver: ChromeDriverManager, target_date: str) -> None:
+def find_target_date(driver: "webdriver.Chrome", target_date: str) -> None:
     """Scrolls through the page until target date is found"""
+    # pylint: disable=import-outside-toplevel
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+
     found_target_date = False
     scroll_attempts = 0
 
@@ -229,8 +253,25 @@ def fetch_age_rating(soup: BeautifulSoup) -> str:
         return match.group(1) if match else None
 
 
-def get_data(link: str) -> dict:
-    """Scrapes page for this data.
+def get_data(link: str, state: dict = None) -> dict:
+    """Fetches the page, archives the raw html and scrapes it.
+    Given the page's stored state, returns None if neither the page
+    nor the game data on it have changed since it was loaded."""
+    page = fetch.conditional_get(link, state)
+    if not page["changed"]:
+        return None
+    archive.archive_response(link, page["body"])
+
+    data = parse_data(page["body"], link)
+    data_changed = fetch.check_data(data, page["state"])
+    if state and not data_changed:
+        return None
+    data["page_state"] = page["state"]
+    return data
+
+
+def parse_data(html: str, link: str) -> dict:
+    """Scrapes the page html for this data.
     
     Output:
     {
@@ -247,8 +288,7 @@ def get_data(link: str) -> dict:
         "age_rating": x,
     }
     """
-    response = requests.get(link)
-    soup = BeautifulSoup(response.text, "html.parser")
+    soup = BeautifulSoup(html, "html.parser")
     data = {}
 
     title_tag = soup.find(class_="apphub_AppName")
@@ -268,48 +308,70 @@ def get_data(link: str) -> dict:
     return data
 
 
-def scrape_newest(url: str, target_date: str, local: bool, conn: psycopg.Connection) -> list[dict]:
+def scrape_newest(url: str, target_date: str, local: bool,
+                  conn: psycopg.Connection, run_id: int = None) -> list[dict]:
     """
     Scrolls until it finds a game with the target release date, 
     then scrapes all loaded game links.
+    If a run_id is given, links already fetched by the run are taken from
+    its checkpoints and each newly fetched link is checkpointed.
     """
     current_games = get_current_games(conn)
     current_games = [game["game_name"] for game in current_games]
+    checkpoints = ck.get_checkpoints(conn, run_id) if run_id else {}
 
     # Configure to run local or run in cloud
-    if local:
-        options = webdriver.ChromeOptions()
-        # options.add_argument("--headless")
-        driver = webdriver.Chrome(service=Service(
-            ChromeDriverManager().install()), options=options)
-    else:
-        driver = init_driver()
+    driver = init_local_driver() if local else init_driver()
 
     driver.get(url)
     page_data_list = []
 
-    with Progress() as progress:
-        task = progress.add_task("[cyan]Processing Steam games...", total=None)
-
-        find_target_date(driver, target_date)
-
-        game_links = []
-        soup = BeautifulSoup(driver.page_source, "html.parser")
-        game_links = [link['href'] for link in soup.find_all('a', href=True)
-                      if re.match(r'https://store\.steampowered\.com/app/\d+', link["href"])]
+    find_target_date(driver, target_date)
+
+    soup = BeautifulSoup(driver.page_source, "html.parser")
+    game_links = [link['href'] for link in soup.find_all('a', href=True)
+                  if re.match(r'https://store\.steampowered\.com/app/\d+', link["href"])]
+    driver.quit()
+    logging.info('Found %s Steam game links', len(game_links))
+
+    page_states = fetch.get_page_states(conn, game_links)
+    for link in game_links:
+        if ck.is_loaded(checkpoints, link):
+            continue
+        game_data = ck.get_extracted(checkpoints, link)
+        if game_data is None:
+            game_data = get_data(link, page_states.get(link))
+            if game_data is None:
+                logging.info('%s is unchanged since it was loaded', link)
+                break
+            if run_id and game_data.get('title') not in current_games:
+                ck.save_extracted(conn, run_id, link, game_data)
+        if game_data.get('title') in current_games:
+            break
+        logging.info('Processed %s', game_data.get('title'))
+        page_data_list.append(game_data)
 
-        progress.update(task, total=len(game_links))
+    return page_data_list
 
-        driver.quit()
-        for link in game_links:
-            game_data = get_data(link)
-            if game_data.get('title') in current_games:
-                break
-            logging.info('Processed %s', game_data.get('title'))
-            page_data_list.append(game_data)
-            progress.update(task, advance=1)
 
+def replay_archive(location: str) -> list[dict]:
+    """Scrapes the archived game pages instead of the live website.
+    Logs the parsing throughput, so this doubles as an offline benchmark."""
+    responses = [response for response in archive.get_archived_responses(location)
+                 if re.match(r'https://store\.steampowered\.com/app/\d+', response["url"])]
 
+    page_data_list = []
+    start = perf_counter()
+    for response in responses:
+        try:
+            page_data_list.append(parse_data(response["body"], response["url"]))
+        except (AttributeError, TypeError) as e:
+            logging.warning("Couldn't parse archived page %s: %s", response["url"], e)
+    elapsed = perf_counter() - start
+
+    logging.info("Parsed %s of %s archived pages in %.2fs (%.1f pages/s)",
+                 len(page_data_list), len(responses), elapsed,
+                 len(responses) / elapsed if elapsed else 0)
     return page_data_list
 
 
@@ -0,0 +1,131 @@
+"""Functions to fetch pages conditionally and detect whether their contents have changed"""
+# Native imports
+import hashlib
+import json
+import logging
+import re
+
+# Third-party imports
+import psycopg
+import requests
+
+
+# Markup that changes on every request without changing any game data
+VOLATILE_PATTERNS = [
+    re.compile(r"<script\b.*?</script>", re.DOTALL | re.IGNORECASE),
+    re.compile(r"<style\b.*?</style>", re.DOTALL | re.IGNORECASE),
+    re.compile(r"<!--.*?-->", re.DOTALL),
+    re.compile(r"""\s(?:nonce|data-nonce|sessionid|data-csrf)=["'][^"']*["']""", re.IGNORECASE)
+]
+WHITESPACE = re.compile(r"\s+")
+
+# Keys that aren't game data, so aren't part of the data fingerprint
+IGNORED_KEYS = ("link", "page_state")
+
+
+def normalise_html(html: str) -> str:
+    """Removes scripts, styles, comments and per-request tokens and collapses whitespace"""
+    for pattern in VOLATILE_PATTERNS:
+        html = pattern.sub("", html)
+    return WHITESPACE.sub(" ", html).strip()
+
+
+def make_fingerprint(html: str) -> str:
+    """Returns a hash of the normalised page"""
+    return hashlib.sha256(normalise_html(html).encode("utf-8")).hexdigest()
+
+
+def make_data_fingerprint(data: dict) -> str:
+    """Returns a hash of the scraped fields of a game"""
+    relevant = {key: value for key, value in data.items() if key not in IGNORED_KEYS}
+    return hashlib.sha256(
+        json.dumps(relevant, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def new_page_state(url: str, state: dict = None) -> dict:
+    """Starts a new page state for the url, carrying over the previous one if there is one"""
+    state = state or {}
+    return {
+        "platform_url": url,
+        "etag": state.get("etag"),
+        "last_modified": state.get("last_modified"),
+        "content_fingerprint": state.get("content_fingerprint"),
+        "data_fingerprint": state.get("data_fingerprint")
+    }
+
+
+def conditional_get(url: str, state: dict = None, timeout: int = 30) -> dict:
+    """Fetches a page, sending the stored ETag/Last-Modified so an unchanged page can be skipped.
+    Returns {"body": x, "state": x, "changed": x}, where body is None if the server
+    replied 304 and changed is false if the normalised page matches the stored fingerprint."""
+    headers = {}
+    if state and state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state and state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+
+    response = requests.get(url, headers=headers, timeout=timeout)
+    new_state = new_page_state(url, state)
+    new_state["etag"] = response.headers.get("ETag", new_state["etag"])
+    new_state["last_modified"] = response.headers.get("Last-Modified", new_state["last_modified"])
+
+    if response.status_code == 304:
+        return {"body": None, "state": new_state, "changed": False}
+
+    return check_content(response.text, new_state)
+
+
+def check_content(body: str, state: dict) -> dict:
+    """Fingerprints a fetched page and compares it to the stored fingerprint"""
+    fingerprint = make_fingerprint(body)
+    changed = state.get("content_fingerprint") != fingerprint
+    state["content_fingerprint"] = fingerprint
+    return {"body": body, "state": state, "changed": changed}
+
+
+def check_data(data: dict, state: dict) -> bool:
+    """Returns true if the scraped fields differ from the stored fingerprint,
+    and records the new fingerprint in the state"""
+    fingerprint = make_data_fingerprint(data)
+    changed = state.get("data_fingerprint") != fingerprint
+    state["data_fingerprint"] = fingerprint
+    return changed
+
+
+def get_page_states(conn: psycopg.Connection, urls: list[str]) -> dict:
+    """Gets the stored page states in the form {platform_url: state}"""
+    if not urls:
+        return {}
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT platform_url, etag, last_modified, content_fingerprint, data_fingerprint
+            FROM page_state
+            WHERE platform_url = ANY(%s)""", (list(urls),))
+        return {row["platform_url"]: row for row in cur.fetchall()}
+
+
+def save_page_states(conn: psycopg.Connection, states: list[dict]) -> None:
+    """Stores the page states, this should only happen once the pages have been loaded"""
+    if not states:
+        logging.info("No page states to save")
+        return
+
+    data = [(state["platform_url"], state["etag"], state["last_modified"],
+             state["content_fingerprint"], state["data_fingerprint"]) for state in states]
+    try:
+        with conn.cursor() as cur:
+            cur.executemany("""
+                INSERT INTO page_state
+                    (platform_url, etag, last_modified, content_fingerprint, data_fingerprint)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (platform_url) DO UPDATE SET
+                    etag = EXCLUDED.etag,
+                    last_modified = EXCLUDED.last_modified,
+                    content_fingerprint = EXCLUDED.content_fingerprint,
+                    data_fingerprint = EXCLUDED.data_fingerprint,
+                    checked_at = CURRENT_TIMESTAMP""", data)
+        conn.commit()
+        logging.info("Saved %s page states", len(data))
+    except psycopg.Error as e:
+        conn.rollback()
+        logging.error("Saving page states failed: %s", e)
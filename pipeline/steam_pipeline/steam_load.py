@@ -12,10 +12,13 @@ from dotenv import load_dotenv
 
 # Local imports
 import steam_load_functions as lf
+import steam_snapshot as snapshot
 
 
-def load_data(new_games_transformed: list[dict], connection: psycopg.Connection):
-    """Loads the cleaned data to the database"""
+def load_data(new_games_transformed: list[dict],
+              connection: psycopg.Connection) -> list[str] | None:
+    """Loads the cleaned data to the database.
+    Returns the platform_urls of the listings it added, or None if any of their uploads failed"""
     # LOAD STEP 1: Update the game, tag, developer, publisher and genre tables
     # Get the current tables and make a mapping of {name: id}
     game_titles_and_ids = lf.make_id_mapping(lf.get_game_ids(connection), 'game')
@@ -75,8 +78,11 @@ def load_data(new_games_transformed: list[dict], connection: psycopg.Connection)
         new_games_transformed, game_titles_and_ids, pubs_and_ids, current_game_pub_tuples)
 
     # Uploads the game_publisher_assignments and game_developer_assignments
-    lf.upload_developer_game_assignment(game_dev_assignments, connection)
-    lf.upload_publisher_game_assignment(game_pub_assignments, connection)
+    failed = [
+        lf.upload_failed(game_dev_assignments,
+            lf.upload_developer_game_assignment(game_dev_assignments, connection)),
+        lf.upload_failed(game_pub_assignments,
+            lf.upload_publisher_game_assignment(game_pub_assignments, connection))]
 
     # Get the current game_platform_assignments
     current_game_platform_assignments = lf.get_game_platform_assignments(connection)
@@ -94,6 +100,11 @@ def load_data(new_games_transformed: list[dict], connection: psycopg.Connection)
     # Upload the game_platform_assignments and return the new ids
     new_game_platform_assignments = lf.upload_and_return_game_platform_assignment(
         game_platform_tuples, connection)
+    failed.append(lf.upload_failed(game_platform_tuples, new_game_platform_assignments))
+
+    # Record the first price and score of the new game_platform_assignments
+    lf.upload_initial_history([row['platform_assignment_id']
+        for row in new_game_platform_assignments], connection)
 
     # Creates a mapping in the form {(game_id, platform_id): game_assignment_id}
     # This is because in order to update the genre/tag_game_platform_assignments you
@@ -126,8 +137,33 @@ def load_data(new_games_transformed: list[dict], connection: psycopg.Connection)
             current_game_platform_assignments, current_tag_game_platform_tuples)
 
     # Upload the tag/genre_game_platform_assignments
-    lf.upload_genre_game_platform_assignment(new_genre_game_platform_tuples, connection)
-    lf.upload_tag_game_platform_assignment(new_tag_game_platform_tuples, connection)
+    failed.append(lf.upload_failed(new_genre_game_platform_tuples,
+        lf.upload_genre_game_platform_assignment(new_genre_game_platform_tuples, connection)))
+    failed.append(lf.upload_failed(new_tag_game_platform_tuples,
+        lf.upload_tag_game_platform_assignment(new_tag_game_platform_tuples, connection)))
+
+    # LOAD STEP 4: Update the dashboard's filter facets of the listings that are new
+    # or have new genres or tags, then rebuild its analytics from the new data
+    changed_assignment_ids = set(new_game_platform_assignments.values())
+    changed_assignment_ids.update(assignment_id for _, assignment_id in
+        new_genre_game_platform_tuples + new_tag_game_platform_tuples)
+    lf.update_game_facets(sorted(changed_assignment_ids), connection)
+    lf.refresh_analytics(connection)
+
+    # LOAD STEP 5: Tell the new games notifier about the new listings, now their genres are committed
+    lf.emit_games_inserted(sorted(new_game_platform_assignments.values()), connection)
+
+    # LOAD STEP 6: Export the snapshot the dashboard can read instead of the database
+    snapshot.export_snapshot(connection)
+
+    # LOAD STEP 7: Let the dashboard know the data has changed
+    lf.bump_data_version(connection)
+
+    if any(failed):
+        logging.error("Loading the new listings failed, none of them are recorded as loaded")
+        return None
+    # The listings are uploaded in the order of their tuples
+    return [assignment[6] for assignment in game_platform_tuples]
 
 
 if __name__ == "__main__":
@@ -87,8 +87,8 @@ def upload_and_return_games(games: list[tuple], conn: psycopg.Connection) -> dic
     try:
         with conn.cursor() as cur:
             cur.executemany("""
-                INSERT INTO game (game_name, game_image, age_rating_id, is_nsfw)
-                VALUES (%s, %s, %s, %s) RETURNING game_id, game_name""", games, returning=True)
+                INSERT INTO game (game_name, game_image, age_rating_id, is_nsfw, is_image_valid)
+                VALUES (%s, %s, %s, %s, %s) RETURNING game_id, game_name""", games, returning=True)
             ids = []
             while True:
                 ids.append(cur.fetchone())
@@ -345,6 +345,35 @@ def upload_and_return_game_platform_assignment(data: list[tuple],
         return {}
 
 
+def upload_initial_history(platform_assignment_ids: list[int],
+    conn: psycopg.Connection) -> None:
+    """Records the first price and score of new game_platform_assignments
+    in the price_history and score_history tables"""
+    if len(platform_assignment_ids) == 0:
+        logging.info("No new price or score history to upload")
+        return
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+            INSERT INTO price_history
+                (platform_assignment_id, platform_price, platform_discount)
+            SELECT platform_assignment_id, platform_price, platform_discount
+            FROM game_platform_assignment
+            WHERE platform_assignment_id = ANY(%s)""", (platform_assignment_ids,))
+            cur.execute("""
+            INSERT INTO score_history (platform_assignment_id, platform_score)
+            SELECT platform_assignment_id, platform_score
+            FROM game_platform_assignment
+            WHERE platform_assignment_id = ANY(%s)""", (platform_assignment_ids,))
+            conn.commit()
+            logging.info("Successfully loaded price and score history")
+
+    except psycopg.Error as e:
+        conn.rollback()
+        logging.error(f"Uploading price and score history failed: {e}")
+
+
 def get_genre_game_platform_assignment(conn: psycopg.Connection) -> list[dict]:
     """Gets the genre_game_platform_assignments"""
     sql = """
@@ -415,8 +444,9 @@ def assign_tag_game_platform(new_games_list: list[dict], game_id_mapping: dict,
     return values
 
 
-def upload_genre_game_platform_assignment(data: list[tuple], conn: psycopg.Connection) -> None:
-    """Uploads the genre_game_platform_assignments"""
+def upload_genre_game_platform_assignment(data: list[tuple],
+    conn: psycopg.Connection) -> bool | dict:
+    """Uploads the genre_game_platform_assignments, returns an empty dict if the upload failed"""
     if len(data) == 0:
         logging.info("No new genre_game_platform_assignments to upload")
         return {}
@@ -428,15 +458,17 @@ def upload_genre_game_platform_assignment(data: list[tuple], conn: psycopg.Conne
             VALUES (%s, %s)""", data)
             conn.commit()
             logging.info("Successfully loaded genre_game_platform_assignments")
-            return None
+            return True
 
     except psycopg.Error as e:
+        conn.rollback()
         logging.error(f"Uploading genre_game_platform_assignments failed: {e}. Data to be uploaded: {data}")
-        return None
+        return {}
 
 
-def upload_tag_game_platform_assignment(data: list[tuple], conn: psycopg.Connection) -> None:
-    """Uploads the tag_game_platform_assignments"""
+def upload_tag_game_platform_assignment(data: list[tuple],
+    conn: psycopg.Connection) -> bool | dict:
+    """Uploads the tag_game_platform_assignments, returns an empty dict if the upload failed"""
     if len(data) == 0:
         logging.info("No new tag_game_platform_assignments to upload")
         return {}
@@ -448,11 +480,135 @@ def upload_tag_game_platform_assignment(data: list[tuple], conn: psycopg.Connect
             VALUES (%s, %s)""", data)
             conn.commit()
             logging.info("Successfully loaded tag_game_platform_assignments")
-            return None
+            return True
 
     except psycopg.Error as e:
+        conn.rollback()
         logging.error(f"Uploading tag_game_platform_assignments failed: {e}. Data to be uploaded: {data}")
-        return None
+        return {}
+
+
+
+def upload_failed(data: list, result) -> bool:
+    """Returns true if an upload was given data and failed.
+    The upload functions log the error and return an empty dict instead of raising"""
+    return len(data) > 0 and result == {}
+
+
+def bump_data_version(conn: psycopg.Connection) -> None:
+    """Increments the data version, this tells the dashboard its cached query results are stale"""
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+            UPDATE data_version
+            SET version = version + 1, updated_at = CURRENT_TIMESTAMP""")
+            conn.commit()
+            logging.info("Successfully bumped the data version")
+
+    except psycopg.Error as e:
+        conn.rollback()
+        logging.error(f"Bumping the data version failed: {e}")
+
+
+def update_game_facets(assignment_ids: list[int], conn: psycopg.Connection) -> None:
+    """Rebuilds the dashboard's filter facets of the given game_platform_assignments,
+    so only the listings that were added or changed are updated rather than the whole index"""
+    if len(assignment_ids) == 0:
+        logging.info("No game facets to update")
+        return
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+            INSERT INTO game_facet
+                (platform_assignment_id, platform_name, platform_price, is_nsfw, genres, tags, updated_at)
+            SELECT gp.platform_assignment_id, p.platform_name, gp.platform_price, g.is_nsfw,
+                ARRAY(SELECT ge.genre_name FROM genre_game_platform_assignment gga
+                      JOIN genre ge ON gga.genre_id = ge.genre_id
+                      WHERE gga.platform_assignment_id = gp.platform_assignment_id),
+                ARRAY(SELECT t.tag_name FROM tag_game_platform_assignment tga
+                      JOIN tag t ON tga.tag_id = t.tag_id
+                      WHERE tga.platform_assignment_id = gp.platform_assignment_id),
+                CURRENT_TIMESTAMP
+            FROM game_platform_assignment gp
+            JOIN game g ON gp.game_id = g.game_id
+            JOIN platform p ON gp.platform_id = p.platform_id
+            WHERE gp.platform_assignment_id = ANY(%s)
+            ON CONFLICT (platform_assignment_id) DO UPDATE SET
+                platform_price = EXCLUDED.platform_price,
+                is_nsfw = EXCLUDED.is_nsfw,
+                genres = EXCLUDED.genres,
+                tags = EXCLUDED.tags,
+                updated_at = EXCLUDED.updated_at""", (list(assignment_ids),))
+            conn.commit()
+            logging.info("Successfully updated the game facets")
+
+    except psycopg.Error as e:
+        conn.rollback()
+        logging.error(f"Updating the game facets failed: {e}")
+
+
+# The release window of the games the notifier emails about, so back catalogue loads don't email anyone
+NEW_RELEASE_DAYS = 1
+
+
+def emit_games_inserted(assignment_ids: list[int], conn: psycopg.Connection) -> None:
+    """Adds a games_inserted event to the game_event outbox with the ids and genres of the games
+    newly listed in the given game_platform_assignments that were released in the last NEW_RELEASE_DAYS.
+    Called once their genres are committed, the new games notifier emails their subscribers from it"""
+    if len(assignment_ids) == 0:
+        logging.info("No new games to emit")
+        return
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+            INSERT INTO game_event (event_type, payload)
+            SELECT 'games_inserted', jsonb_build_object('games', jsonb_agg(
+                jsonb_build_object('game_id', game_id, 'genres', genres)))
+            FROM (
+                SELECT gp.game_id, ARRAY_REMOVE(ARRAY_AGG(DISTINCT ge.genre_name), NULL) AS genres
+                FROM game_platform_assignment gp
+                LEFT JOIN genre_game_platform_assignment gga
+                    ON gga.platform_assignment_id = gp.platform_assignment_id
+                LEFT JOIN genre ge ON gga.genre_id = ge.genre_id
+                WHERE gp.platform_assignment_id = ANY(%s)
+                AND gp.platform_release_date >= CURRENT_DATE - %s
+                GROUP BY gp.game_id) AS new_game
+            HAVING COUNT(*) > 0""", (list(assignment_ids), NEW_RELEASE_DAYS))
+            conn.commit()
+            logging.info(f"Emitted {cur.rowcount} games_inserted event(s)")
+
+    except psycopg.Error as e:
+        conn.rollback()
+        logging.error(f"Emitting the games_inserted event failed: {e}")
+
+
+# The materialised views the dashboard's analytics pages read, see database/schema.sql
+ANALYTICS_VIEWS = [
+    "platform_summary",
+    "genre_game_count",
+    "tag_game_count",
+    "platform_genre_count",
+    "platform_developer_count",
+    "platform_publisher_count",
+    "platform_age_rating_count"
+]
+
+
+def refresh_analytics(conn: psycopg.Connection) -> None:
+    """Refreshes the analytics views after a load.
+    Concurrently, so the dashboard can keep reading the old aggregates while they're rebuilt"""
+    try:
+        with conn.cursor() as cur:
+            for view in ANALYTICS_VIEWS:
+                cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}")
+            conn.commit()
+            logging.info("Successfully refreshed the analytics views")
+
+    except psycopg.Error as e:
+        conn.rollback()
+        logging.error(f"Refreshing the analytics views failed: {e}")
 
 
 def make_id_mapping(ids_and_items: list[dict], item: str) -> dict:
@@ -498,14 +654,17 @@ def get_games_for_upload(new_games: list[dict], current_games: dict) -> list[dic
 
 def format_games_for_upload(games: list[dict], age_rating_mapping: dict) -> list[tuple]:
     """Returns a list of tuples to upload to the game table.
-    Maps the age_rating to age_rating_id"""
+    Maps the age_rating to age_rating_id.
+    The transform has already requested each image and replaced those that didn't load with N/A,
+    so whether the image is valid is stored once here rather than checked by the dashboard."""
     games_for_upload = []
     for game in games:
         games_for_upload.append((
             game["game_name"],
             game["game_image"],
             age_rating_mapping[game["age_rating"]],
-            game["is_nsfw"]
+            game["is_nsfw"],
+            game["game_image"] != "N/A"
         ))
 
     return games_for_upload
@@ -12,9 +12,11 @@ from psycopg.rows import dict_row
 from dotenv import load_dotenv
 
 # Local imports
-from steam_extract import scrape_newest
+from steam_extract import scrape_newest, replay_archive
 from steam_transform import clean_data
 from steam_load import load_data
+import steam_checkpoint as ck
+import steam_fetch as fetch
 
 
 def init_args() -> tuple:
@@ -33,8 +35,14 @@ def init_args() -> tuple:
             required=False,
             help="Set a target date, in the form' 11 Feb, 2025'. Defaults to yesterday.")
 
+    parser.add_argument(
+            "-r", "--replay",
+            action="store_true",
+            required=False,
+            help="Call argument to scrape the archived pages in ARCHIVE_LOCATION instead of the website.")
+
     args = parser.parse_args()
-    return (args.local, args.target_date)
+    return (args.local, args.target_date, args.replay)
 
 
 def change_keys(data: list[dict]):
@@ -74,7 +82,7 @@ def lambda_handler(event=None, context=None) -> None:
         )
 
     # CLI arguments
-    local, target_date = init_args()
+    local, target_date, replay = init_args()
 
     if not target_date:
         target_date = datetime.now() - timedelta(days=1)
@@ -82,6 +90,14 @@ def lambda_handler(event=None, context=None) -> None:
 
     # ENV variables
     load_dotenv()
+
+    # Replay runs the extract and transform against the archive without touching the database
+    if replay:
+        scraped_data = replay_archive(ENV["ARCHIVE_LOCATION"])
+        cleaned_data = clean_data(scraped_data, target_date)
+        logging.info("Replay cleaned %s of %s games", len(cleaned_data), len(scraped_data))
+        return
+
     user = ENV['DB_USERNAME']
     password = ENV["DB_PASSWORD"]
     host = ENV["DB_HOST"]
@@ -90,16 +106,33 @@ def lambda_handler(event=None, context=None) -> None:
     conn_string = f"""postgresql://{user}:{password}@{host}:{port}/{name}"""
     db_connection = psycopg.connect(conn_string, row_factory=dict_row)
 
+    # Checkpoints, resumes the previous run if it didn't finish
+    run_id = ck.start_run(db_connection, "Steam", target_date)
+
     # Extract
     url = "https://store.steampowered.com/search/?sort_by=Released_DESC&category1=998&supportedlang=english&ndl=1"
-    scraped_data = scrape_newest(url, target_date, local, db_connection)
+    scraped_data = scrape_newest(url, target_date, local, db_connection, run_id)
 
     # Transform
     cleaned_data = clean_data(scraped_data, target_date)
+    ck.mark_stage(db_connection, run_id, [game['link'] for game in cleaned_data], "transformed")
     cleaned_data = change_keys(cleaned_data)
 
     # Load
-    load_data(cleaned_data, db_connection)
+    loaded_urls = load_data(cleaned_data, db_connection)
+    if loaded_urls is None:
+        # Nothing is marked loaded and the run is left running, so the next run retries its listings
+        logging.error("Run %s is left unfinished to be resumed", run_id)
+        db_connection.close()
+        return
+    # Every cleaned listing is now in the database, whether this load added it or an earlier one did
+    ck.mark_stage(db_connection, run_id,
+                  [game['platform_url'] for game in cleaned_data], "loaded")
+    # Only the pages of the listings that were added are saved as seen, so the rest are fetched again
+    loaded_urls = set(loaded_urls)
+    fetch.save_page_states(db_connection, [game['page_state'] for game in scraped_data
+                                           if game.get('page_state') and game['link'] in loaded_urls])
+    ck.finish_run(db_connection, run_id)
     db_connection.close()
     return
 
@@ -0,0 +1,114 @@
+# pylint: skip-file
+from unittest.mock import MagicMock
+from datetime import datetime
+from os import listdir, path, utime
+
+import pytest
+import steam_archive as archive
+
+
+URL = "https://store.steampowered.com/app/1"
+
+
+def test_make_key_is_stable():
+    assert archive.make_key(URL, "<html></html>") == archive.make_key(URL, "<html></html>")
+
+
+def test_make_key_changes_with_body():
+    assert archive.make_key(URL, "<html>a</html>") != archive.make_key(URL, "<html>b</html>")
+
+
+def test_make_key_groups_by_url():
+    first = archive.make_key(URL, "<html>a</html>")
+    second = archive.make_key(URL, "<html>b</html>")
+    assert first.split("/")[0] == second.split("/")[0]
+
+
+def test_compress_round_trip():
+    response = archive.decompress_response(archive.compress_response(URL, "<html></html>"))
+    assert response["url"] == URL
+    assert response["body"] == "<html></html>"
+
+
+DATA = [
+    ("s3://bucket", ("bucket", "")),
+    ("s3://bucket/raw", ("bucket", "raw/")),
+    ("s3://bucket/raw/", ("bucket", "raw/"))
+]
+@pytest.mark.parametrize("location, expected", DATA)
+def test_split_s3_location(location, expected):
+    assert archive.split_s3_location(location) == expected
+
+
+def test_archive_response_no_location(monkeypatch):
+    monkeypatch.delenv("ARCHIVE_LOCATION", raising=False)
+    assert archive.archive_response(URL, "<html></html>") is False
+
+
+def test_archive_response_skips_unchanged_body(tmp_path):
+    assert archive.archive_response(URL, "<html></html>", str(tmp_path)) is True
+    assert archive.archive_response(URL, "<html></html>", str(tmp_path)) is False
+    assert archive.archive_response(URL, "<html>new</html>", str(tmp_path)) is True
+
+    url_dir = listdir(tmp_path)
+    assert len(url_dir) == 1
+    assert len(listdir(path.join(tmp_path, url_dir[0]))) == 2
+
+
+def test_archive_response_uses_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("ARCHIVE_LOCATION", str(tmp_path))
+    assert archive.archive_response(URL, "<html></html>") is True
+
+
+def test_get_archived_responses_returns_latest(tmp_path):
+    archive.archive_response(URL, "<html>old</html>", str(tmp_path))
+    old_file = path.join(tmp_path, archive.make_key(URL, "<html>old</html>"))
+    utime(old_file, (0, 0))
+    archive.archive_response(URL, "<html>new</html>", str(tmp_path))
+    archive.archive_response("https://store.steampowered.com/app/2", "<html></html>", str(tmp_path))
+
+    responses = archive.get_archived_responses(str(tmp_path))
+    bodies = {response["url"]: response["body"] for response in responses}
+    assert bodies == {URL: "<html>new</html>",
+                      "https://store.steampowered.com/app/2": "<html></html>"}
+
+
+def test_get_archived_responses_missing_location(tmp_path):
+    assert archive.get_archived_responses(str(tmp_path / "missing")) == []
+
+
+def test_archive_response_s3():
+    mock_s3 = MagicMock()
+    mock_s3.list_objects_v2.return_value = {"KeyCount": 0}
+
+    assert archive.archive_response(URL, "<html></html>", "s3://bucket/raw", mock_s3) is True
+    kwargs = mock_s3.put_object.call_args.kwargs
+    assert kwargs["Bucket"] == "bucket"
+    assert kwargs["Key"] == "raw/" + archive.make_key(URL, "<html></html>")
+
+
+def test_archive_response_s3_skips_unchanged_body():
+    mock_s3 = MagicMock()
+    mock_s3.list_objects_v2.return_value = {"KeyCount": 1}
+
+    assert archive.archive_response(URL, "<html></html>", "s3://bucket/raw", mock_s3) is False
+    mock_s3.put_object.assert_not_called()
+
+
+def test_archive_response_error_does_not_raise():
+    mock_s3 = MagicMock()
+    mock_s3.list_objects_v2.side_effect = Exception("No bucket")
+
+    assert archive.archive_response(URL, "<html></html>", "s3://bucket", mock_s3) is False
+
+
+def test_get_latest_s3_keys():
+    mock_s3 = MagicMock()
+    mock_s3.get_paginator.return_value.paginate.return_value = [{"Contents": [
+        {"Key": "raw/a/1.json.gz", "LastModified": datetime(2025, 1, 1)},
+        {"Key": "raw/a/2.json.gz", "LastModified": datetime(2025, 1, 2)},
+        {"Key": "raw/b/3.json.gz", "LastModified": datetime(2025, 1, 1)}
+    ]}]
+
+    keys = archive.get_latest_s3_keys("s3://bucket/raw", mock_s3)
+    assert sorted(keys) == ["raw/a/2.json.gz", "raw/b/3.json.gz"]
@@ -97,11 +97,10 @@ class TestSetupLogging(unittest.TestCase):
 
 class TestFindTargetDate(unittest.TestCase):
 
-    @patch('steam_extract.ChromeDriverManager')
     @patch('steam_extract.BeautifulSoup')
-    def test_target_date_found(self, mock_bs, MockDriver):
+    def test_target_date_found(self, mock_bs):
 
-        mock_driver = MockDriver.return_value
+        mock_driver = MagicMock()
         mock_driver.page_source = "<html><div class='col search_released responsive_secondrow'>2025-02-14</div></html>"
 
         target_date = "2025-02-13"
@@ -115,11 +114,10 @@ class TestFindTargetDate(unittest.TestCase):
         mock_driver.find_element.assert_not_called()  # No need to scroll
         mock_driver.page_source = "<html><div class='col search_released responsive_secondrow'></div></html>"
 
-    @patch('steam_extract.ChromeDriverManager')
     @patch('steam_extract.BeautifulSoup')
-    def test_target_date_found_after_one_scroll(self, mock_bs, MockDriver):
+    def test_target_date_found_after_one_scroll(self, mock_bs):
 
-        mock_driver = MockDriver.return_value
+        mock_driver = MagicMock()
         mock_driver.page_source = "<html><div class='col search_released responsive_secondrow'></div></html>"
 
         target_date = "2025-02-13"
@@ -139,12 +137,11 @@ class TestFindTargetDate(unittest.TestCase):
         mock_driver.find_element.assert_not_called()
 
 
-    @patch('steam_extract.ChromeDriverManager')
     @patch('steam_extract.BeautifulSoup')
     @patch('steam_extract.logging.error')
-    def test_target_date_not_found_after_100_scrolls(self, mock_log_error, mock_bs, MockDriver):
+    def test_target_date_not_found_after_100_scrolls(self, mock_log_error, mock_bs):
 
-        mock_driver = MockDriver.return_value
+        mock_driver = MagicMock()
         mock_driver.page_source = "<html><div class='col search_released responsive_secondrow'></div></html>"
 
         target_date = "2025-02-13"
@@ -284,3 +281,13 @@ def age_rating_page_response():
 def test_fetch_rating(age_rating_page_response):
     soup = BeautifulSoup(age_rating_page_response, "html.parser")
     assert fetch_age_rating(soup)
+
+
+def test_import_does_not_load_browser():
+    """Selenium should only be imported once a browser is started"""
+    import subprocess, sys, os
+    result = subprocess.run(
+        [sys.executable, "-c",
+         "import sys, steam_pipeline; print(any(name.split('.')[0] in ('selenium', 'webdriver_manager') for name in sys.modules))"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
@@ -0,0 +1,132 @@
+# pylint: skip-file
+from unittest.mock import MagicMock, patch
+
+import psycopg
+import pytest
+import steam_fetch as fetch
+
+
+URL = "https://store.steampowered.com/app/1"
+PAGE = """<html><head><script>var token = "abc";</script><style>p {}</style></head>
+<body>
+    <!-- rendered at 10:00 -->
+    <div class="apphub_AppName">BO3</div>
+</body></html>"""
+SAME_PAGE = """<html><head><script>var token = "xyz";</script><style>p {}</style></head>
+<body>  <!-- rendered at 11:00 --> <div class="apphub_AppName">BO3</div>
+</body></html>"""
+CHANGED_PAGE = PAGE.replace("BO3", "BO4")
+
+
+def make_response(status_code=200, text=PAGE, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.text = text
+    response.headers = headers or {}
+    return response
+
+
+def test_normalise_html_removes_volatile_markup():
+    assert fetch.normalise_html(PAGE) == \
+        '<html><head></head> <body> <div class="apphub_AppName">BO3</div> </body></html>'
+
+
+def test_fingerprint_ignores_volatile_markup():
+    assert fetch.make_fingerprint(PAGE) == fetch.make_fingerprint(SAME_PAGE)
+
+
+def test_fingerprint_changes_with_content():
+    assert fetch.make_fingerprint(PAGE) != fetch.make_fingerprint(CHANGED_PAGE)
+
+
+def test_data_fingerprint_ignores_link():
+    assert fetch.make_data_fingerprint({"title": "BO3", "link": "a"}) == \
+        fetch.make_data_fingerprint({"title": "BO3", "link": "b"})
+
+
+def test_data_fingerprint_changes_with_data():
+    assert fetch.make_data_fingerprint({"title": "BO3", "platform_price": "100"}) != \
+        fetch.make_data_fingerprint({"title": "BO3", "platform_price": "50"})
+
+
+@patch("steam_fetch.requests.get")
+def test_conditional_get_new_page(mock_get):
+    mock_get.return_value = make_response(headers={"ETag": "v1"})
+
+    page = fetch.conditional_get(URL)
+    assert page["changed"] is True
+    assert page["body"] == PAGE
+    assert page["state"]["etag"] == "v1"
+    assert page["state"]["content_fingerprint"] == fetch.make_fingerprint(PAGE)
+    assert mock_get.call_args.kwargs["headers"] == {}
+
+
+@patch("steam_fetch.requests.get")
+def test_conditional_get_sends_validators(mock_get):
+    mock_get.return_value = make_response(status_code=304, text="")
+    state = {"etag": "v1", "last_modified": "Tue, 11 Feb 2025 10:00:00 GMT"}
+
+    page = fetch.conditional_get(URL, state)
+    assert page == {"body": None, "state": fetch.new_page_state(URL, state), "changed": False}
+    assert mock_get.call_args.kwargs["headers"] == {
+        "If-None-Match": "v1", "If-Modified-Since": "Tue, 11 Feb 2025 10:00:00 GMT"}
+
+
+@patch("steam_fetch.requests.get")
+def test_conditional_get_unchanged_fingerprint(mock_get):
+    mock_get.return_value = make_response(text=SAME_PAGE)
+    state = {"content_fingerprint": fetch.make_fingerprint(PAGE)}
+
+    assert fetch.conditional_get(URL, state)["changed"] is False
+
+
+@patch("steam_fetch.requests.get")
+def test_conditional_get_changed_fingerprint(mock_get):
+    mock_get.return_value = make_response(text=CHANGED_PAGE)
+    state = {"content_fingerprint": fetch.make_fingerprint(PAGE)}
+
+    assert fetch.conditional_get(URL, state)["changed"] is True
+
+
+def test_check_data_records_fingerprint():
+    state = fetch.new_page_state(URL)
+    assert fetch.check_data({"title": "BO3"}, state) is True
+    assert fetch.check_data({"title": "BO3"}, state) is False
+    assert fetch.check_data({"title": "BO4"}, state) is True
+
+
+def test_get_page_states_no_urls():
+    mock_conn = MagicMock()
+    assert fetch.get_page_states(mock_conn, []) == {}
+    mock_conn.cursor.assert_not_called()
+
+
+def test_get_page_states():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+    mock_cursor.fetchall.return_value = [{"platform_url": URL, "etag": "v1"}]
+
+    assert fetch.get_page_states(mock_conn, [URL]) == {URL: {"platform_url": URL, "etag": "v1"}}
+
+
+def test_save_page_states():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+
+    fetch.save_page_states(mock_conn, [fetch.new_page_state(URL)])
+    assert mock_cursor.executemany.call_args[0][1] == [(URL, None, None, None, None)]
+    mock_conn.commit.assert_called_once()
+
+
+def test_save_page_states_error():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+    mock_cursor.executemany.side_effect = psycopg.Error("DB Error")
+
+    with patch('logging.error') as mock_error:
+        fetch.save_page_states(mock_conn, [fetch.new_page_state(URL)])
+        mock_error.assert_called_once()
+    mock_conn.rollback.assert_called_once()
@@ -312,4 +312,145 @@ resource "aws_scheduler_schedule" "etl_pipeline_schedule" {
         arn      = aws_sfn_state_machine.etl-pipeline-state-machine.arn
         role_arn = aws_iam_role.report_scheduler_role.arn
     }
-}
\ No newline at end of file
+}
+
+# Lambda Functions to refresh the prices and scores of the stored listings, from the same images as the pipelines
+
+resource "aws_lambda_function" "c15-play-stream-steam-refresh-lambda-function" {
+    function_name         = "c15-play-stream-steam-refresh-lambda-function"
+    package_type          = "Image"
+    image_uri             = data.aws_ecr_image.steam-latest-image.image_uri
+    memory_size           = 1024
+    ephemeral_storage {
+      size = 1024
+    }
+    timeout               = 512
+
+    image_config {
+        command = ["steam_refresh.lambda_handler"]
+    }
+
+    environment {
+        variables = {
+        DB_HOST             = var.DB_HOST
+        DB_NAME             = var.DB_NAME
+        DB_PASSWORD         = var.DB_PASSWORD
+        DB_PORT             = var.DB_PORT
+        DB_USERNAME         = var.DB_USERNAME
+        REFRESH_BATCH_SIZE  = "200"
+        }
+    }
+    role                  = aws_iam_role.lambda_task_role.arn
+}
+
+resource "aws_lambda_function" "c15-play-stream-gog-refresh-lambda-function" {
+    function_name         = "c15-play-stream-gog-refresh-lambda-function"
+    package_type          = "Image"
+    image_uri             = data.aws_ecr_image.gog-latest-image.image_uri
+    memory_size           = 1024
+    ephemeral_storage {
+      size = 1024
+    }
+    timeout               = 512
+
+    image_config {
+        command = ["gog_refresh.lambda_handler"]
+    }
+
+    environment {
+        variables = {
+        DB_HOST             = var.DB_HOST
+        DB_NAME             = var.DB_NAME
+        DB_PASSWORD         = var.DB_PASSWORD
+        DB_PORT             = var.DB_PORT
+        DB_USERNAME         = var.DB_USERNAME
+        REFRESH_BATCH_SIZE  = "200"
+        }
+    }
+    role                  = aws_iam_role.lambda_task_role.arn
+}
+
+resource "aws_lambda_function" "c15-play-stream-epic-refresh-lambda-function" {
+    function_name         = "c15-play-stream-epic-refresh-lambda-function"
+    package_type          = "Image"
+    image_uri             = data.aws_ecr_image.epic-latest-image.image_uri
+    memory_size           = 1024
+    ephemeral_storage {
+      size = 1024
+    }
+    timeout               = 512
+
+    image_config {
+        command = ["epic_refresh.lambda_handler"]
+    }
+
+    environment {
+        variables = {
+        DB_HOST             = var.DB_HOST
+        DB_NAME             = var.DB_NAME
+        DB_PASSWORD         = var.DB_PASSWORD
+        DB_PORT             = var.DB_PORT
+        DB_USERNAME         = var.DB_USERNAME
+        }
+    }
+    role                  = aws_iam_role.lambda_task_role.arn
+}
+
+# Lets the scheduler invoke the refresh lambdas
+
+resource "aws_iam_role_policy" "scheduler_role_refresh_permissions" {
+  name   = "c15-play-stream-run-refresh"
+  role   = aws_iam_role.report_scheduler_role.name
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [
+      {
+        Effect   = "Allow",
+        Action   = "lambda:InvokeFunction",
+        Resource = [
+            aws_lambda_function.c15-play-stream-steam-refresh-lambda-function.arn,
+            aws_lambda_function.c15-play-stream-gog-refresh-lambda-function.arn,
+            aws_lambda_function.c15-play-stream-epic-refresh-lambda-function.arn
+        ]
+      }
+    ]
+  })
+}
+
+# EventBridge Schedulers to refresh the listings every hour, half an hour after the pipelines start
+
+resource "aws_scheduler_schedule" "steam-refresh-scheduler" {
+    name = "c15-play-stream-steam-refresh-scheduler"
+    schedule_expression = "cron(30 * ? * * *)"  # Runs every hour at half past
+    flexible_time_window {
+        mode = "OFF"
+    }
+    target {
+        arn      = aws_lambda_function.c15-play-stream-steam-refresh-lambda-function.arn
+        role_arn = aws_iam_role.report_scheduler_role.arn
+    }
+}
+
+resource "aws_scheduler_schedule" "gog-refresh-scheduler" {
+    name = "c15-play-stream-gog-refresh-scheduler"
+    schedule_expression = "cron(30 * ? * * *)"  # Runs every hour at half past
+    flexible_time_window {
+        mode = "OFF"
+    }
+    target {
+        arn      = aws_lambda_function.c15-play-stream-gog-refresh-lambda-function.arn
+        role_arn = aws_iam_role.report_scheduler_role.arn
+    }
+}
+
+resource "aws_scheduler_schedule" "epic-refresh-scheduler" {
+    name = "c15-play-stream-epic-refresh-scheduler"
+    schedule_expression = "cron(30 * ? * * *)"  # Runs every hour at half past
+    flexible_time_window {
+        mode = "OFF"
+    }
+    target {
+        arn      = aws_lambda_function.c15-play-stream-epic-refresh-lambda-function.arn
+        role_arn = aws_iam_role.report_scheduler_role.arn
+    }
+}
@@ -72,16 +72,88 @@ resource "aws_sfn_state_machine" "daily-genre-email-step-function" {
     }
 }
 
-# Making the EventBridge Scheduler to run this daily
+# Lambda Function to keep the subscription table in line with SNS, from the same image as the daily email
 
-resource "aws_scheduler_schedule" "daily-genre-email-scheduler" {
-    name = "c15-play-stream-daily-genre-email-scheduler"
-    schedule_expression   = "cron(15 17 ? * * *)"  # Runs every day at 17:15
+resource "aws_lambda_function" "c15-play-stream-reconcile-subscriptions-lambda-function" {
+    function_name = "c15-play-stream-reconcile-subscriptions-lambda-function"
+    package_type = "Image"
+    image_uri = data.aws_ecr_image.daily-genre-latest-image.image_uri
+    memory_size   = 256
+    timeout       = 300
+
+    image_config {
+        command = ["reconcile_subscriptions.lambda_handler"]
+    }
+
+    environment {
+        variables = {
+        DB_HOST                         = var.DB_HOST
+        DB_NAME                         = var.DB_NAME
+        DB_PASSWORD                     = var.DB_PASSWORD
+        DB_PORT                         = var.DB_PORT
+        DB_USERNAME                     = var.DB_USERNAME
+        PRIVATE_AWS_ACCESS_KEY          = var.AWS_ACCESS_KEY
+        PRIVATE_AWS_SECRET_ACCESS_KEY   = var.AWS_SECRET_ACCESS_KEY
+        PRIVATE_AWS_REGION              = var.AWS_REGION
+        }
+    }
+
+    role = aws_iam_role.lambda_task_role.arn
+}
+
+# Making the EventBridge Scheduler to reconcile the subscriptions every hour, and before the daily email
+
+resource "aws_scheduler_schedule" "reconcile-subscriptions-scheduler" {
+    name = "c15-play-stream-reconcile-subscriptions-scheduler"
+    schedule_expression   = "cron(0 * ? * * *)"  # Runs every hour
     flexible_time_window {
         mode = "OFF"
     }
     target {
-        arn      = aws_lambda_function.c15-play-stream-weekly-summary-lambda-function.arn
+        arn      = aws_lambda_function.c15-play-stream-reconcile-subscriptions-lambda-function.arn
         role_arn = aws_iam_role.report_scheduler_role.arn
     }
-}
\ No newline at end of file
+}
+
+# Lambda Function to email the subscribers of new games from the pipelines' game_event outbox, from the same image
+
+resource "aws_lambda_function" "c15-play-stream-notify-new-games-lambda-function" {
+    function_name = "c15-play-stream-notify-new-games-lambda-function"
+    package_type = "Image"
+    image_uri = data.aws_ecr_image.daily-genre-latest-image.image_uri
+    memory_size   = 512
+    timeout       = 240
+
+    image_config {
+        command = ["notify_new_games.lambda_handler"]
+    }
+
+    environment {
+        variables = {
+        DB_HOST                         = var.DB_HOST
+        DB_NAME                         = var.DB_NAME
+        DB_PASSWORD                     = var.DB_PASSWORD
+        DB_PORT                         = var.DB_PORT
+        DB_USERNAME                     = var.DB_USERNAME
+        PRIVATE_AWS_ACCESS_KEY          = var.AWS_ACCESS_KEY
+        PRIVATE_AWS_SECRET_ACCESS_KEY   = var.AWS_SECRET_ACCESS_KEY
+        PRIVATE_AWS_REGION              = var.AWS_REGION
+        }
+    }
+
+    role = aws_iam_role.lambda_task_role.arn
+}
+
+# Making the EventBridge Scheduler to send the new games every five minutes, in place of the daily email
+
+resource "aws_scheduler_schedule" "notify-new-games-scheduler" {
+    name = "c15-play-stream-notify-new-games-scheduler"
+    schedule_expression   = "rate(5 minutes)"
+    flexible_time_window {
+        mode = "OFF"
+    }
+    target {
+        arn      = aws_lambda_function.c15-play-stream-notify-new-games-lambda-function.arn
+        role_arn = aws_iam_role.report_scheduler_role.arn
+    }
+}
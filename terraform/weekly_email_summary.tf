@@ -21,7 +21,8 @@ resource "aws_iam_policy" "send_email_policy" {
       {
         Action = [
           "ses:SendEmail",
-          "ses:SendRawEmail"
+          "ses:SendRawEmail",
+          "ses:GetSendQuota"
         ]
         Effect   = "Allow"
         Resource = [aws_lambda_function.c15-play-stream-weekly-summary-lambda-function.arn,